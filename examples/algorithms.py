@@ -21,6 +21,7 @@ class BuyTheBid:
         self.child_vol = child_vol
         self.care_leave = care_vol
         self.leave_uid = None
+        self.amend_px = None
         self.done = False
 
 
@@ -48,16 +49,19 @@ class BuyTheBid:
                 else:
                     self.done = True
             # if not in best bid, modif price
-            elif leave_ord['price'] != gtw.ob.bbid[0]:                
-                gtw.queue_my_cancel(uid=self.leave_uid)
-                self.send_new_child(gtw)
+            # (only once per new price, amend may still be on the fly)
+            elif (leave_ord['price'] != gtw.ob.bbid[0]
+                  and self.amend_px != gtw.ob.bbid[0]):
+                self.amend_px = gtw.ob.bbid[0]
+                gtw.queue_my_amend(uid=self.leave_uid,
+                                   new_price=self.amend_px)
                 
 
 class Pegged:
 
     """ This algorithm places an order referenced to the anchor_lvl 
-        of the Orderbook with an aditional offset. It will cancel
-        and send a new order whenever it is not in the target.
+        of the Orderbook with an aditional offset. It will amend
+        the price of the order whenever it is not in the target.
 
     """ 
 
@@ -72,6 +76,7 @@ class Pegged:
         self.max_jump = max_jump
         self.done = False
         self.jumps = 0
+        self.amend_px = None
         
         # send order
         self.uid = gtw.queue_my_new(is_buy=is_buy,
@@ -126,13 +131,41 @@ class Pegged:
                 if leave_ord['price'] == target_px:
                     return
                 
-            gtw.queue_my_cancel(uid=self.uid)
-            self.uid = gtw.queue_my_new(is_buy=self.is_buy,
-                                    qty=self.qty,
-                                    price=target_px)        
+            # amend may still be on the fly
+            if target_px != self.amend_px:
+                self.amend_px = target_px
+                gtw.queue_my_amend(uid=self.uid, new_price=target_px)
         
     
 
         
         
-        
\ No newline at end of file
+        
+
+class NativePegged:
+
+    """ Same behaviour as Pegged with anchor_lvl=1, but using a native
+        pegged order: the Gateway reprices the order under the same uid
+        whenever the reference price moves, so no cancel/new messages
+        are sent by the algorithm.
+
+    """
+
+    def __init__(self, is_buy, lmtpx, qty, offset, gtw, peg_type='primary'):
+        self.is_buy = is_buy
+        self.done = False
+        self.uid = gtw.queue_my_peg(is_buy=is_buy,
+                                    qty=qty,
+                                    peg_type=peg_type,
+                                    offset=offset,
+                                    limit=lmtpx)
+
+    def eval_and_act(self, gtw):
+
+        try:
+            leave_ord = gtw.ord_status(self.uid)
+        except KeyError:
+            return
+
+        if leave_ord['leavesqty'] == 0:
+            self.done = True
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental position and P&L of own orders.
+
+The Orderbook keeps one Position per account and updates it in O(1)
+on every fill of our orders, in continuous trading and in auctions.
+Own uids belong to the default account unless they are assigned to
+another one (Orderbook.set_account, or the account argument of the
+Gateway queue_my_* methods), so several strategies can share a book.
+
+Positions use average cost accounting: fills increasing the position
+update its average price, fills reducing it realise P&L against it.
+Implementation shortfall is measured against the arrival price of each
+order (mid of the BBO when it reached the book, last price if one side
+was empty). Fees are rates over traded value, maker for our resting
+orders (and auctions), taker for our aggressive ones; negative rates
+are rebates.
+
+    >>> pos = gtw.ob.position('mm')
+    >>> pos.inventory, pos.realized, pos.pnl(gtw.ob.mark_price())
+
+"""
+
+DEFAULT_ACCOUNT = 'default'
+
+
+class Position:
+    """ Inventory and P&L of one account
+
+    Args:
+        account: name of the account
+        maker_fee (float): fee rate of passive fills
+        taker_fee (float): fee rate of aggressive fills
+    """
+
+    def __init__(self, account=DEFAULT_ACCOUNT, maker_fee=0., taker_fee=0.):
+        self.account = account
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        # signed inventory, positive when long
+        self.inventory = 0
+        # average price of the open inventory
+        self.avg_px = 0.
+        self.realized = 0.
+        self.fees = 0.
+        self.buy_vol = 0
+        self.sell_vol = 0
+        self.buy_turn = 0.
+        self.sell_turn = 0.
+        self.n_fills = 0
+        # sum of (price - arrival price) * vol of buys, the opposite
+        # for sells. Positive is a cost
+        self.shortfall = 0.
+
+    def on_fill(self, is_buy, qty, price, is_maker=True, arrival_px=None):
+        """ Account one fill
+
+        Args:
+            is_buy (bool): side of our order
+            qty (int): filled quantity
+            price (float): fill price
+            is_maker (bool): True if our order was resting in the book
+            arrival_px (float): reference price of the order shortfall
+        """
+
+        fee_rate = self.maker_fee if is_maker else self.taker_fee
+        self.fees += fee_rate * qty * price
+        self.n_fills += 1
+        sign = 1 if is_buy else -1
+        if is_buy:
+            self.buy_vol += qty
+            self.buy_turn += qty * price
+        else:
+            self.sell_vol += qty
+            self.sell_turn += qty * price
+        if arrival_px is not None:
+            self.shortfall += sign * (price - arrival_px) * qty
+
+        inventory = self.inventory
+        if inventory * sign >= 0:
+            # opening or increasing the position
+            self.avg_px = ((self.avg_px * abs(inventory) + price * qty)
+                           / (abs(inventory) + qty))
+        else:
+            closed = min(qty, abs(inventory))
+            self.realized += closed * (price - self.avg_px) * (-sign)
+            if qty > abs(inventory):
+                # the position flips side at the fill price
+                self.avg_px = price
+            elif qty == abs(inventory):
+                self.avg_px = 0.
+        self.inventory = inventory + sign * qty
+
+    def unrealized(self, mark_px):
+        """ P&L of the open inventory marked at mark_px """
+
+        if not self.inventory:
+            return 0.
+        return self.inventory * (mark_px - self.avg_px)
+
+    def pnl(self, mark_px):
+        """ Realised plus unrealised P&L, net of fees """
+
+        return self.realized + self.unrealized(mark_px) - self.fees
+
+    @property
+    def vwap(self):
+        """ Average price of all the fills, nan if there are none """
+
+        vol = self.buy_vol + self.sell_vol
+        if vol:
+            return (self.buy_turn + self.sell_turn) / vol
+        return float('nan')
+
+    def as_dict(self, mark_px=None):
+
+        stats = {'account': self.account,
+                 'inventory': self.inventory,
+                 'avg_px': self.avg_px,
+                 'realized': self.realized,
+                 'fees': self.fees,
+                 'buy_vol': self.buy_vol,
+                 'sell_vol': self.sell_vol,
+                 'n_fills': self.n_fills,
+                 'shortfall': self.shortfall}
+        if mark_px is not None:
+            stats['unrealized'] = self.unrealized(mark_px)
+            stats['pnl'] = self.pnl(mark_px)
+        return stats
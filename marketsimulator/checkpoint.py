@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Book checkpoints of a session for fast random-access starts.
+
+build_checkpoints replays the historical orders of a session once and
+stores, every few minutes (or messages) of the session, the resting
+orders of the book in price-time priority together with the position
+in the session reached. They are written next to the session file:
+
+    data/historic_orders/orders-san-2019-5-23.csv
+    data/historic_orders/orders-san-2019-5-23.ckpt.npz
+
+A Gateway whose session has a checkpoint file restores the last
+checkpoint taken before start_h and only replays the historical orders
+from there, so Gateway(start_h=15, ...) starts in milliseconds. The
+resulting book is the same one obtained replaying from the open.
+
+    >>> build_checkpoints('san', date(2019, 5, 23), every_minutes=5)
+    >>> gtw = Gateway(ticker='san', date=date(2019, 5, 23), start_h=15)
+
+"""
+
+import os
+import numpy as np
+from marketsimulator.timestamps import NS, to_ns
+ORDER_DTYPE = np.dtype([('uid', '<i8'),
+                        ('is_buy', '?'),
+                        ('qty', '<f8'),
+                        ('leavesqty', '<f8'),
+                        ('price', '<f8'),
+                        ('timestamp', '<i8')])
+
+
+def checkpoint_file(session):
+    """ Path of the checkpoints of a session file """
+
+    return f'{os.path.splitext(session)[0]}.ckpt.npz'
+
+
+class SessionCheckpoints:
+    """ Checkpoints of a session loaded from a checkpoint file
+
+    Args:
+        path (str): file written by build_checkpoints
+    """
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            # time (int64 ns) of the last message processed
+            self.time = data['time']
+            # index of the next historical message to send
+            self.idx = data['idx']
+            self.last_px = data['last_px']
+            # orders of checkpoint i are orders[start[i]:start[i + 1]]
+            self.start = data['start']
+            self.orders = data['orders']
+            # number of messages of the session, to detect stale files
+            self.nord = int(data['nord'])
+
+    def __len__(self):
+        return len(self.idx)
+
+    def nearest(self, timestamp):
+        """ Index of the last checkpoint taken at or before timestamp,
+        None if there is none
+        """
+
+        i = int(np.searchsorted(self.time, to_ns(timestamp),
+                                side='right')) - 1
+        if i < 0:
+            return None
+        return i
+
+    def resting_orders(self, i):
+        """ Resting orders of checkpoint i, as expected by
+        Orderbook.restore
+        """
+
+        orders = self.orders[self.start[i]:self.start[i + 1]]
+        for row in orders:
+            yield (int(row['uid']), bool(row['is_buy']), row['qty'],
+                   row['leavesqty'], row['price'], int(row['timestamp']))
+
+    def restore(self, ob, i, keep_positions=False):
+        """ Restore the book of checkpoint i in an Orderbook. The
+        positions of its accounts are kept if keep_positions
+
+        Returns:
+            index of the next historical message to send
+        """
+
+        last_px = self.last_px[i]
+        ob.restore(self.resting_orders(i),
+                   None if np.isnan(last_px) else float(last_px),
+                   keep_positions=keep_positions)
+        return int(self.idx[i])
+
+
+def snapshot(ob):
+    """ Resting orders of an Orderbook as an ORDER_DTYPE array """
+
+    orders = [order for is_buy in (True, False)
+              for order in ob.resting_orders(is_buy)]
+    snap = np.empty(len(orders), dtype=ORDER_DTYPE)
+    snap['uid'] = [order.uid for order in orders]
+    snap['is_buy'] = [order.is_buy for order in orders]
+    snap['qty'] = [order.qty for order in orders]
+    snap['leavesqty'] = [order.leavesqty for order in orders]
+    snap['price'] = [order.price for order in orders]
+    snap['timestamp'] = [order.timestamp for order in orders]
+    return snap
+
+
+def build_checkpoints(ticker, date, data_path=None, every_minutes=5,
+                      every_messages=None):
+    """ Replay a session and write its checkpoint file
+
+    Args:
+        ticker (str): symbol of the shares
+        date (date): date of the session
+        data_path (str): folder with the historical orders csv files.
+                         Defaults to the Gateway one
+        every_minutes (float): minutes of session time between
+                               checkpoints. None to disable
+        every_messages (int): historical messages between checkpoints.
+                              None to disable
+    Returns:
+        path of the checkpoint file
+    """
+
+    from marketsimulator.gateway import Gateway, session_file
+
+    if every_minutes is None and every_messages is None:
+        raise ValueError('Set every_minutes and/or every_messages')
+    kwargs = {} if data_path is None else {'data_path': data_path}
+    gtw = Gateway(ticker=ticker, date=date, start_h=0, end_h=24,
+                  checkpoints=False, **kwargs)
+    every_ns = None if every_minutes is None else int(every_minutes * 60 * NS)
+
+    time, idx, last_px, snaps = [], [], [], []
+
+    def take(now):
+        time.append(now)
+        idx.append(gtw.ob_idx)
+        last_px.append(np.nan if gtw.ob.last_px is None else gtw.ob.last_px)
+        snaps.append(snapshot(gtw.ob))
+
+    take(gtw.ob_ns)
+    while gtw.ob_idx < gtw.ob_nord:
+        gtw._send_historical_order(gtw.hist_orders[gtw.ob_idx])
+        now = gtw.ob_ns
+        if ((every_ns is not None and now // every_ns > time[-1] // every_ns)
+                or (every_messages is not None
+                    and gtw.ob_idx - idx[-1] >= every_messages)):
+            take(now)
+
+    path = checkpoint_file(session_file(gtw.data_path, ticker, date))
+    np.savez_compressed(path,
+                        time=np.array(time, dtype=np.int64),
+                        idx=np.array(idx, dtype=np.int64),
+                        last_px=np.array(last_px),
+                        start=np.cumsum([0] + [len(s) for s in snaps]),
+                        orders=np.concatenate(snaps),
+                        nord=gtw.ob_nord)
+    return path
+
+
+def load_checkpoints(data_path, ticker, date):
+    """ Checkpoints of a session, None if they were not built """
+
+    from marketsimulator.gateway import session_file
+
+    path = checkpoint_file(session_file(data_path, ticker, date))
+    if not os.path.exists(path):
+        return None
+    return SessionCheckpoints(path)
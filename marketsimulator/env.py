@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gym-style execution environments for reinforcement learning agents.
+
+ExecutionEnv wraps a Gateway: the agent has to buy (or sell)
+target_qty shares within horizon seconds, acting every step_seconds of
+simulated time. The session is read once; every reset restores the
+warm book saved when the environment was created (Gateway.save_state),
+optionally moved forward a random number of seconds.
+
+    observation (float32 vector, see ExecutionEnv.obs_names):
+        depth: price distance to the mid in bps and volume over
+               target_qty of the first `depth` levels of each side
+        features: spread in bps, book imbalances, order flow imbalance
+                  over target_qty and trade sign pressure
+        inventory: filled fraction of target_qty and fraction of the
+                   horizon left
+    actions:
+        0 wait, 1 join the best price of our side with a child order
+        (or move our resting order there), 2 take the best price of the
+        opposite side with a child order
+    reward:
+        implementation shortfall of the new fills against the arrival
+        mid, in bps of target_qty. At the end of the episode the
+        unfilled quantity costs penalty_bps
+
+VecEnv steps many environments in worker processes and returns stacked
+arrays. Finished environments are reset inside their worker in the
+same step, and their last observation is returned in the info dict.
+
+    >>> venv = VecEnv([dict(ticker='san', date=session, start_h=h)
+    ...                for h in (9.5, 10, 11, 12)], n_workers=4)
+    >>> obs = venv.reset()
+    >>> obs, rewards, dones, infos = venv.step(actions)
+
+"""
+
+import multiprocessing as mp
+import numpy as np
+from marketsimulator.features import FeatureEngine
+from marketsimulator.gateway import Gateway
+
+WAIT = 0
+JOIN = 1
+TAKE = 2
+ACTIONS = ('wait', 'join', 'take')
+
+
+def observation_names(depth):
+    """ Names of the observation fields of an ExecutionEnv """
+
+    return ([f'{side}_{field}_{i}' for side in ('bid', 'ask')
+             for i in range(depth) for field in ('px', 'vol')]
+            + ['spread', 'obi_1', f'obi_{depth}', 'ofi', 'tsp',
+               'filled', 'time_left'])
+
+
+class ExecutionEnv:
+    """ Single execution environment over one session
+
+    Args:
+        ticker (str): symbol of the shares
+        date (date): date of the session
+        is_buy (bool): True to buy target_qty, False to sell it
+        target_qty (int): quantity to execute in each episode
+        child_qty (int): quantity of each child order
+        horizon (float): seconds of each episode
+        step_seconds (float): seconds of simulated time per step
+        depth (int): book levels per side in the observation
+        random_start (float): episodes start up to random_start seconds
+                              after the warm book
+        penalty_bps (float): cost in bps of the unfilled quantity
+        seed (int): seed of the random start
+        **kwargs: any other Gateway argument (start_h, latency...)
+    """
+
+    def __init__(self, ticker, date, is_buy=True, target_qty=1000,
+                 child_qty=100, horizon=300., step_seconds=1., depth=5,
+                 random_start=0., penalty_bps=50., seed=None, **kwargs):
+        self.is_buy = is_buy
+        self.sign = 1 if is_buy else -1
+        self.target_qty = target_qty
+        self.child_qty = child_qty
+        self.horizon = horizon
+        self.step_seconds = step_seconds
+        self.depth = depth
+        self.random_start = random_start
+        self.penalty_bps = penalty_bps
+        self.rng = np.random.RandomState(seed)
+        self.gtw = Gateway(ticker=ticker, date=date, **kwargs)
+        self._warm = self.gtw.save_state()
+        self.features = None
+        self.obs_names = observation_names(depth)
+        self.obs_size = len(self.obs_names)
+
+    def reset(self):
+        """ Start a new episode from the warm book
+
+        Returns:
+            first observation
+        """
+
+        gtw = self.gtw
+        gtw.restore_state(self._warm)
+        if self.features is not None:
+            gtw.detach(self.features)
+        self.features = gtw.attach(FeatureEngine(depths=(1, self.depth)))
+        if self.random_start > 0:
+            gtw.move_n_seconds(self.rng.uniform(0, self.random_start))
+        self.start_time = gtw.ob_time
+        self.elapsed = 0.
+        self.filled = 0
+        self.my_ntrds = 0
+        self.my_uid = None
+        self.my_uids = []
+        bbid, bask = gtw.ob.bbid[0], gtw.ob.bask[0]
+        self.arrival_mid = (bbid + bask) / 2
+        self.features.update(gtw.ob, gtw.ob_ns)
+        return self._observation()
+
+    @property
+    def outstanding(self):
+        """ Quantity of our orders resting in the book or on their way """
+
+        orders = self.gtw.ob._orders
+        resting = sum(orders[uid].leavesqty for uid in self.my_uids
+                      if uid in orders)
+        return resting + self.gtw.vol_in_queue
+
+    def step(self, action):
+        """ Act and move step_seconds forward
+
+        Args:
+            action (int): WAIT, JOIN or TAKE
+        Returns:
+            (observation, reward, done, info)
+        """
+
+        gtw = self.gtw
+        ob = gtw.ob
+        qty = min(self.child_qty,
+                  self.target_qty - self.filled - self.outstanding)
+        if action == JOIN:
+            best = ob.bbid[0] if self.is_buy else ob.bask[0]
+            my_order = ob._orders.get(self.my_uid)
+            if my_order is not None and my_order.active:
+                if my_order.price != best:
+                    gtw.queue_my_amend(self.my_uid, new_price=best)
+            elif qty > 0 and self.my_uid not in gtw.in_queue:
+                self.my_uid = gtw.queue_my_new(self.is_buy, qty, best)
+                self.my_uids.append(self.my_uid)
+        elif action == TAKE and qty > 0:
+            best = ob.bask[0] if self.is_buy else ob.bbid[0]
+            self.my_uids.append(gtw.queue_my_new(self.is_buy, qty, best))
+        elif action not in (WAIT, JOIN, TAKE):
+            raise ValueError(f'Unexpected action: {action}')
+
+        gtw.move_n_seconds(self.step_seconds)
+        self.elapsed += self.step_seconds
+
+        vol = ob.my_trades['vol'][self.my_ntrds:ob.my_ntrds]
+        px = ob.my_trades['price'][self.my_ntrds:ob.my_ntrds]
+        self.my_ntrds = ob.my_ntrds
+        self.filled += vol.sum()
+        shortfall = self.sign * np.dot(px - self.arrival_mid, vol)
+        reward = -1e4 * shortfall / (self.arrival_mid * self.target_qty)
+
+        done = (self.filled >= self.target_qty
+                or self.elapsed >= self.horizon
+                or gtw.ob_ns >= gtw.end_ns)
+        if done:
+            unfilled = max(self.target_qty - self.filled, 0)
+            reward -= self.penalty_bps * unfilled / self.target_qty
+        info = {'filled': self.filled,
+                'arrival_mid': self.arrival_mid,
+                'elapsed': self.elapsed}
+        return self._observation(), reward, done, info
+
+    def _observation(self):
+
+        ob = self.gtw.ob
+        depth = self.depth
+        obs = np.zeros(self.obs_size, dtype=np.float32)
+        mid = self.features['mid']
+        if mid == mid:
+            for side, is_buy in enumerate((True, False)):
+                for i, level in enumerate(ob.top_levels(is_buy, depth)):
+                    pos = 2 * (side * depth + i)
+                    obs[pos] = 1e4 * (level.price / mid - 1)
+                    obs[pos + 1] = level.vol / self.target_qty
+            obs[4 * depth] = 1e4 * self.features['spread'] / mid
+        features = np.array([self.features['obi_1'],
+                             self.features[f'obi_{depth}'],
+                             self.features['ofi'] / self.target_qty,
+                             self.features['tsp']])
+        obs[4 * depth + 1:4 * depth + 5] = np.nan_to_num(features)
+        obs[-2] = self.filled / self.target_qty
+        obs[-1] = max(1 - self.elapsed / self.horizon, 0)
+        return obs
+
+
+def _step_envs(envs, actions):
+    """ Step every env, resetting the finished ones """
+
+    obs, rewards, dones, infos = [], [], [], []
+    for env, action in zip(envs, actions):
+        observation, reward, done, info = env.step(action)
+        if done:
+            info['terminal_observation'] = observation
+            observation = env.reset()
+        obs.append(observation)
+        rewards.append(reward)
+        dones.append(done)
+        infos.append(info)
+    return np.stack(obs), np.array(rewards), np.array(dones), infos
+
+
+def _worker(remote, parent_remote, env_kwargs):
+
+    parent_remote.close()
+    envs = [ExecutionEnv(**kwargs) for kwargs in env_kwargs]
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == 'step':
+                remote.send(_step_envs(envs, data))
+            elif cmd == 'reset':
+                remote.send(np.stack([env.reset() for env in envs]))
+            elif cmd == 'close':
+                break
+    finally:
+        remote.close()
+
+
+class VecEnv:
+    """ Batch of ExecutionEnv stepped in worker processes
+
+    Args:
+        env_kwargs (list): ExecutionEnv arguments of each environment
+        n_workers (int): worker processes, each one holding a slice of
+                         the environments. 0 to step them in this
+                         process. Defaults to one per env up to the
+                         number of CPUs
+        start_method (str): multiprocessing start method
+    """
+
+    def __init__(self, env_kwargs, n_workers=None, start_method=None):
+        self.n_envs = len(env_kwargs)
+        if n_workers is None:
+            n_workers = min(self.n_envs, mp.cpu_count())
+        self.n_workers = n_workers
+        self._waiting = False
+        if n_workers == 0:
+            self.envs = [ExecutionEnv(**kwargs) for kwargs in env_kwargs]
+            self.obs_size = self.envs[0].obs_size
+            return
+        self.envs = None
+        ctx = mp.get_context(start_method)
+        self._slices = np.array_split(np.arange(self.n_envs), n_workers)
+        self.remotes = []
+        self.processes = []
+        for idx in self._slices:
+            remote, work_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker, daemon=True,
+                args=(work_remote, remote, [env_kwargs[i] for i in idx]))
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+        self.obs_size = len(observation_names(env_kwargs[0].get('depth', 5)))
+
+    def reset(self):
+        """ Reset every environment
+
+        Returns:
+            stacked observations, shape (n_envs, obs_size)
+        """
+
+        if self.envs is not None:
+            return np.stack([env.reset() for env in self.envs])
+        for remote in self.remotes:
+            remote.send(('reset', None))
+        return np.concatenate([remote.recv() for remote in self.remotes])
+
+    def step_async(self, actions):
+        """ Send the actions to the workers without waiting """
+
+        self._actions = actions
+        if self.envs is None:
+            for remote, idx in zip(self.remotes, self._slices):
+                remote.send(('step', [actions[i] for i in idx]))
+        self._waiting = True
+
+    def step_wait(self):
+        """ Wait for the step sent by step_async
+
+        Returns:
+            (observations, rewards, dones, infos) stacked over envs
+        """
+
+        self._waiting = False
+        if self.envs is not None:
+            return _step_envs(self.envs, self._actions)
+        results = [remote.recv() for remote in self.remotes]
+        obs, rewards, dones, infos = zip(*results)
+        return (np.concatenate(obs), np.concatenate(rewards),
+                np.concatenate(dones), [info for worker_infos in infos
+                                        for info in worker_infos])
+
+    def step(self, actions):
+
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+
+        if self.envs is not None:
+            return
+        if self._waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(('close', None))
+        for process in self.processes:
+            process.join()
+        self.remotes = []
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
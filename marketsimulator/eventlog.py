@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Compressed L3 log of every event of the matching engine.
+
+When an EventLog is started (Orderbook.start_event_log or the
+event_log argument of the Gateway), the Orderbook appends a record for
+every book-changing event:
+
+    ADD: a new order reached the book (before being matched)
+    CANCEL: qty is the cancelled leavesqty
+    MODIF: qty is the quantity removed
+    AMEND: qty and price are the new ones (pegged repricings included)
+    EXEC: uid is the resting order, other_uid the aggressor, is_buy the
+          side of the aggressor. In auctions uid is the seller,
+          other_uid the buyer and is_buy -1
+    IMPACT: the price of a historical order was moved by our market
+            impact. price is the historical price (the ADD that follows
+            has the shifted one) and qty the market impact
+
+Appending is a list append in the engine thread. Every chunk_size
+events the chunk is handed to a background thread that encodes it
+(timestamps as deltas, prices as tick indexes of the band, off-ladder
+prices such as np.inf kept aside) and writes it compressed to
+{path}-{n:05d}.npz.
+
+    >>> gtw = Gateway(ticker='san', date=session, event_log='run')
+    >>> gtw.move_n_seconds(3600)
+    >>> gtw.ob.stop_event_log()
+    >>> events = read_event_log('run')
+
+"""
+
+import glob
+import queue
+import threading
+import numpy as np
+from marketsimulator.prices_idx import ladder_ticks, tick_to_price
+from marketsimulator.timestamps import to_ns
+
+ADD = 0
+CANCEL = 1
+MODIF = 2
+AMEND = 3
+EXEC = 4
+IMPACT = 5
+EVENT_KINDS = ['add', 'cancel', 'modif', 'amend', 'exec', 'impact']
+FIELDS = ['kind', 'uid', 'other_uid', 'is_buy', 'qty', 'price', 'timestamp']
+
+
+def encode_prices(prices, band):
+    """ Tick indexes of prices, -1 for prices off the ladder
+
+    Returns:
+        (ticks, off_idx, off_prices)
+    """
+
+    finite = np.isfinite(prices)
+    ticks, on_ladder = ladder_ticks(np.where(finite, prices, 0.), band)
+    on_ladder &= finite
+    off_idx = np.flatnonzero(~on_ladder)
+    return np.where(on_ladder, ticks, -1), off_idx, prices[off_idx]
+
+
+def decode_prices(ticks, off_idx, off_prices, band):
+
+    prices = tick_to_price(ticks, band)
+    prices[off_idx] = off_prices
+    return prices
+
+
+class EventLog:
+    """ Event buffer of an Orderbook with a background writer
+
+    Args:
+        path (str): prefix of the chunk files
+        band (str): liquidity band, for the tick encoding of prices
+        chunk_size (int): events per chunk file
+    """
+
+    def __init__(self, path, band, chunk_size=100_000):
+        self.path = path
+        self.band = band
+        self.chunk_size = chunk_size
+        self.n_events = 0
+        self.n_chunks = 0
+        self._events = []
+        self._last_time = 0
+        self._chunks = queue.Queue()
+        self._error = None
+        self._writer = threading.Thread(target=self._write_chunks,
+                                        daemon=True)
+        self._writer.start()
+
+    def log(self, kind, uid, other_uid, is_buy, qty, price, timestamp=None):
+        """ Append an event. Events without timestamp take the one of
+        the previous event
+        """
+
+        if timestamp is None:
+            timestamp = self._last_time
+        else:
+            if type(timestamp) is not int:
+                timestamp = to_ns(timestamp)
+            self._last_time = timestamp
+        self._events.append((kind, uid, other_uid, is_buy, qty, price,
+                             timestamp))
+        if len(self._events) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ Hand the buffered events to the writer thread """
+
+        if self._error is not None:
+            raise self._error
+        if self._events:
+            self.n_events += len(self._events)
+            self._chunks.put((self.n_chunks, self._events))
+            self.n_chunks += 1
+            self._events = []
+
+    def close(self):
+        """ Write the remaining events and stop the writer thread """
+
+        self.flush()
+        self._chunks.put(None)
+        self._writer.join()
+        if self._error is not None:
+            raise self._error
+
+    def _write_chunks(self):
+
+        while True:
+            item = self._chunks.get()
+            if item is None:
+                return
+            try:
+                self._write_chunk(*item)
+            except Exception as error:
+                self._error = error
+
+    def _write_chunk(self, n, events):
+
+        kind, uid, other_uid, is_buy, qty, price, timestamp = zip(*events)
+        time = np.array(timestamp, dtype=np.int64)
+        ticks, off_idx, off_prices = encode_prices(
+            np.array(price, dtype=float), self.band)
+        np.savez_compressed(f'{self.path}-{n:05d}.npz',
+                            band=self.band,
+                            kind=np.array(kind, dtype=np.uint8),
+                            uid=np.array(uid, dtype=np.int64),
+                            other_uid=np.array(other_uid, dtype=np.int64),
+                            is_buy=np.array(is_buy, dtype=np.int8),
+                            qty=np.array(qty, dtype=float),
+                            time0=time[0],
+                            dtime=np.diff(time),
+                            ticks=ticks,
+                            off_idx=off_idx,
+                            off_prices=off_prices)
+
+
+def read_event_log(path):
+    """ Load every chunk of an event log
+
+    Args:
+        path (str): prefix of the chunk files
+    Returns:
+        dict of arrays, one per field of FIELDS. timestamp is
+        datetime64[ns]
+    """
+
+    files = sorted(glob.glob(
+        f'{glob.escape(path)}-[0-9][0-9][0-9][0-9][0-9].npz'))
+    if not files:
+        raise FileNotFoundError(f'No event log chunks found for {path}')
+    chunks = {field: [] for field in FIELDS}
+    for file in files:
+        with np.load(file) as chunk:
+            band = str(chunk['band'])
+            for field in ('kind', 'uid', 'other_uid', 'is_buy', 'qty'):
+                chunks[field].append(chunk[field])
+            chunks['price'].append(decode_prices(
+                chunk['ticks'], chunk['off_idx'], chunk['off_prices'], band))
+            time = np.concatenate([[0], np.cumsum(chunk['dtime'])])
+            chunks['timestamp'].append(
+                (chunk['time0'] + time).view('datetime64[ns]'))
+    return {field: np.concatenate(arrays) for field, arrays in chunks.items()}
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Online microstructure features computed during the replay.
+
+A FeatureEngine is attached to a Gateway and updated after every message
+that reaches the orderbook, so every strategy reads the same current
+values instead of deriving them again from top_bids/top_asks/trades.
+
+Features (see FeatureEngine.names):
+    mid, spread, microprice: from the best bid and ask
+    obi_{d}: orderbook imbalance (bidvol - askvol) / (bidvol + askvol)
+             of the first d levels of each side, for each d in depths
+    ofi: order flow imbalance at the touch (Cont, Kukanov & Stoikov)
+         accumulated with exponential time decay
+    tsp: trade sign pressure, signed aggressive volume over total
+         aggressive volume with exponential time decay. In [-1, 1]
+
+    >>> fe = gtw.attach(FeatureEngine(depths=(1, 5), halflife=10))
+    >>> gtw.move_n_seconds(60)
+    >>> fe['microprice'], fe.values
+
+"""
+
+import numpy as np
+from marketsimulator.timestamps import NS, to_ns
+
+
+class FeatureEngine:
+    """ Incrementally updated vector of microstructure features
+
+    Args:
+        depths (tuple): number of levels used in each imbalance feature
+        halflife (float): seconds of simulated time for the decay of ofi
+                          and tsp
+        record (bool): keep the time series of every update,
+                       available through history()
+    """
+
+    def __init__(self, depths=(1, 5, 10), halflife=10., record=False):
+        self.depths = tuple(depths)
+        self.max_depth = max(self.depths)
+        self.decay_rate = np.log(2) / (halflife * NS)
+        self.names = (['mid', 'spread', 'microprice']
+                      + [f'obi_{d}' for d in self.depths]
+                      + ['ofi', 'tsp'])
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.values = np.full(len(self.names), np.nan)
+        self.record = record
+        self.n_updates = 0
+        self._hist_time = np.empty(0, dtype=np.int64)
+        self._hist_values = np.empty((0, len(self.names)))
+        # state of the incremental features
+        self._last_ns = None
+        self._bbo = None
+        self._ofi = 0.
+        self._signed_vol = 0.
+        self._trade_vol = 0.
+        self._ntrds = 0
+
+    def __getitem__(self, name):
+        return self.values[self.index[name]]
+
+    def on_message(self, gtw):
+        """ Gateway observer callback, called after every message """
+
+        self.update(gtw.ob, gtw.ob_ns)
+
+    def update(self, ob, timestamp):
+        """ Update every feature with the current state of the orderbook
+
+        Args:
+            ob (Orderbook): orderbook to read
+            timestamp (int): time of the last message in nanoseconds
+                             (datetime and datetime64 are converted)
+        """
+
+        now = to_ns(timestamp)
+        if self._last_ns is not None and now > self._last_ns:
+            decay = np.exp(-self.decay_rate * (now - self._last_ns))
+            self._ofi *= decay
+            self._signed_vol *= decay
+            self._trade_vol *= decay
+        self._last_ns = now
+
+        bids = ob.top_levels(True, self.max_depth)
+        asks = ob.top_levels(False, self.max_depth)
+        values = self.values
+        values[:] = np.nan
+
+        if bids and asks:
+            bpx, bvol = bids[0].price, bids[0].vol
+            apx, avol = asks[0].price, asks[0].vol
+            values[0] = (bpx + apx) / 2
+            values[1] = apx - bpx
+            values[2] = (bpx * avol + apx * bvol) / (bvol + avol)
+            self._update_ofi(bpx, bvol, apx, avol)
+        else:
+            self._bbo = None
+
+        bid_cumvol = np.cumsum([level.vol for level in bids])
+        ask_cumvol = np.cumsum([level.vol for level in asks])
+        for i, depth in enumerate(self.depths):
+            if len(bids) and len(asks):
+                bvol = bid_cumvol[min(depth, len(bids)) - 1]
+                avol = ask_cumvol[min(depth, len(asks)) - 1]
+                values[3 + i] = (bvol - avol) / (bvol + avol)
+
+        if ob.ntrds > self._ntrds:
+            vol = ob.trades['vol'][self._ntrds:ob.ntrds]
+            buy_init = ob.trades['buy_init'][self._ntrds:ob.ntrds]
+            # auction trades (buy_init nan) have no sign
+            sign = np.where(buy_init == 1, 1., np.where(buy_init == 0,
+                                                        -1., 0.))
+            self._signed_vol += np.dot(sign, vol)
+            self._trade_vol += vol.sum()
+            self._ntrds = ob.ntrds
+        elif ob.ntrds < self._ntrds:
+            # trades were reset in the orderbook
+            self._ntrds = ob.ntrds
+
+        values[-2] = self._ofi
+        if self._trade_vol > 0:
+            values[-1] = self._signed_vol / self._trade_vol
+
+        self.n_updates += 1
+        if self.record:
+            self._append(now)
+
+    def _update_ofi(self, bpx, bvol, apx, avol):
+
+        if self._bbo is not None:
+            prev_bpx, prev_bvol, prev_apx, prev_avol = self._bbo
+            e = 0.
+            if bpx >= prev_bpx:
+                e += bvol
+            if bpx <= prev_bpx:
+                e -= prev_bvol
+            if apx <= prev_apx:
+                e -= avol
+            if apx >= prev_apx:
+                e += prev_avol
+            self._ofi += e
+        self._bbo = (bpx, bvol, apx, avol)
+
+    def _append(self, now):
+
+        pos = self.n_updates - 1
+        if pos >= len(self._hist_time):
+            size = max(1024, 2 * len(self._hist_time))
+            self._hist_time = np.resize(self._hist_time, size)
+            values = np.full((size, len(self.names)), np.nan)
+            values[:pos] = self._hist_values[:pos]
+            self._hist_values = values
+        self._hist_time[pos] = now
+        self._hist_values[pos] = self.values
+
+    def history(self):
+        """ Returns the recorded time series of the features
+
+        Returns:
+            dict with 'time' (datetime64[ns]) and one array per feature
+        """
+
+        if not self.record:
+            raise ValueError('FeatureEngine created with record=False')
+        n = self.n_updates
+        hist = {'time': self._hist_time[:n].view('datetime64[ns]')}
+        for i, name in enumerate(self.names):
+            hist[name] = self._hist_values[:n, i]
+        return hist
@@ -6,13 +6,53 @@ Created on Sat Jun 15 22:32:58 2019
 @author: paco
 """
 
-import pandas as pd
 import numpy as np
 from marketsimulator.orderbook import Orderbook
-from datetime import datetime, timedelta
+from datetime import datetime
 from collections import deque, namedtuple
-import pdb
 import os
+from marketsimulator.journal import (Journal, read_journal, ORDTYPES,
+                                     PEG_TYPES, FILL)
+from marketsimulator.checkpoint import load_checkpoints
+from marketsimulator.invariants import InvariantChecker
+from marketsimulator.mdview import DelayedMarketData
+from marketsimulator.memory import object_array_size
+from marketsimulator.timestamps import (delta_ns, seconds_ns, to_datetime64,
+                                        to_ns)
+
+
+def session_file(data_path, ticker, date):
+    """ Path of the csv file with the historical orders of a session """
+
+    return f'{data_path}/orders-{ticker}-{date.year}-{date.month}-{date.day}.csv'
+
+
+def load_session(data_path, ticker, date):
+    """ Load the historical orders of a session from its csv file
+
+    Args:
+        data_path (str): folder with the orders-{ticker}-{date}.csv files
+        ticker (str): symbol of the shares
+        date (date): date of the session
+    Returns:
+        hist_orders (ndarray): one row per historical message
+        col_idx (dict): column position of each field in hist_orders
+    """
+
+    import pandas as pd
+    session = session_file(data_path, ticker, date)
+    csv = pd.read_csv(session, sep=';', float_precision='round_trip')
+    # int64 nanoseconds since epoch, see marketsimulator.timestamps
+    csv['timestamp'] = pd.to_datetime(csv['timestamp']).astype(
+        'datetime64[ns]').astype(np.int64)
+
+    # we store index positions of columns for array indexing
+    columns = csv.columns
+    col_idx = {}
+    for col_name in csv.columns:
+        col_idx.update({col_name: np.argmax(columns == col_name)})
+
+    return csv.values, col_idx
 
 
 class Gateway:
@@ -57,79 +97,255 @@ class Gateway:
                         to the orderbook (orderbook data one way 
                                      + algo decission time
                                      + orderbook access one way)        
+        data_path (str): folder with the historical orders csv files.
+                         Defaults to data/historic_orders
+        journal (str): if given, path of a binary journal where every
+                       own message and fill will be recorded
+        checkpoints (bool): start from the last checkpoint before start_h
+                            if the session has a checkpoint file (see
+                            checkpoint.build_checkpoints). Default True
+        session (tuple): (hist_orders, col_idx) to replay instead of the
+                         session file, e.g. synthetic.to_session output
+        maker_fee (float): fee rate over traded value of our passive fills
+        taker_fee (float): fee rate over traded value of our aggressive
+                           fills
+        aggregate_sweeps (bool): print one trade per price level cleared
+                                 by a historical order when it holds no
+                                 own orders (see Orderbook._sweep_level)
+        event_log (str): if given, prefix of the compressed L3 log of
+                         every event of the orderbook (see
+                         Orderbook.start_event_log). Call
+                         ob.stop_event_log() to write the last chunk
+        md_feed (str): if given, name of a shared memory block where L2
+                       snapshots and trades are published for local
+                       readers (see shmfeed.ShmReader). Release it with
+                       md_feed.close()
+        md_depth (int): price levels per side of the md_feed and md
+                        snapshots
+        pool_size (int): recycle up to pool_size Order and PriceLevel
+                         instances of finished historical orders and
+                         removed levels (see Orderbook._recycle). Default
+                         0, every order is kept
+        check_every (int): checked mode. Verify the book invariants
+                           every check_every messages (see
+                           invariants.check_book) and validate the
+                           prices sent. Default 0, fast mode
+        md_latency (int): if given, market data latency in microseconds.
+                          md is then a view of the top md_depth levels
+                          and the trades as of ob_time - md_latency (see
+                          mdview.DelayedMarketData)
                 
     """
 
     def __init__(self, **kwargs):
 
         self.path = os.path.dirname(__file__)
+        self.data_path = kwargs.get('data_path',
+                                    f'{self.path}/../data/historic_orders')
         ticker = kwargs.get('ticker')
         date = kwargs.get('date')
-        year = date.year
-        month = date.month
-        day = date.day
-        start_h = kwargs.get('start_h', 9)
-        end_h = kwargs.get('end_h', 17.5)
-        start_secs = int(start_h * 3600)
-        end_secs = int(end_h * 3600)
-        start_time = datetime(year, month, day) + timedelta(0, start_secs)
-        end_time = datetime(year, month, day) + timedelta(0, end_secs)
-        self.ob_time = start_time
+        self.ticker = ticker
+        self.start_h = kwargs.get('start_h', 9)
+        self.end_h = kwargs.get('end_h', 17.5)
         self.latency = kwargs.get('latency', 20000)
+        self.use_checkpoints = kwargs.get('checkpoints', True)
         self.my_queue = deque()
-        self.ob_idx = 0
         resilience = kwargs.get('resilience', 1)
         max_impact = kwargs.get('max_impact', 20)
         self.ob = Orderbook(ticker=ticker,
                             max_impact=max_impact,
-                            resilience=resilience)
-        date = f'{year}-{month}-{day}'
-        self.ob.date = ticker, date
+                            resilience=resilience,
+                            maker_fee=kwargs.get('maker_fee', 0.),
+                            taker_fee=kwargs.get('taker_fee', 0.),
+                            aggregate_sweeps=kwargs.get('aggregate_sweeps',
+                                                        False),
+                            pool_size=kwargs.get('pool_size', 0),
+                            checked=bool(kwargs.get('check_every')))
+        if kwargs.get('event_log') is not None:
+            self.ob.start_event_log(kwargs['event_log'])
         self.OrdTuple = namedtuple('Order',
                                    'ordtype uid is_buy qty price timestamp')
         self.my_last_uid = 0
+        # objects notified after every message processed by the orderbook
+        self.observers = []
+        # pegged orders: specs of queued ones, repricings on the fly
+        self._peg_specs = dict()
+        self._reprice_pending = set()
+        self._peg_bbo = None
+
+        session = kwargs.get('session')
+        if session is None:
+            session = load_session(self.data_path, ticker, date)
+        else:
+            # checkpoint files belong to the session csv files
+            self.use_checkpoints = False
+        self.open_session(date, session)
+
+        journal = kwargs.get('journal')
+        if journal is None:
+            self.journal = None
+        else:
+            self.journal = self.attach(Journal(journal))
+
+        md_feed = kwargs.get('md_feed')
+        if md_feed is None:
+            self.md_feed = None
+        else:
+            # multiprocessing.shared_memory needs python 3.8
+            from marketsimulator.shmfeed import ShmPublisher
+            self.md_feed = self.attach(ShmPublisher(
+                md_feed, depth=kwargs.get('md_depth', 5)))
+
+        md_latency = kwargs.get('md_latency')
+        if md_latency is None:
+            self.md = None
+        else:
+            self.md = self.attach(DelayedMarketData(
+                self, md_latency, depth=kwargs.get('md_depth', 5)))
+
+        check_every = kwargs.get('check_every', 0)
+        if check_every:
+            self.invariant_checker = self.attach(
+                InvariantChecker(check_every))
+        else:
+            self.invariant_checker = None
 
-        # load historical orders from csv file
-        session = f'{self.path}/../data/historic_orders/orders-{ticker}-{date}.csv'
-        csv = pd.read_csv(session, sep=';', float_precision='round_trip')
-        csv['timestamp'] = pd.to_datetime(csv['timestamp'])
+    def open_session(self, date, session):
+        """ Start the replay of a historical session. The orderbook is
+        filled with the first orders of the session (the book right after
+        the opening auction) and moved until start_h.
+
+        Args:
+            date (date): date of the session
+            session (tuple): (hist_orders, col_idx) as returned by
+                             load_session
+        """
+
+        year = date.year
+        month = date.month
+        day = date.day
+        day_ns = to_ns(datetime(year, month, day))
+        start_time = day_ns + int(self.start_h * 3600) * 10**9
+        end_time = day_ns + int(self.end_h * 3600) * 10**9
+        self.date = date
+        self.ob_ns = start_time
+        self.ob_idx = 0
+        self.ob.date = self.ticker, f'{year}-{month}-{day}'
 
         # We will be working with ndarrays instead of DataFrames for speed
-        self.hist_orders = csv.values
-        self.ob_nord = csv.shape[0]
-
-        # we store index positions of columns for array indexing
-        columns = csv.columns
-        self.col_idx = {}
-        for col_name in csv.columns:
-            self.col_idx.update({col_name:np.argmax(columns==col_name)})
-            
+        self.hist_orders, self.col_idx = session
+        self.ob_nord = self.hist_orders.shape[0]
+
         last_ord_time = self.hist_orders[-1][self.col_idx['timestamp']]
-        self.end_time = min(last_ord_time, end_time)
-        self.stop_time = self.end_time
+        self.end_ns = min(last_ord_time, end_time)
+        self.stop_ns = self.end_ns
 
-        # book positions (bid+ask) available in historical data
-        book_pos = 20
-        # send first 20 orders that will compose first orderbook snapshot
-        # this is the real orderbook that was present when the orderbook opened
-        # right after the opening auction
+        if not self._restore_checkpoint(start_time):
+            # book positions (bid+ask) available in historical data
+            book_pos = 20
+            # send first 20 orders that will compose first orderbook snapshot
+            # this is the real orderbook that was present when the orderbook
+            # opened right after the opening auction
 
-        for ord_idx in range(book_pos):
-            oborder = self.hist_orders[self.ob_idx]
-            self._send_historical_order(oborder)
+            for ord_idx in range(book_pos):
+                oborder = self.hist_orders[self.ob_idx]
+                self._send_historical_order(oborder)
 
         self.move_historic_until(start_time)
 
-        self.ob.reset_ob(reset_all=False)
+        # positions of a previous session are carried over (MultiDayGateway)
+        self.ob.reset_ob(reset_all=False, keep_positions=True)
+
+        self.in_queue = dict()
+        self.vol_in_queue = 0
+
+    def _restore_checkpoint(self, start_time):
+        """ Restore the book of the last checkpoint of the session
+        taken at or before start_time
+
+        Returns:
+            True if a checkpoint was restored
+        """
+
+        if not self.use_checkpoints:
+            return False
+        checkpoints = load_checkpoints(self.data_path, self.ticker, self.date)
+        if checkpoints is None or checkpoints.nord != self.ob_nord:
+            return False
+        i = checkpoints.nearest(start_time)
+        if i is None:
+            return False
+        self.ob_idx = checkpoints.restore(self.ob, i, keep_positions=True)
+        # time of the last message processed, as in a full replay
+        self.update_ob_time(
+            self.hist_orders[self.ob_idx - 1][self.col_idx['timestamp']])
+        return True
+
+    def save_state(self):
+        """ Snapshot of the replay position and of the historical orders
+        resting in the book, to be restored with restore_state. Own
+        orders, queued messages and trades are not kept.
+
+        Returns:
+            dict with the state
+        """
+
+        orders = [(order.uid, order.is_buy, order.qty, order.leavesqty,
+                   order.price, order.timestamp)
+                  for is_buy in (True, False)
+                  for order in self.ob.resting_orders(is_buy)
+                  if order.uid >= 0]
+        return {'orders': orders,
+                'ob_idx': self.ob_idx,
+                'ob_time': self.ob_ns,
+                'last_px': self.ob.last_px}
+
+    def restore_state(self, state):
+        """ Go back to a state returned by save_state, without reading
+        the session again. Own orders and queued messages are dropped.
+        """
 
+        self.ob.restore(state['orders'], state['last_px'])
+        self.ob_idx = state['ob_idx']
+        self.update_ob_time(state['ob_time'])
+        self.stop_ns = self.end_ns
+        self.my_queue.clear()
+        self._peg_specs.clear()
+        self._reprice_pending.clear()
+        self._peg_bbo = None
         self.in_queue = dict()
         self.vol_in_queue = 0
 
     @property
-    def next_ord_time(self):
+    def ob_time(self):
+        """ Current time of the orderbook (datetime64[ns]). The Gateway
+        keeps it in ob_ns, int nanoseconds since epoch
+        """
+
+        return to_datetime64(self.ob_ns)
+
+    @property
+    def end_time(self):
+        """ End of the session (datetime64[ns]), end_ns in nanoseconds """
+
+        return to_datetime64(self.end_ns)
+
+    @property
+    def stop_time(self):
+
+        return to_datetime64(self.stop_ns)
+
+    @property
+    def next_ord_ns(self):
+        """ Time of the next historical message in nanoseconds """
 
         return self.hist_orders[self.ob_idx][self.col_idx['timestamp']]
 
+    @property
+    def next_ord_time(self):
+
+        return to_datetime64(self.next_ord_ns)
+
     def _send_to_orderbook(self, order, is_mine):
         """ Send an order/modif/cancel to the orderbook
                 order (ndarray): order to be sent
@@ -138,8 +354,8 @@ class Gateway:
         ord_type = order[self.col_idx['ordtype']]
         timestamp = order[self.col_idx['timestamp']]
         #        ob_open = self.check_ob_open(timestamp)
-        if self.check_ord_in_time(timestamp):
-            self.update_ob_time(timestamp)
+        if timestamp <= self.stop_ns:
+            self.ob_ns = timestamp
             if ord_type == "new":
                 self.ob.send(is_buy=order[self.col_idx['is_buy']],
                              qty=order[self.col_idx['qty']],
@@ -148,48 +364,122 @@ class Gateway:
                              is_mine=is_mine,
                              timestamp=timestamp)
             elif ord_type == "cancel":
-                self.ob.cancel(uid=order[self.col_idx['uid']])
+                self.ob.cancel(uid=order[self.col_idx['uid']],
+                               timestamp=timestamp)
             elif ord_type == "modif":
                 self.ob.modif(uid=order[self.col_idx['uid']],
-                              qty_down=order[self.col_idx['qty']])
+                              qty_down=order[self.col_idx['qty']],
+                              timestamp=timestamp)
+            elif ord_type == "amend":
+                price = order[self.col_idx['price']]
+                qty = order[self.col_idx['qty']]
+                self.ob.amend(uid=order[self.col_idx['uid']],
+                              new_price=None if np.isnan(price) else price,
+                              new_qty=None if np.isnan(qty) else qty,
+                              timestamp=timestamp)
+            elif ord_type == "peg":
+                uid = order[self.col_idx['uid']]
+                peg_type, offset, limit = self._peg_specs.pop(uid)
+                self.ob.send_pegged(is_buy=order[self.col_idx['is_buy']],
+                                    qty=order[self.col_idx['qty']],
+                                    uid=uid,
+                                    peg_type=peg_type,
+                                    offset=offset,
+                                    limit=limit,
+                                    is_mine=is_mine,
+                                    timestamp=timestamp)
+            elif ord_type == "reprice":
+                uid = order[self.col_idx['uid']]
+                self._reprice_pending.discard(uid)
+                self.ob.reprice_pegged(uid, timestamp=timestamp)
             else:
                 raise ValueError(f'Unexpected ordtype: {ord_type}')
+            if self.ob._pegged:
+                self._check_pegs()
+            for observer in self.observers:
+                observer.on_message(self)
             return
         else:
-            self.update_ob_time(self.stop_time)
+            self.ob_ns = self.stop_ns
             if not is_mine:
                 self.ob_idx -= 1
             return
 
+    def attach(self, observer):
+        """ Attach an observer to the Gateway. Its on_message(gtw) method
+        will be called after every message (historical or ours) that
+        reaches the orderbook.
+
+        Args:
+            observer: any object implementing on_message(gtw)
+
+        Returns:
+            the observer, to allow one-line creation and attachment
+        """
+
+        self.observers.append(observer)
+        return observer
+
+    def detach(self, observer):
+
+        self.observers.remove(observer)
+
+    def start_auction(self):
+        """ Start the call phase of an auction in the orderbook. Every
+        message reaching the orderbook, historical or ours, is collected
+        without matching until uncross() is called.
+        """
+
+        self.ob.start_auction()
+
+    def uncross(self, reference_price=None):
+        """ Execute the auction at the current ob_time
+
+        Returns:
+            (price, volume) of the auction
+        """
+
+        result = self.ob.uncross(timestamp=self.ob_ns,
+                                 reference_price=reference_price)
+        for observer in self.observers:
+            observer.on_message(self)
+        return result
+
     def update_ob_time(self, new_ob_time):
+        """ Set the orderbook time (datetime, datetime64 or int ns) """
 
-        self.ob_time = new_ob_time
+        self.ob_ns = to_ns(new_ob_time)
 
     def move_until(self, stop_time):
+        """ Process messages until stop_time (datetime, datetime64 or
+        int ns)
+        """
 
-        self.stop_time = stop_time
+        stop_time = to_ns(stop_time)
+        self.stop_ns = stop_time
 
-        while self.ob_time < stop_time:
+        while self.ob_ns < stop_time:
             self.tick()
 
-        self.update_ob_time(stop_time)
-        self.stop_time = self.end_time
+        self.ob_ns = stop_time
+        self.stop_ns = self.end_ns
 
     def move_n_seconds(self, n_seconds):
         """ 
         """
-        stop_time = min(self.ob_time + timedelta(0, n_seconds), self.end_time)
+        stop_time = min(self.ob_ns + seconds_ns(n_seconds), self.end_ns)
         self.move_until(stop_time)
 
     def move_delta(self, delta):
+        """ Move forward a timedelta, timedelta64 or int ns """
 
-        stop_time = min(self.ob_time + delta, self.end_time)
+        stop_time = min(self.ob_ns + delta_ns(delta), self.end_ns)
         self.move_until(stop_time)
 
     def check_ord_in_time(self, ord_timestamp):
         """
         """
-        return ord_timestamp <= self.stop_time
+        return to_ns(ord_timestamp) <= self.stop_ns
 
     def _send_historical_order(self, oborder):
 
@@ -200,11 +490,12 @@ class Gateway:
 
         """ 
         Params:
-            stop_time (datetime):         
+            stop_time (datetime, datetime64 or int ns):
                 
         """
 
-        while self.ob_time <= stop_time:
+        stop_time = to_ns(stop_time)
+        while self.ob_ns <= stop_time:
             oborder = self.hist_orders[self.ob_idx]
             self._send_historical_order(oborder)
 
@@ -216,29 +507,39 @@ class Gateway:
             their theoretical arrival time (timestamp)
         """
 
-        # next historical order to be sent
-
-        oborder = self.hist_orders[self.ob_idx]
+        # next historical order to be sent (None if session exhausted)
+        if self.ob_idx < self.ob_nord:
+            oborder = self.hist_orders[self.ob_idx]
+        else:
+            oborder = None
 
         # if I have queued orders
         if self.my_queue:
             # if my order reaches the orderbook before the next historical order
-            if self.my_queue[0].timestamp < oborder[self.col_idx['timestamp']]:
+            if (oborder is None or self.my_queue[0].timestamp
+                    < oborder[self.col_idx['timestamp']]):
+                if self.my_queue[0].timestamp > self.stop_ns:
+                    # not due before the stop time, it stays queued
+                    self.ob_ns = self.stop_ns
+                    return
                 my_order = self.my_queue.popleft()
                 self._send_to_orderbook(my_order, is_mine=True)
                 self.remove_vol_in_queue(my_order[self.col_idx['uid']])
                 return
 
         # otherwise sent next historical order
-        self._send_historical_order(oborder)
+        if oborder is not None:
+            self._send_historical_order(oborder)
 
-    def queue_my_new(self, is_buy, qty, price):
+    def queue_my_new(self, is_buy, qty, price, account=None):
         """ Queue a user new order to be sent to the orderbook when time is due 
         
             Args:
                 is_buy (bool): True for buy orders
                 qty (int): quantity or volume
                 price (float): limit price of the order
+                account: position where its fills are booked
+                         (see Orderbook.position). None for the default
                 
             Reuturns:
                 An int indicating the uid that the orderbook will assign to
@@ -255,13 +556,15 @@ class Gateway:
         """
 
         self.my_last_uid -= 1
+        if account is not None:
+            self.ob.set_account(self.my_last_uid, account)
         message = self.OrdTuple(ordtype="new",
                                 uid=self.my_last_uid,
                                 is_buy=is_buy,
                                 qty=qty,
                                 price=price,
                                 timestamp=self._arrival_time())
-        self.my_queue.append(message)
+        self._queue_message(message)
 
         self.add_vol_in_queue(self.my_last_uid, qty)
 
@@ -288,7 +591,7 @@ class Gateway:
                                 qty=qty_down,
                                 price=np.nan,
                                 timestamp=self._arrival_time())
-        self.my_queue.append(message)
+        self._queue_message(message)
 
         leavesqty = self.ob.get(uid)['leavesqty']
         expected_vol_modified = (-1) * min(qty_down, leavesqty)
@@ -305,11 +608,155 @@ class Gateway:
                                 qty=np.nan,
                                 price=np.nan,
                                 timestamp=self._arrival_time())
-        self.my_queue.append(message)
+        self._queue_message(message)
 
         expected_vol_cancelled = (-1) * self.ob.get(uid)['leavesqty']
         self.add_vol_in_queue(uid, expected_vol_cancelled)
 
+    def queue_my_amend(self, uid, new_price=None, new_qty=None):
+        """ Change the price and/or quantity of an order keeping its uid,
+        with a single message (see Orderbook.amend). Downsizing at the
+        same price keeps the price-time priority, any other change
+        sends the order to the back of the queue.
+
+        Args:
+            uid (int): uid of our order to be amended
+            new_price (float): new limit price. None to keep it
+            new_qty (int): new total quantity, filled quantity included.
+                           None to keep it
+        """
+
+        message = self.OrdTuple(ordtype="amend",
+                                uid=uid,
+                                is_buy=np.nan,
+                                qty=np.nan if new_qty is None else new_qty,
+                                price=np.nan if new_price is None else new_price,
+                                timestamp=self._arrival_time())
+        self._queue_message(message)
+
+        if new_qty is not None:
+            order = self.ob.get(uid)
+            expected_vol_amended = max(new_qty - order['qty'],
+                                       (-1) * order['leavesqty'])
+            self.add_vol_in_queue(uid, expected_vol_amended)
+
+    def queue_my_peg(self, is_buy, qty, peg_type='primary', offset=0,
+                     limit=None, account=None):
+        """ Queue a user pegged order. Once in the orderbook, the order
+        is repriced by the Gateway, keeping its uid, every time the
+        reference price moves. Each repricing reaches the orderbook
+        "latency" microseconds after the BBO change that triggered it,
+        without any message from the strategy.
+
+        Args:
+            is_buy (bool): True for buy orders
+            qty (int): quantity or volume
+            peg_type (str): 'primary' (best bid for buys) or
+                            'market' (best ask for buys)
+            offset (int): ticks from the reference price in the
+                          aggressive direction. E.g. offset=-1 with a
+                          market peg buys one tick below the best ask
+            limit (float): price never to be exceeded. None for no limit
+            account: see queue_my_new
+
+        Returns:
+            the uid of the order (see queue_my_new)
+        """
+
+        if peg_type not in ('primary', 'market'):
+            raise ValueError(f'Unexpected peg_type: {peg_type}')
+        self.my_last_uid -= 1
+        if account is not None:
+            self.ob.set_account(self.my_last_uid, account)
+        self._peg_specs[self.my_last_uid] = (peg_type, offset, limit)
+        message = self.OrdTuple(ordtype="peg",
+                                uid=self.my_last_uid,
+                                is_buy=is_buy,
+                                qty=qty,
+                                price=np.nan if limit is None else limit,
+                                timestamp=self._arrival_time())
+        self._queue_message(message)
+
+        self.add_vol_in_queue(self.my_last_uid, qty)
+
+        return self.my_last_uid
+
+    def _check_pegs(self):
+        """ Queue a reprice message for every pegged order out of target
+        when the BBO has changed
+        """
+
+        bbo = (self.ob._bids.best and self.ob._bids.best.price,
+               self.ob._asks.best and self.ob._asks.best.price)
+        if bbo == self._peg_bbo:
+            return
+        self._peg_bbo = bbo
+        for uid in self.ob.pegs_to_reprice():
+            if uid not in self._reprice_pending:
+                self._reprice_pending.add(uid)
+                self._insert_by_time(self.OrdTuple(
+                    ordtype="reprice",
+                    uid=uid,
+                    is_buy=np.nan,
+                    qty=np.nan,
+                    price=np.nan,
+                    timestamp=self._arrival_time()))
+
+    def _insert_by_time(self, message):
+        """ Queue a message behind every queued message arriving at or
+        before its time. Messages queued ahead of time (replay_journal)
+        can arrive later than a reprice generated during the replay.
+        """
+
+        queue = self.my_queue
+        i = len(queue)
+        while i > 0 and queue[i - 1].timestamp > message.timestamp:
+            i -= 1
+        queue.insert(i, message)
+
+    def _queue_message(self, message):
+
+        self.my_queue.append(message)
+        if self.journal is not None:
+            self.journal.record_message(message,
+                                        self._peg_specs.get(message.uid))
+
+    def replay_journal(self, path):
+        """ Queue every message recorded in a journal, with its recorded
+        arrival time, so that the session can be replayed without running
+        the strategy that produced them. Call it right after creating the
+        Gateway with the same session and start_h as the recorded run,
+        then move the Gateway forward as usual.
+
+        Args:
+            path (str): journal written by a previous run
+        """
+
+        records = read_journal(path)
+        records = records[records['kind'] != FILL]
+        for record, timestamp in zip(records, records['timestamp'].tolist()):
+            kind = int(record['kind'])
+            uid = int(record['uid'])
+            if kind in PEG_TYPES:
+                ordtype = 'peg'
+                limit = record['price']
+                self._peg_specs[uid] = (PEG_TYPES[kind],
+                                        int(record['offset']),
+                                        None if np.isnan(limit) else limit)
+            else:
+                ordtype = ORDTYPES[kind]
+            message = self.OrdTuple(ordtype=ordtype,
+                                    uid=uid,
+                                    is_buy=(np.nan if record['is_buy'] < 0
+                                            else bool(record['is_buy'])),
+                                    qty=record['qty'],
+                                    price=record['price'],
+                                    timestamp=timestamp)
+            self._queue_message(message)
+            if ordtype in ('new', 'peg'):
+                self.add_vol_in_queue(uid, record['qty'])
+            self.my_last_uid = min(self.my_last_uid, uid)
+
     def add_vol_in_queue(self, uid, qty):
 
         self.in_queue[uid] = qty
@@ -317,7 +764,7 @@ class Gateway:
 
     def remove_vol_in_queue(self, uid):
 
-        qty = self.in_queue.pop(uid)
+        qty = self.in_queue.pop(uid, 0)
         self.vol_in_queue -= qty
 
     def ord_status(self, uid):
@@ -332,7 +779,7 @@ class Gateway:
         KeyError exception that will have to be handled.        
         
         """
-        # TODO: use ticker to select orderbook 
+        # one orderbook per Gateway, see MultiGateway for several tickers
         return self.ob.get(uid)
     
     def price_is_mine(self, uid, is_buy):
@@ -362,8 +809,25 @@ class Gateway:
         
         """
 
-        return self.ob_time + timedelta(0, 0, self.latency)
+        # latency is in microseconds
+        return self.ob_ns + int(self.latency * 1000)
+
+    def memory_report(self):
+        """ Orderbook.memory_report plus the session buffer and the
+        queue of own messages
+
+        Returns:
+            dict of counts and '*_bytes' estimates
+        """
+
+        report = self.ob.memory_report()
+        report['session_messages'] = self.ob_nord
+        report['session_bytes'] = object_array_size(self.hist_orders)
+        report['queued_messages'] = len(self.my_queue)
+        report['total_bytes'] += report['session_bytes']
+        return report
 
     def plot(self):
+        import pandas as pd
         trades = pd.DataFrame(self.ob.trades)
         return trades
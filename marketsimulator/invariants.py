@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Invariants of the orderbook structures.
+
+The matching loop carries no consistency checks. In checked mode
+(Gateway check_every kwarg, or an InvariantChecker attached by hand)
+the whole book is verified every N messages and the first violation
+raises BookInvariantError:
+
+    - every PriceLevel is stored under its price, is not empty and has
+      a finite price, and best is the highest bid / lowest ask
+    - the queue of each level is a consistent doubly linked list of
+      active orders of its side and price, in arrival order, whose
+      leavesqty add up to the level vol and count
+    - the book is not crossed
+    - every resting order is the one stored in Orderbook._orders under
+      its uid, and no other order of _orders is active
+
+    >>> gtw = Gateway(ticker='san', date=date(2019, 5, 23), check_every=100)
+    >>> gtw.move_n_seconds(3600)
+
+"""
+
+import numpy as np
+
+
+class BookInvariantError(Exception):
+    """ The orderbook structures are inconsistent """
+
+
+def check_book(ob):
+    """ Verify the invariants of an Orderbook
+
+    Args:
+        ob (Orderbook): orderbook to verify
+    Returns:
+        number of resting orders checked
+    Raises:
+        BookInvariantError: describing the first violation found
+    """
+
+    n_resting = 0
+    for halfbook, is_buy in ((ob._bids, True), (ob._asks, False)):
+        n_resting += _check_side(ob, halfbook, is_buy)
+
+    bid, ask = ob._bids.best, ob._asks.best
+    if bid is not None and ask is not None and bid.price >= ask.price:
+        raise BookInvariantError(
+            f'Crossed book: bid {bid.price} >= ask {ask.price}')
+
+    n_active = sum(1 for order in ob._orders.values() if order.active)
+    if n_active != n_resting:
+        raise BookInvariantError(
+            f'{n_active} active orders but {n_resting} resting in the book')
+    return n_resting
+
+
+def _check_side(ob, halfbook, is_buy):
+
+    side = 'bid' if is_buy else 'ask'
+    book = halfbook.book
+    if not book:
+        if halfbook.best is not None:
+            raise BookInvariantError(f'Empty {side} side with a best level')
+        return 0
+    best_price = max(book) if is_buy else min(book)
+    if halfbook.best is not book[best_price]:
+        raise BookInvariantError(f'Best {side} is not the level at '
+                                 f'{best_price}')
+
+    n_resting = 0
+    for price, level in book.items():
+        where = f'{side} level {price}'
+        if level.price != price or not np.isfinite(price):
+            raise BookInvariantError(f'{where} has price {level.price}')
+        if level.head is None:
+            raise BookInvariantError(f'{where} is empty')
+        if level.head.prev is not None or level.tail.next is not None:
+            raise BookInvariantError(f'{where} has dangling ends')
+        vol = count = 0
+        prev = None
+        order = level.head
+        while order is not None:
+            if order.prev is not prev:
+                raise BookInvariantError(
+                    f'{where}: broken prev link at uid {order.uid}')
+            if prev is not None and order.seq <= prev.seq:
+                raise BookInvariantError(
+                    f'{where}: uid {order.uid} out of arrival order')
+            if (not order.active or order.leavesqty <= 0
+                    or order.price != price or order.is_buy != is_buy):
+                raise BookInvariantError(
+                    f'{where}: invalid resting order uid {order.uid}')
+            if ob._orders.get(order.uid) is not order:
+                raise BookInvariantError(
+                    f'{where}: uid {order.uid} is not the order in _orders')
+            vol += order.leavesqty
+            count += 1
+            prev = order
+            order = order.next
+        if prev is not level.tail:
+            raise BookInvariantError(f'{where}: tail is not the last order')
+        if (vol, count) != (level.vol, level.count):
+            raise BookInvariantError(
+                f'{where}: queue holds {vol} in {count} orders, counters '
+                f'say {level.vol} in {level.count}')
+        n_resting += count
+    return n_resting
+
+
+class InvariantChecker:
+    """ Gateway observer running check_book every n messages
+
+    Args:
+        every (int): messages between two verifications
+    """
+
+    def __init__(self, every=1000):
+        if every < 1:
+            raise ValueError(f'every must be positive: {every}')
+        self.every = every
+        self.n_messages = 0
+        self.n_checks = 0
+
+    def on_message(self, gtw):
+        """ Gateway observer callback """
+
+        self.n_messages += 1
+        if self.n_messages % self.every == 0:
+            self.check(gtw.ob)
+
+    def check(self, ob):
+
+        # the call phase of an auction collects orders without resting them
+        if ob.in_auction:
+            return
+        check_book(ob)
+        self.n_checks += 1
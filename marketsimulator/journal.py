@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Binary journal of own-order activity for deterministic record/replay.
+
+Every message queued through the Gateway (new/modif/cancel/amend/peg) is
+written with its arrival time at the orderbook, together with every
+resulting fill of our orders. Records have the fixed layout JOURNAL_DTYPE and are
+appended to the file after a small header, so a journal can be read
+back with a single np.fromfile and two journals compared vectorized.
+
+    >>> gtw = Gateway(ticker='san', date=session, journal='run.jrnl')
+    ... # run the strategy
+    >>> gtw.journal.close()
+
+    >>> replay = Gateway(ticker='san', date=session, journal='new.jrnl')
+    >>> replay.replay_journal('run.jrnl')
+    >>> replay.journal.close()
+    >>> diff_journals('run.jrnl', 'new.jrnl')  # None if identical
+
+"""
+
+import os
+import numpy as np
+from marketsimulator.timestamps import to_ns
+
+MAGIC = b'PMEJRN01'
+JOURNAL_DTYPE = np.dtype([('kind', 'u1'),
+                          ('is_buy', 'i1'),
+                          ('uid', '<i8'),
+                          ('qty', '<f8'),
+                          ('price', '<f8'),
+                          ('timestamp', '<i8'),
+                          ('offset', '<i4')])
+# record kinds
+NEW = 0
+MODIF = 1
+CANCEL = 2
+FILL = 3
+PEG_PRIMARY = 4
+PEG_MARKET = 5
+AMEND = 6
+KINDS = {'new': NEW, 'modif': MODIF, 'cancel': CANCEL, 'amend': AMEND}
+ORDTYPES = {kind: ordtype for ordtype, kind in KINDS.items()}
+PEG_KINDS = {'primary': PEG_PRIMARY, 'market': PEG_MARKET}
+PEG_TYPES = {kind: peg_type for peg_type, kind in PEG_KINDS.items()}
+
+
+class Journal:
+    """ Append-only writer of own-order messages and fills
+
+    A Journal is also a Gateway observer: after every message it
+    writes the new rows of the orderbook my_trades as FILL records.
+
+    Args:
+        path (str): journal file. Records are appended if it exists
+        buffer_size (int): records held in memory between writes
+    """
+
+    def __init__(self, path, buffer_size=4096):
+        self.path = path
+        self.buffer_size = buffer_size
+        self._buffer = []
+        self._my_ntrds = 0
+        self.n_records = 0
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'ab')
+        if new_file:
+            self._file.write(MAGIC)
+
+    def record_message(self, message, peg=None):
+        """ Record a message queued by Gateway.queue_my_*
+
+        Args:
+            message (OrdTuple): queued message
+            peg (tuple): (peg_type, offset, limit) of pegged orders
+        """
+
+        is_buy = message.is_buy
+        if peg is None:
+            kind = KINDS[message.ordtype]
+            offset = 0
+        else:
+            kind = PEG_KINDS[peg[0]]
+            offset = peg[1]
+        # modifs and cancels carry is_buy=np.nan
+        self._append((kind,
+                      -1 if is_buy != is_buy else int(is_buy),
+                      message.uid,
+                      message.qty,
+                      message.price,
+                      to_ns(message.timestamp),
+                      offset))
+
+    def on_message(self, gtw):
+        """ Gateway observer callback, records our new fills """
+
+        ob = gtw.ob
+        if ob.my_ntrds < self._my_ntrds:
+            # trades were reset in the orderbook
+            self._my_ntrds = 0
+        for i in range(self._my_ntrds, ob.my_ntrds):
+            uid = int(ob.my_trades['my_uid'][i])
+            self._append((FILL,
+                          int(ob._orders[uid].is_buy),
+                          uid,
+                          ob.my_trades['vol'][i],
+                          ob.my_trades['price'][i],
+                          int(ob.my_trades['timestamp'][i]),
+                          0))
+        self._my_ntrds = ob.my_ntrds
+
+    def _append(self, record):
+
+        self._buffer.append(record)
+        self.n_records += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+
+        if self._buffer:
+            np.array(self._buffer, dtype=JOURNAL_DTYPE).tofile(self._file)
+            self._buffer = []
+        self._file.flush()
+
+    def close(self):
+
+        self.flush()
+        self._file.close()
+
+
+def read_journal(path):
+    """ Load a journal file
+
+    Returns:
+        structured ndarray with dtype JOURNAL_DTYPE
+    """
+
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a journal file')
+        return np.fromfile(f, dtype=JOURNAL_DTYPE)
+
+
+def diff_journals(path_a, path_b, kinds=None):
+    """ Compare two journals record by record
+
+    Args:
+        path_a (str): first journal
+        path_b (str): second journal
+        kinds (list): only compare records of these kinds, e.g. [FILL]
+    Returns:
+        index of the first differing record (within the compared kinds),
+        or None if both journals are identical
+    """
+
+    a = read_journal(path_a)
+    b = read_journal(path_b)
+    if kinds is not None:
+        a = a[np.isin(a['kind'], kinds)]
+        b = b[np.isin(b['kind'], kinds)]
+    n = min(len(a), len(b))
+    # compare raw bytes so that nan fields compare equal
+    a_bytes = a[:n].view(np.uint8).reshape(n, JOURNAL_DTYPE.itemsize)
+    b_bytes = b[:n].view(np.uint8).reshape(n, JOURNAL_DTYPE.itemsize)
+    diff = np.flatnonzero((a_bytes != b_bytes).any(axis=1))
+    if len(diff):
+        return int(diff[0])
+    if len(a) != len(b):
+        return n
+    return None
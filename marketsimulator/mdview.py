@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Market data as seen by a strategy, md_latency behind the orderbook.
+
+Gateway.ob is the book as it is at ob_time. A strategy only knows the
+book as it was md_latency microseconds ago, the time the market data
+takes to reach it. DelayedMarketData is a Gateway observer keeping the
+top depth levels of each side in a ring of snapshots, one per change of
+those levels, and answering L1, L2 and trade queries as of
+md_time = ob_time - md_latency. Snapshots older than the one in force
+at md_time are dropped, so the ring only holds the changes of the last
+md_latency. Trades need no copy: the trade arrays of the orderbook are
+in time order and the view ends at the last trade up to md_time.
+
+    >>> gtw = Gateway(ticker='san', date=date(2019, 5, 23), md_latency=500)
+    >>> gtw.move_n_seconds(60)
+    >>> gtw.md.bbid, gtw.ob.bbid
+    ((7.31, 1200), (7.32, 800))
+
+Queries before the first snapshot (the book when the view was created)
+see that first snapshot.
+"""
+
+from collections import deque
+from heapq import nlargest, nsmallest
+import numpy as np
+from marketsimulator.timestamps import to_datetime64
+
+
+class DelayedMarketData:
+    """ Gateway observer exposing the book and trades md_latency ago
+
+    Args:
+        gtw (Gateway): gateway whose orderbook is observed
+        md_latency (int): market data latency in microseconds
+        depth (int): price levels per side kept in the snapshots
+    """
+
+    def __init__(self, gtw, md_latency, depth=5):
+        if md_latency < 0:
+            raise ValueError(f'md_latency cannot be negative: {md_latency}')
+        self.gtw = gtw
+        self.md_latency = md_latency
+        self.latency_ns = int(md_latency * 1000)
+        self.depth = depth
+        # (time, bids, asks) with time in int ns and the levels of each
+        # side as tuples of (price, vol), best first
+        self._ring = deque()
+        # (halfbook, version, PriceLevels) of the bids and the asks
+        self._top_levels = [(None, 0, []), (None, 0, [])]
+        self._snapshot()
+
+    @property
+    def md_ns(self):
+        """ Time of the view in int nanoseconds since epoch """
+
+        return self.gtw.ob_ns - self.latency_ns
+
+    @property
+    def md_time(self):
+
+        return to_datetime64(self.md_ns)
+
+    def _levels(self):
+
+        ob = self.gtw.ob
+        return self._side(ob._bids, 0), self._side(ob._asks, 1)
+
+    def _side(self, halfbook, i):
+        """ (price, vol) of the top levels of a side. The levels are
+        only selected again when the side gained or lost a level
+        """
+
+        cached = self._top_levels[i]
+        if cached[0] is not halfbook or cached[1] != halfbook.version:
+            # the levels dicts are short, selecting their best keys is
+            # cheaper than walking the tick ladder as top_levels does
+            book = halfbook.book
+            select = nlargest if i == 0 else nsmallest
+            cached = (halfbook, halfbook.version,
+                      [book[px] for px in select(self.depth, book)])
+            self._top_levels[i] = cached
+        return tuple([(level.price, level.vol) for level in cached[2]])
+
+    def _snapshot(self):
+
+        self._ring.append((self.gtw.ob_ns, *self._levels()))
+
+    def on_message(self, gtw):
+        """ Gateway observer callback """
+
+        ring = self._ring
+        now = gtw.ob_ns
+        if now < ring[-1][0]:
+            # the session was reopened or restored
+            ring.clear()
+            self._snapshot()
+            return
+        bids, asks = self._levels()
+        last = ring[-1]
+        if bids != last[1] or asks != last[2]:
+            if now == last[0]:
+                # only the state after the last message of a time is seen
+                ring[-1] = (now, bids, asks)
+            else:
+                ring.append((now, bids, asks))
+        self._current()
+
+    def _current(self):
+        """ Snapshot in force at md_ns, dropping the older ones """
+
+        ring = self._ring
+        md_ns = self.md_ns
+        while len(ring) > 1 and ring[1][0] <= md_ns:
+            ring.popleft()
+        return ring[0]
+
+    @property
+    def bbid(self):
+        """ (price, vol) of the best bid at md_time, None if no bids """
+
+        bids = self._current()[1]
+        return bids[0] if bids else None
+
+    @property
+    def bask(self):
+        """ (price, vol) of the best ask at md_time, None if no asks """
+
+        asks = self._current()[2]
+        return asks[0] if asks else None
+
+    def top_bids(self, nlevels):
+        """ First nlevels (at most depth) bids at md_time, as
+        Orderbook.top_bids
+
+        Returns:
+            [prices, vols] in price desc order, nan beyond the book
+        """
+
+        return self._top(1, nlevels)
+
+    def top_asks(self, nlevels):
+        """ First nlevels (at most depth) asks at md_time, as
+        Orderbook.top_asks
+
+        Returns:
+            [prices, vols] in price asc order, nan beyond the book
+        """
+
+        return self._top(2, nlevels)
+
+    def _top(self, side, nlevels):
+
+        if nlevels > self.depth:
+            raise ValueError(f'Only {self.depth} levels are kept, '
+                             f'{nlevels} requested')
+        prices = nlevels * [np.nan]
+        vols = nlevels * [np.nan]
+        for i, (price, vol) in enumerate(self._current()[side][:nlevels]):
+            prices[i] = price
+            vols[i] = vol
+        return [prices, vols]
+
+    @property
+    def ntrds(self):
+        """ Number of trades printed up to md_time """
+
+        ob = self.gtw.ob
+        return int(np.searchsorted(ob.trades['timestamp'][:ob.ntrds],
+                                   self.md_ns, side='right'))
+
+    @property
+    def trades(self):
+        """ Trades printed up to md_time
+
+        Returns:
+            dict of arrays (views), one per orderbook STATS field, with
+            timestamp in int64 nanoseconds
+        """
+
+        ntrds = self.ntrds
+        return {stat: values[:ntrds]
+                for stat, values in self.gtw.ob.trades.items()}
+
+    @property
+    def last_px(self):
+        """ Price of the last trade up to md_time, None if no trades """
+
+        ntrds = self.ntrds
+        return self.gtw.ob.trades['price'][ntrds - 1] if ntrds else None
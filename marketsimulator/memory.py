@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Memory accounting of the structures that grow during a replay.
+
+Orderbook.memory_report and Gateway.memory_report return the size of
+each structure (live and terminal orders, price levels, trade buffers,
+session arrays...) with an estimate of its bytes. The estimates are
+shallow sizes from sys.getsizeof of a sample of objects, which is
+enough to tell which structure grows, not an exact RSS breakdown.
+
+MemorySampler is a Gateway observer recording the report over
+simulated time:
+
+    >>> sampler = gtw.attach(MemorySampler(interval=300))
+    >>> gtw.move_n_seconds(8 * 3600)
+    >>> sampler.growth()  # change of every field since the first sample
+
+"""
+
+import sys
+import numpy as np
+from marketsimulator.timestamps import NS
+
+
+def object_size(obj):
+    """ Bytes of an object and its attribute dict, without the objects
+    it references
+    """
+
+    size = sys.getsizeof(obj)
+    if hasattr(obj, '__dict__'):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def arrays_size(arrays):
+    """ Bytes of the buffers of a dict of ndarrays """
+
+    return sum(array.nbytes for array in arrays.values())
+
+
+def object_array_size(array, sample=1000):
+    """ Estimate of the bytes of an object ndarray: its pointers plus
+    the distinct objects it references, extrapolated from a sample of
+    rows. Objects shared between rows (e.g. interned strings) are only
+    counted once in the sample.
+    """
+
+    if array.dtype != object or len(array) == 0:
+        return array.nbytes
+    rows = array[:sample].ravel()
+    distinct = {id(obj): obj for obj in rows}
+    objects = sum(sys.getsizeof(obj) for obj in distinct.values())
+    return array.nbytes + int(objects * len(array) / min(sample, len(array)))
+
+
+class MemorySampler:
+    """ Gateway observer recording gtw.memory_report() periodically
+
+    Args:
+        interval (float): seconds of simulated time between samples
+    """
+
+    def __init__(self, interval=60.):
+        self.interval_ns = int(interval * NS)
+        self._next_ns = None
+        self.time = []
+        self.reports = []
+
+    def on_message(self, gtw):
+        """ Gateway observer callback """
+
+        now = gtw.ob_ns
+        if self._next_ns is None or now >= self._next_ns:
+            self.sample(gtw, now)
+            self._next_ns = now - now % self.interval_ns + self.interval_ns
+
+    def sample(self, gtw, now=None):
+        """ Record a report now, out of the periodic schedule """
+
+        if now is None:
+            now = gtw.ob_ns
+        self.time.append(now)
+        self.reports.append(gtw.memory_report())
+
+    def history(self):
+        """ Returns:
+            dict with 'time' (datetime64[ns]) and one array per field
+            of the report
+        """
+
+        hist = {'time': np.array(self.time, dtype=np.int64).view(
+            'datetime64[ns]')}
+        if self.reports:
+            for field in self.reports[0]:
+                hist[field] = np.array([report[field]
+                                        for report in self.reports])
+        return hist
+
+    def growth(self):
+        """ Change of every field between the first and last samples.
+        The '*_bytes' fields come first, largest growth first, then the
+        counts sorted the same way: bytes and counts are not comparable
+        """
+
+        if len(self.reports) < 2:
+            return {}
+        first, last = self.reports[0], self.reports[-1]
+        growth = {field: last[field] - first[field] for field in last}
+        return dict(sorted(growth.items(), key=lambda item: (
+            not item[0].endswith('_bytes'), -item[1])))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Continuous replay of several consecutive sessions of a ticker.
+
+MultiDayGateway walks a range of dates through a single Gateway. While
+one session is being replayed, the csv file of the next one is decoded
+in a background thread, so rolling to the next day does not wait on I/O.
+The Gateway object, and therefore every strategy or observer holding a
+reference to it, survives the session boundary, and market and own
+trading stats are accumulated across sessions (see total_stats). The
+positions of the accounts (inventory, cash, realized P&L) are carried
+over from one session to the next.
+
+    >>> gtw = MultiDayGateway(ticker='san', start_date=date(2019, 5, 20),
+    ...                       end_date=date(2019, 5, 24), latency=20_000)
+    >>> while not gtw.done:
+    ...     gtw.tick()
+    ...     algo.eval_and_act(gtw)
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import os
+from marketsimulator.gateway import Gateway, load_session, session_file
+from marketsimulator.timestamps import delta_ns, seconds_ns, to_ns
+
+SESSION_STATS = ['ntrds', 'cumvol', 'cumturn',
+                 'my_ntrds', 'my_cumvol', 'my_cumturn']
+
+
+class MultiDayGateway(Gateway):
+    """ Gateway replaying every available session between two dates
+
+    Dates without a historical orders file (weekends, holidays...)
+    are skipped. Own orders resting in the book or queued at the end
+    of a session expire with it. Own order uids keep decreasing across
+    sessions, so they never collide.
+
+    Args:
+        ticker (str): symbol of the shares
+        start_date (date): first session
+        end_date (date): last session (included)
+        dates (list): explicit list of sessions, instead of
+                      start_date/end_date
+        **kwargs: any other Gateway argument (start_h, end_h, latency...)
+    """
+
+    def __init__(self, **kwargs):
+
+        data_path = kwargs.get(
+            'data_path',
+            f'{os.path.dirname(__file__)}/../data/historic_orders')
+        ticker = kwargs.get('ticker')
+        dates = kwargs.pop('dates', None)
+        if dates is None:
+            start_date = kwargs.pop('start_date')
+            end_date = kwargs.pop('end_date')
+            dates = [start_date + timedelta(days)
+                     for days in range((end_date - start_date).days + 1)]
+        self.dates = [date for date in dates
+                      if os.path.exists(session_file(data_path, ticker, date))]
+        if not self.dates:
+            raise FileNotFoundError(f'No sessions found for {ticker} '
+                                    f'in {data_path}')
+
+        self.session_n = 0
+        self.cum_stats = {stat: 0 for stat in SESSION_STATS}
+        self.session_stats = []
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._next_session = None
+        super().__init__(date=self.dates[0], **kwargs)
+        self._prefetch()
+
+    def _prefetch(self):
+        """ Start decoding the next session in the background thread """
+
+        next_n = self.session_n + 1
+        if next_n < len(self.dates):
+            self._next_session = self._executor.submit(
+                load_session, self.data_path, self.ticker,
+                self.dates[next_n])
+        else:
+            self._next_session = None
+            self._executor.shutdown(wait=False)
+
+    @property
+    def session_done(self):
+        return self.ob_ns >= self.end_ns
+
+    @property
+    def has_next_session(self):
+        return self._next_session is not None
+
+    @property
+    def done(self):
+        return self.session_done and not self.has_next_session
+
+    @property
+    def total_stats(self):
+        """ Stats of the closed sessions plus the current one """
+
+        return {stat: self.cum_stats[stat] + getattr(self.ob, stat)
+                for stat in SESSION_STATS}
+
+    def _close_session(self):
+
+        stats = {stat: getattr(self.ob, stat) for stat in SESSION_STATS}
+        for stat in SESSION_STATS:
+            self.cum_stats[stat] += stats[stat]
+        stats['date'] = self.date
+        self.session_stats.append(stats)
+
+    def next_session(self):
+        """ Close the current session and open the next one. Blocks only
+        if the background thread did not finish decoding it yet.
+
+        Returns:
+            False if there are no more sessions
+        """
+
+        if not self.has_next_session:
+            return False
+        session = self._next_session.result()
+        self._close_session()
+        self.session_n += 1
+        self.my_queue.clear()
+        self._peg_specs.clear()
+        self._reprice_pending.clear()
+        self._peg_bbo = None
+        self.ob.reset_ob(reset_all=True, keep_positions=True)
+        self.open_session(self.dates[self.session_n], session)
+        self._prefetch()
+        return True
+
+    def tick(self):
+        """ Process next message, rolling to the next session if the
+        current one is over
+        """
+
+        if self.session_done and not self.next_session():
+            return
+        super().tick()
+
+    def move_until(self, stop_time):
+
+        stop_time = to_ns(stop_time)
+        while stop_time > self.end_ns and self.has_next_session:
+            super().move_until(self.end_ns)
+            self.next_session()
+        if stop_time > self.ob_ns:
+            super().move_until(min(stop_time, self.end_ns))
+
+    def move_n_seconds(self, n_seconds):
+
+        self.move_until(self.ob_ns + seconds_ns(n_seconds))
+
+    def move_delta(self, delta):
+
+        self.move_until(self.ob_ns + delta_ns(delta))
+
+    def close(self):
+        """ Stop the background thread if the run ends early """
+
+        # shutdown(cancel_futures=True) needs python 3.9
+        if self._next_session is not None:
+            self._next_session.cancel()
+        self._executor.shutdown(wait=True)
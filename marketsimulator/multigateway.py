@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay of several orderbooks of the same session in a single timeline.
+
+MultiGateway holds one Gateway (and one Orderbook) per ticker and merges
+their historical streams with a k-way heap merge on the time of the next
+event of each book: its next historical order or its next own message.
+Each book keeps its own session arrays, so nothing is concatenated, and
+each one can have its own latency to simulate different venues.
+
+Own order uids are unique across books, so ord_status only needs the uid.
+
+    >>> gtw = MultiGateway(tickers=['san', 'bbva'], date=session,
+    ...                    latency={'san': 20_000, 'bbva': 35_000})
+    >>> uid = gtw.queue_my_new('bbva', is_buy=True, qty=100,
+    ...                        price=gtw.ob['bbva'].bbid[0])
+    >>> gtw.move_n_seconds(60)
+
+"""
+
+import heapq
+from marketsimulator.gateway import Gateway
+from marketsimulator.timestamps import (delta_ns, seconds_ns, to_datetime64,
+                                        to_ns)
+
+
+class MultiGateway:
+    """ Timestamp-merged replay of the sessions of several tickers
+
+    Args:
+        tickers (list): symbols of the shares
+        date (date): date of the session
+        latency (int or dict): latency in microseconds, or a dict with
+                               the latency of each ticker
+        **kwargs: any other Gateway argument (start_h, end_h, data_path...)
+    """
+
+    def __init__(self, tickers, date, latency=20000, **kwargs):
+
+        self.tickers = list(tickers)
+        if not isinstance(latency, dict):
+            latency = {ticker: latency for ticker in self.tickers}
+        self.gateways = {ticker: Gateway(ticker=ticker, date=date,
+                                         latency=latency[ticker], **kwargs)
+                         for ticker in self.tickers}
+        self.ob = {ticker: gtw.ob for ticker, gtw in self.gateways.items()}
+        # times in int nanoseconds since epoch, as in the Gateway
+        self.ob_ns = max(gtw.ob_ns for gtw in self.gateways.values())
+        self.end_ns = max(gtw.end_ns for gtw in self.gateways.values())
+        self.my_last_uid = 0
+        # ticker of each own order uid
+        self._uid_ticker = dict()
+        # heap of (next event time, ticker). Entries whose time is not the
+        # current next event time of the book are stale and skipped
+        self._events = []
+        self._next_event = dict()
+        for ticker in self.tickers:
+            self._push(ticker)
+
+    @property
+    def ob_time(self):
+        """ Global time of the replay (datetime64[ns]) """
+
+        return to_datetime64(self.ob_ns)
+
+    @property
+    def end_time(self):
+
+        return to_datetime64(self.end_ns)
+
+    def _event_time(self, ticker):
+        """ Time of the next event of a book, None if it is exhausted """
+
+        gtw = self.gateways[ticker]
+        if gtw.ob_idx < gtw.ob_nord:
+            event_time = gtw.next_ord_ns
+            if event_time > gtw.end_ns:
+                event_time = None
+        else:
+            event_time = None
+        if gtw.my_queue:
+            my_time = gtw.my_queue[0].timestamp
+            if event_time is None or my_time < event_time:
+                event_time = my_time
+        return event_time
+
+    def _push(self, ticker):
+
+        event_time = self._event_time(ticker)
+        self._next_event[ticker] = event_time
+        if event_time is not None:
+            heapq.heappush(self._events, (event_time, ticker))
+
+    @property
+    def next_event_time(self):
+        """ Time of the next event of any book, None if all are done """
+
+        while self._events:
+            event_time, ticker = self._events[0]
+            if self._next_event[ticker] == event_time:
+                return event_time
+            heapq.heappop(self._events)
+        return None
+
+    def tick(self):
+        """ Process the next event (historical or own message) of the
+        book with the earliest one
+        """
+
+        if self.next_event_time is None:
+            return
+        event_time, ticker = heapq.heappop(self._events)
+        gtw = self.gateways[ticker]
+        self.ob_ns = max(self.ob_ns, event_time)
+        gtw.tick()
+        self._push(ticker)
+
+    def move_until(self, stop_time):
+
+        stop_time = to_ns(stop_time)
+        while True:
+            event_time = self.next_event_time
+            if event_time is None or event_time > stop_time:
+                break
+            self.tick()
+        self.ob_ns = max(self.ob_ns, stop_time)
+
+    def move_n_seconds(self, n_seconds):
+
+        stop_time = min(self.ob_ns + seconds_ns(n_seconds), self.end_ns)
+        self.move_until(stop_time)
+
+    def move_delta(self, delta):
+
+        stop_time = min(self.ob_ns + delta_ns(delta), self.end_ns)
+        self.move_until(stop_time)
+
+    def _route(self, ticker, queue_fn, *args, **kwargs):
+        """ Queue a message in the Gateway of ticker at the global time,
+        keeping own uids unique across books
+        """
+
+        gtw = self.gateways[ticker]
+        gtw.ob_ns = self.ob_ns
+        gtw.my_last_uid = self.my_last_uid
+        result = queue_fn(gtw, *args, **kwargs)
+        self.my_last_uid = gtw.my_last_uid
+        self._push(ticker)
+        return result
+
+    def queue_my_new(self, ticker, is_buy, qty, price, account=None):
+        """ See Gateway.queue_my_new """
+
+        uid = self._route(ticker, Gateway.queue_my_new, is_buy, qty, price,
+                          account)
+        self._uid_ticker[uid] = ticker
+        return uid
+
+    def queue_my_peg(self, ticker, is_buy, qty, **kwargs):
+        """ See Gateway.queue_my_peg """
+
+        uid = self._route(ticker, Gateway.queue_my_peg, is_buy, qty,
+                          **kwargs)
+        self._uid_ticker[uid] = ticker
+        return uid
+
+    def queue_my_modif(self, uid, qty_down):
+        """ See Gateway.queue_my_modif """
+
+        self._route(self._uid_ticker[uid], Gateway.queue_my_modif,
+                    uid, qty_down)
+
+    def queue_my_amend(self, uid, new_price=None, new_qty=None):
+        """ See Gateway.queue_my_amend """
+
+        self._route(self._uid_ticker[uid], Gateway.queue_my_amend,
+                    uid, new_price, new_qty)
+
+    def queue_my_cancel(self, uid):
+        """ See Gateway.queue_my_cancel """
+
+        self._route(self._uid_ticker[uid], Gateway.queue_my_cancel, uid)
+
+    def ord_status(self, uid):
+        """ See Gateway.ord_status """
+
+        return self.gateways[self._uid_ticker[uid]].ord_status(uid)
+
+    def ticker_of(self, uid):
+
+        return self._uid_ticker[uid]
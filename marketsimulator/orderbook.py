@@ -8,48 +8,77 @@ Created on Thu May 16 14:14:51 2019
 @author: Francisco Merlos
 """
 from abc import ABC, abstractmethod
-from datetime import datetime
-from config.configuration_yaml import Configuration
-from marketsimulator.prices_idx import get_band_dicts
+from functools import lru_cache
+from itertools import count
+from marketsimulator.accounting import DEFAULT_ACCOUNT, Position
+from marketsimulator import eventlog
+from marketsimulator.memory import arrays_size, object_size
+from marketsimulator.shadow import ShadowBook
+from marketsimulator.prices_idx import (get_band_prices, price_to_tick,
+                                        shift_prices, tick_to_price)
+from marketsimulator.tape import TradeTape
+from marketsimulator.timestamps import to_datetime64, to_ns
 import numpy as np
-import pandas as pd
-import pdb
+import sys
 import warnings
 
-config = Configuration()
-TICKER_BANDS = config.get_liq_bands()
 DEFAULT_BAND = 'band6'
-AVG_TRANSACTS = config.get_trades_bands()
-PX_IDXS, PRICES, MAX_TICK = get_band_dicts([1, 2, 3, 4, 5, 6])
 STATS = ['price', 'vol', 'agg_ord', 'pas_ord', 'buy_init', 'timestamp']
 MY_STATS = ['price', 'vol', 'my_uid', 'timestamp']
 TICK_SIZE_REGIME_URL = 'https://www.emissions-euets.com/tick-size-regime'
 
 
+@lru_cache(maxsize=None)
+def load_bands_config():
+    """ Returns the liquidity band of each ticker and the average
+    number of daily transactions of each band. The YAML files are
+    only read the first time an Orderbook is created.
+    """
+
+    from config.configuration_yaml import Configuration
+    config = Configuration()
+    return config.get_liq_bands(), config.get_trades_bands()
+
+
 class Orderbook:
-    def __init__(self, ticker, max_impact=20, resilience=1):
-        if ticker not in TICKER_BANDS:
+    def __init__(self, ticker, max_impact=20, resilience=1, maker_fee=0.,
+                 taker_fee=0., aggregate_sweeps=False, pool_size=0,
+                 checked=False):
+        ticker_bands, avg_transacts = load_bands_config()
+        if ticker not in ticker_bands:
             band = DEFAULT_BAND
             warnings.warn(f'Ticker {ticker} not found in liquidity bands'
                            ' configuration file. \n Band6 (highest liquidity'
                            ' stock) will be set as default for tick size calc.\n'
                           f' Check {TICK_SIZE_REGIME_URL} for more info')
         else:
-            band = TICKER_BANDS[ticker]
+            band = ticker_bands[ticker]
             
         #        self.band_ticks = self.__class__.band_ticks[band]
-        self.band_idxs = PX_IDXS[band]
-        self.band_prices = PRICES[band]
-        self.max_tick = MAX_TICK[band]
-        self.init_size = int(AVG_TRANSACTS[band])
-        self.inc = int(max(0.1 * AVG_TRANSACTS[band], 10))
+        self.band = band
+        self.band_idxs, self.band_prices, self.max_tick = get_band_prices(band)
+        self.init_size = int(avg_transacts[band])
+        self.inc = int(max(0.1 * avg_transacts[band], 10))
         self.low_inc = 10
-        # default day
-        self.def_day = datetime(1970, 1, 1)
         self.max_impact = max_impact
         self.resilience = resilience
-        self._bids = Bids()
-        self._asks = Asks()
+        # fee rates over traded value of our passive and aggressive fills
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        # historical orders clearing a whole level without own orders
+        # print one aggregated trade, see _sweep_level
+        self.aggregate_sweeps = aggregate_sweeps
+        # free lists of Order and PriceLevel instances recycled by the
+        # matching loop, at most pool_size of each. With pool_size > 0
+        # terminal historical orders are forgotten (see _recycle)
+        self.pool_size = pool_size
+        self._free_orders = []
+        self._free_levels = []
+        # checked mode validates the input of send, the book itself is
+        # verified by invariants.check_book. Fast mode checks nothing
+        self.checked = checked
+        self._bids = Bids(self._free_levels)
+        self._asks = Asks(self._free_levels)
         self.create_stats_dict()
         # keeps track of all orders sent to the orderbook
         # allows fast access of orders status by uid
@@ -64,14 +93,38 @@ class Orderbook:
         self.market_impact = 0
         self.my_cumvol_sent = 0
         self.last_px = None
+        # call phase of an auction: orders are collected without matching
+        self.in_auction = False
+        self._auction_orders = []
+        # pegged orders by uid: (peg_type, offset, limit)
+        self._pegged = dict()
+        # time index of trades for range volume/vwap queries
+        self.tape = TradeTape(self)
+        self._reset_positions()
+        # L3 record of every event, see start_event_log
+        self.event_log = None
+        # virtual orders filled from the trade flow, see start_shadow
+        self.shadow = None
+
+    def reset_ob(self, reset_all, keep_positions=False):
+        """ Reset the trading stats of the orderbook
 
-    def reset_ob(self, reset_all):
+        Args:
+            reset_all (bool): also empty the book, its orders and the
+                              trade arrays
+            keep_positions (bool): keep the Position of each account,
+                                   e.g. an inventory held overnight.
+                                   Own orders are forgotten anyway
+        """
 
         if reset_all:
-            self._bids = Bids()
-            self._asks = Asks()
+            self._bids = Bids(self._free_levels)
+            self._asks = Asks(self._free_levels)
             self.create_stats_dict()
             self._orders = dict()
+            self.in_auction = False
+            self._auction_orders = []
+            self._pegged = dict()
 
         self.n_my_orders = 0
         self.ntrds = 0
@@ -81,52 +134,127 @@ class Orderbook:
         self.cumturn = 0.
         self.my_cumturn = 0.
         self.market_impact = 0
+        self.tape.reset()
+        if keep_positions:
+            self._accounts = dict()
+            self._arrival_px = dict()
+        else:
+            self._reset_positions()
+        if self.shadow is not None:
+            self.shadow.reset()
+
+    def _reset_positions(self):
+
+        # Position of each account, account of own uids not in the
+        # default one, and arrival price of own orders
+        self.positions = dict()
+        self._accounts = dict()
+        self._arrival_px = dict()
+
+    def start_event_log(self, path, chunk_size=100_000):
+        """ Record every event of the book (adds, cancels, modifs,
+        amends, executions and market impact shifts) in compressed
+        chunks {path}-{n:05d}.npz. See marketsimulator.eventlog
+
+        Args:
+            path (str): prefix of the chunk files
+            chunk_size (int): events per chunk file
+        """
+
+        self.stop_event_log()
+        self.event_log = eventlog.EventLog(path, self.band, chunk_size)
+
+    def stop_event_log(self):
+        """ Write the pending events and stop recording """
+
+        if self.event_log is not None:
+            self.event_log.close()
+            self.event_log = None
+
+    def start_shadow(self):
+        """ Returns the ShadowBook of the orderbook, creating it the
+        first time. Its orders are filled from the trade flow without
+        affecting the book, see marketsimulator.shadow
+        """
+
+        if self.shadow is None:
+            self.shadow = ShadowBook(self)
+        return self.shadow
+
+    def set_account(self, uid, account):
+        """ Book the fills of an own order in the position of account
+        instead of the default one. It can be set before the order
+        reaches the orderbook, and is forgotten once the order is filled
+        or cancelled.
+        """
+
+        self._accounts[uid] = account
+
+    def position(self, account=DEFAULT_ACCOUNT):
+        """ Position (inventory, P&L, fees, shortfall) of an account,
+        see marketsimulator.accounting
+        """
+
+        if account not in self.positions:
+            self.positions[account] = Position(account, self.maker_fee,
+                                               self.taker_fee)
+        return self.positions[account]
+
+    def mark_price(self):
+        """ Mid of the BBO, or the last price if a side is empty """
+
+        if self._bids.best is not None and self._asks.best is not None:
+            return (self._bids.best.price + self._asks.best.price) / 2
+        return self.last_px
+
+    def pnl(self, account=DEFAULT_ACCOUNT):
+        """ P&L of an account net of fees, marked at mark_price """
+
+        position = self.position(account)
+        mark_px = self.mark_price()
+        if mark_px is None:
+            return position.realized - position.fees
+        return position.pnl(mark_px)
+
+    def _account_fill(self, uid, is_buy, qty, price, is_maker):
+
+        self.position(self._accounts.get(uid, DEFAULT_ACCOUNT)).on_fill(
+            is_buy, qty, price, is_maker, self._arrival_px.get(uid))
+
+    def _forget_own(self, uid):
+        """ Drop the account and arrival price of a terminal own order """
+
+        self._accounts.pop(uid, None)
+        self._arrival_px.pop(uid, None)
 
     def create_stats_dict(self, stat_dict=None):
+        """ Trade arrays. Timestamps are int64 nanoseconds since epoch,
+        see trades_time for datetime64 values
+        """
 
         if stat_dict == 'trades' or stat_dict is None:
-            self.trades = {
-                key: np.zeros(self.inc)
-                for key in STATS
-            }
-            self.trades['timestamp'] = np.full(self.inc,
-                                               self.def_day)
+            self.trades = self._stats_arrays(STATS, self.inc)
 
         if stat_dict == 'last_trades' or stat_dict is None:
-            self.last_trades = {
-                key: np.zeros(self.low_inc)
-                for key in STATS
-            }
-            self.last_trades['timestamp'] = np.full(self.low_inc,
-                                                    self.def_day)
+            self.last_trades = self._stats_arrays(STATS, self.low_inc)
 
         if stat_dict == 'my_trades' or stat_dict is None:
-            self.my_trades = {
-                key: np.zeros(self.inc)
-                for key in MY_STATS
-            }
-            self.my_trades['timestamp'] = np.full(self.inc,
-                                                  self.def_day)
+            self.my_trades = self._stats_arrays(MY_STATS, self.inc)
 
         if stat_dict == 'my_last_trades' or stat_dict is None:
-            self.my_last_trades = {
-                key: np.zeros(self.low_inc)
-                for key in MY_STATS
-            }
-            self.my_last_trades['timestamp'] = np.full(self.low_inc,
-                                                       self.def_day)
+            self.my_last_trades = self._stats_arrays(MY_STATS, self.low_inc)
 
-    def inc_dict_size(self, stat_dict, inc):
+    @staticmethod
+    def _stats_arrays(stats, size):
+
+        arrays = {key: np.zeros(size) for key in stats}
+        arrays['timestamp'] = np.zeros(size, dtype=np.int64)
+        return arrays
 
-        # default array
-        def_arr = np.zeros(inc)
-        # default day
-        def_day = np.full(inc, self.def_day)
+    def inc_dict_size(self, stat_dict, inc):
 
-        new_dict = {(key): (np.hstack([stat_dict[key], def_arr])
-                            if key != 'timestamp' else np.hstack([stat_dict[key], def_day]))
-                    for key in stat_dict.keys()
-                    }
+        new_dict = {key: np.hstack([array, np.zeros(inc, dtype=array.dtype)])
+                    for key, array in stat_dict.items()}
 
         return new_dict
 
@@ -182,7 +310,7 @@ class Orderbook:
 
     @property
     def trades_time(self):
-        return self.trades['timestamp'][:self.ntrds]
+        return to_datetime64(self.trades['timestamp'][:self.ntrds])
 
     @property
     def my_trades_vol(self):
@@ -194,7 +322,7 @@ class Orderbook:
 
     @property
     def my_trades_time(self):
-        return self.my_trades['timestamp'][:self.my_ntrds]
+        return to_datetime64(self.my_trades['timestamp'][:self.my_ntrds])
 
     def get(self, uid):
         """  Get orderbook order by uid
@@ -213,7 +341,7 @@ class Orderbook:
                 'cumqty': order.cumqty,
                 'leavesqty': order.leavesqty,
                 'price': order.price,
-                'timestamp': order.timestamp,
+                'timestamp': to_datetime64(order.timestamp),
                 'active': order.active}
 
     def get_new_price(self, price, n_moves):
@@ -229,31 +357,40 @@ class Orderbook:
             
         """
 
-        try:
-            return self.band_prices[self.band_idxs[price] + n_moves]
-        except (KeyError, IndexError):
-            if n_moves >= 0:
-                try:
-                    assert price < self.band_prices[-1]
-                except AssertionError:
-                    pdb.set_trace()
-                return price + n_moves * self.max_tick
-            else:
-                if price > self.band_prices[-1]:
-                    n_above = (price - self.band_prices[-1]) / self.max_tick
+        idx = self.band_idxs.get(price)
+        if idx is not None and 0 <= idx + n_moves < len(self.band_prices):
+            return self.band_prices[idx + n_moves]
+        # out of the table or off the ladder
+        return float(shift_prices(price, n_moves, self.band))
 
-                    if abs(n_moves) > n_above:
-                        return self.band_prices[n_moves + n_above]
-                    else:
-                        return price + n_moves * self.max_tick
-                else:
-                    if price == self.band_prices[0]:
-                        return price
-                    else:
-                        raise ValueError(f'Price {price} not found')
+    def price_ticks(self, prices):
+        """ Tick index of each price of an array, see
+        prices_idx.price_to_tick
+        """
+
+        return price_to_tick(prices, self.band)
+
+    def tick_prices(self, ticks):
+        """ Price of each tick index of an array, see
+        prices_idx.tick_to_price
+        """
+
+        return tick_to_price(ticks, self.band)
+
+    def get_new_prices(self, prices, n_moves):
+        """ Array version of get_new_price, with the same results
+
+        Args:
+            prices (array_like): prices
+            n_moves (int or array_like): ticks to move each price
+        Returns:
+            float ndarray of prices
+        """
+
+        return shift_prices(prices, n_moves, self.band)
 
     def send(self, is_buy, qty, price, uid,
-             is_mine=False, timestamp=datetime.now()):
+             is_mine=False, timestamp=0):
         """ Send new order to orderbook
             Passive orders can't be matched and will be added to the book
             Aggressive orders are matched against opp. side's resting order
@@ -266,31 +403,186 @@ class Orderbook:
                 is_mine (bool): False if the order corresponds to a
                 historical order instead of you own orders
                 uid (int)
-                timestamp (float): time of processing 
+                timestamp (int): time of processing in nanoseconds
+                                 since epoch (datetime and datetime64
+                                 are converted)
                 
         """
-        if np.isnan(price):
-            raise Exception("Price cannot be nan. Use np.Inf in needed")
+        if self.checked and price != price:
+            raise ValueError("Price cannot be nan. Use np.inf if needed")
+        if type(timestamp) is not int:
+            timestamp = to_ns(timestamp)
 
+        log = self.event_log
         if not is_mine:
+            hist_price = price
             price = self._affect_price_with_market_impact(price)
+            if log is not None and price != hist_price:
+                log.log(eventlog.IMPACT, uid, 0, is_buy,
+                        self.market_impact, hist_price, timestamp)
         else:
             self.n_my_orders += 1
             self.my_cumvol_sent += qty
+            self._arrival_px[uid] = self.mark_price()
+
+        if log is not None:
+            log.log(eventlog.ADD, uid, 0, is_buy, qty, price, timestamp)
+        neword = self._new_order(uid, is_buy, qty, price, timestamp)
+        self._orders[uid] = neword
+        if self.in_auction:
+            self._auction_orders.append(neword)
+            return
+        self._match_or_rest(neword)
+        if self.pool_size and not neword.leavesqty and not is_mine:
+            # filled on arrival, it never rested
+            self._recycle(neword)
+
+    def _new_order(self, uid, is_buy, qty, price, timestamp):
+        """ Order taken from the free list if there is one """
+
+        if self._free_orders:
+            order = self._free_orders.pop()
+            order.reset(uid, is_buy, qty, price, timestamp)
+            return order
+        return Order(uid, is_buy, qty, price, timestamp)
+
+    def _recycle(self, order):
+        """ Forget a terminal historical order and keep the instance
+        for a later one. Later messages of its uid are ignored, as for
+        unknown uids, and get(uid) raises KeyError. Pegged orders are
+        kept until pegs_to_reprice forgets them.
+        """
+
+        if order.uid in self._pegged or self.in_auction:
+            return
+        if self._orders.get(order.uid) is order:
+            del self._orders[order.uid]
+        if len(self._free_orders) < self.pool_size:
+            self._free_orders.append(order)
+
+    def _match_or_rest(self, order):
+        """ Match the order against the opposite side while it is
+        aggressive and add its remaining volume to the book
+        """
 
-        neword = Order(uid, is_buy, qty, price, timestamp)
-        self._orders.update({uid: neword})
-        while (neword.leavesqty > 0):
-            if self._is_aggressive(neword):
-                self._sweep_best_price(neword)
+        while (order.leavesqty > 0):
+            if self._is_aggressive(order):
+                self._sweep_best_price(order)
             #                self.update_metrics(trdpx=exe_px,trdqty=exe_vol)
             else:
-                if is_buy:
-                    self._bids.add(neword)
+                if order.is_buy:
+                    self._bids.add(order)
                 else:
-                    self._asks.add(neword)
+                    self._asks.add(order)
                 return
 
+    def peg_price(self, is_buy, peg_type='primary', offset=0, limit=None,
+                  order=None):
+        """ Target price of a pegged order given the current BBO
+
+        Args:
+            is_buy (bool): True for buy orders
+            peg_type (str): 'primary' pegs to the same side best price
+                            (best bid for buys), 'market' pegs to the
+                            opposite side best price (best ask for buys)
+            offset (int): ticks added to the reference price in the
+                          aggressive direction (up for buys, down for sells)
+            limit (float): price cap. The target is never more aggressive
+                           than limit. None for no cap
+            order (Order): the pegged order itself, once in the book.
+                           A primary peg alone at the best price takes
+                           the next level as reference, otherwise it
+                           would peg off its own price
+        Returns:
+            target price, or limit (None if not given) if the reference
+            side of the book is empty
+        """
+
+        ref_is_buy = (peg_type == 'primary') == is_buy
+        halfbook = self._bids if ref_is_buy else self._asks
+        reference = halfbook.best
+        if (order is not None and order.active and reference is not None
+                and order.is_buy == ref_is_buy
+                and order.price == reference.price
+                and order.leavesqty == reference.vol):
+            levels = self.top_levels(ref_is_buy, 2)
+            reference = levels[1] if len(levels) > 1 else None
+        if reference is None:
+            return limit
+
+        if is_buy:
+            target = self.get_new_price(reference.price, offset)
+            if limit is not None:
+                target = min(target, limit)
+        else:
+            target = self.get_new_price(reference.price, -offset)
+            if limit is not None:
+                target = max(target, limit)
+        return target
+
+    def send_pegged(self, is_buy, qty, uid, peg_type='primary', offset=0,
+                    limit=None, is_mine=False, timestamp=0):
+        """ Send a pegged order. It is priced with peg_price and can then
+        be moved to its new target, keeping its uid, with reprice_pegged.
+
+        Args:
+            see send and peg_price
+        """
+
+        if peg_type not in ('primary', 'market'):
+            raise ValueError(f'Unexpected peg_type: {peg_type}')
+        price = self.peg_price(is_buy, peg_type, offset, limit)
+        if price is None:
+            raise ValueError('Cannot price a pegged order with an empty '
+                             'reference side and no limit')
+        self._pegged[uid] = (peg_type, offset, limit)
+        self.send(is_buy=is_buy, qty=qty, price=price, uid=uid,
+                  is_mine=is_mine, timestamp=timestamp)
+
+    def pegs_to_reprice(self):
+        """ Returns the uids of the active pegged orders whose price
+        differs from their current target. Terminal pegged orders are
+        forgotten. Pegged orders are not repriced in the call phase of
+        an auction, there is no BBO to peg to.
+        """
+
+        uids = []
+        if self.in_auction:
+            return uids
+        for uid in list(self._pegged):
+            order = self._orders[uid]
+            if not order.active:
+                del self._pegged[uid]
+                continue
+            target = self.peg_price(order.is_buy, *self._pegged[uid],
+                                    order=order)
+            if target is not None and target != order.price:
+                uids.append(uid)
+        return uids
+
+    def reprice_pegged(self, uid, timestamp=0):
+        """ Move a pegged order to its current target price. The order
+        loses its time priority and is matched if the target is aggressive.
+
+        Args:
+            uid (int): uid of the pegged order
+            timestamp (int): time of the repricing in nanoseconds
+        """
+
+        if uid not in self._pegged or self.in_auction:
+            return
+        order = self._orders[uid]
+        if not order.active:
+            del self._pegged[uid]
+            return
+        target = self.peg_price(order.is_buy, *self._pegged[uid],
+                                order=order)
+        if target is not None and target != order.price:
+            if self.event_log is not None:
+                self.event_log.log(eventlog.AMEND, uid, 0, order.is_buy,
+                                   order.qty, target, timestamp)
+            self._relink(order, target, timestamp)
+
     def _affect_price_with_market_impact(self, price):
         """ Modifies historical prices to be sent to the Orderbook by
             the cummulative effect of market impact that our own orders
@@ -300,58 +592,144 @@ class Orderbook:
             the prices that the rest of the actors will be sending afterwards.
             We move the markets slightly with our orders.
 
+            price can also be an ndarray of prices to shift them at once.
+
         """
         if self.market_impact >= 1:
             nticks = min(int(self.resilience*self.market_impact),
                          self.max_impact)
-            price = self.get_new_price(price=price, n_moves=nticks)
         elif self.market_impact <= -1:
             nticks = max(int(self.resilience*self.market_impact),
                          -1 * self.max_impact)
-            price = self.get_new_price(price=price, n_moves=nticks)        
-        return price
+        else:
+            return price
+        if isinstance(price, np.ndarray):
+            return self.get_new_prices(price, nticks)
+        return self.get_new_price(price=price, n_moves=nticks)
 
-    def cancel(self, uid):
+    def cancel(self, uid, timestamp=None):
 
         """ Cancel order identified by its uid
         
         """
+        if uid not in self._orders:
+            # e.g. a historical order already finished when the book
+            # was restored from a checkpoint
+            return
         order = self._orders[uid]
+        if self.event_log is not None and order.leavesqty > 0:
+            self.event_log.log(eventlog.CANCEL, uid, 0, order.is_buy,
+                               order.leavesqty, order.price, timestamp)
 
         if uid <  0:
             self.my_cumvol_sent -= order.leavesqty
 
+        self._pegged.pop(uid, None)
+
         if order.active:
+            self._unlink(order)
+            order._cumqty = order.qty - order.leavesqty
+            order.leavesqty = 0
+            order.active = False
 
-            if order.is_buy:
-                pricelevel = self._bids.book[order.price]
-            else:
+        elif self.in_auction:
+            # order collected in the call phase of an auction
+            order._cumqty = order.qty - order.leavesqty
+            order.leavesqty = 0
 
-                pricelevel = self._asks.book[order.price]
+        if uid < 0:
+            self._forget_own(uid)
+        elif self.pool_size:
+            self._recycle(order)
+        return
 
-            # right side
-            if order.next is None:
-                pricelevel.tail = order.prev
-                if order is pricelevel.head:
-                    self._remove_price(order.is_buy, order.price)
-                else:
-                    order.prev.next = None
-                    # left side
-            elif order is pricelevel.head:
-                pricelevel.head = order.next
-                order.next.prev = None
-            # middle
+    def _unlink(self, order):
+        """ Remove an active order from its PriceLevel queue, removing
+        the PriceLevel if it becomes empty. The order status is not changed.
+        """
+
+        if order.is_buy:
+            pricelevel = self._bids.book[order.price]
+        else:
+
+            pricelevel = self._asks.book[order.price]
+        if self.shadow is not None:
+            self.shadow.on_reduce(order, order.leavesqty, pricelevel)
+        pricelevel.remove(order)
+
+        # right side
+        if order.next is None:
+            pricelevel.tail = order.prev
+            if order is pricelevel.head:
+                self._remove_price(order.is_buy, order.price)
             else:
-                order.next.prev = order.prev
-                order.prev.next = order.next
+                order.prev.next = None
+                # left side
+        elif order is pricelevel.head:
+            pricelevel.head = order.next
+            order.next.prev = None
+        # middle
+        else:
+            order.next.prev = order.prev
+            order.prev.next = order.next
 
-            order._cumqty = order.qty - order.leavesqty
-            order.leavesqty = 0
-            order.active = False
+        order.prev = None
+        order.next = None
 
-        return
+    def _level(self, order):
+        """ PriceLevel where an active order is resting """
 
-    def modif(self, uid, qty_down):
+        if order.is_buy:
+            return self._bids.book[order.price]
+        else:
+            return self._asks.book[order.price]
+
+    def queue_position(self, uid):
+        """ Position of a resting order in the queue of its price level
+
+        O(1) for our own orders (uid < 0), whose position is derived from
+        the level counters captured when they were enqueued. Historical
+        orders are located walking the queue.
+
+        Args:
+            uid (int): unique identifier of the order
+        Returns:
+            (volume ahead, number of orders ahead), or None if the
+            order is not resting in the book
+        """
+
+        order = self._orders[uid]
+        if not order.active:
+            return None
+        return self._level(order).position(order)
+
+    def vol_ahead(self, uid):
+        """ Volume resting ahead of order uid at its price level """
+
+        position = self.queue_position(uid)
+        return None if position is None else position[0]
+
+    def orders_ahead(self, uid):
+        """ Number of orders resting ahead of order uid at its price level """
+
+        position = self.queue_position(uid)
+        return None if position is None else position[1]
+
+    def _relink(self, order, price, timestamp, qty_up=0):
+        """ Move an active order to a new price under the same uid,
+        adding qty_up to its quantity. The order loses its time priority
+        and is matched if the new price is aggressive.
+        """
+
+        self._unlink(order)
+        order.qty += qty_up
+        order.leavesqty += qty_up
+        order.active = False
+        order.price = price
+        order.timestamp = to_ns(timestamp)
+        self._match_or_rest(order)
+
+    def modif(self, uid, qty_down, timestamp=None):
         """ Modify an order identified by its uid. 
         
         This transaction does not make the order lose its prite-time 
@@ -364,18 +742,100 @@ class Orderbook:
         Args:
             uid (int): identifier of the order to be modified
             qty_down(int): quantity to substract to current order leavesqty
+            timestamp (int): time of the modif in nanoseconds, only for the
+                             event log
         
         """
 
         if uid in self._orders:
             prev_ord = self._orders[uid]
             qty_down = min(prev_ord.leavesqty, qty_down)
+            if self.event_log is not None and qty_down > 0:
+                # a modif down to zero is logged as a cancel
+                kind = (eventlog.CANCEL if qty_down == prev_ord.leavesqty
+                        else eventlog.MODIF)
+                self.event_log.log(kind, uid, 0, prev_ord.is_buy,
+                                   qty_down, prev_ord.price, timestamp)
+            if prev_ord.active:
+                level = self._level(prev_ord)
+                if self.shadow is not None:
+                    self.shadow.on_reduce(prev_ord, qty_down, level)
+                level.reduce(prev_ord, qty_down)
             prev_ord.leavesqty -= qty_down
             prev_ord.qty -= qty_down
             if uid < 0:
                 self.my_cumvol_sent -= qty_down
             if prev_ord.leavesqty == 0:
-                self.cancel(uid)
+                self.cancel(uid, timestamp)
+
+    def amend(self, uid, new_price=None, new_qty=None,
+              timestamp=0):
+        """ Atomic cancel-replace of an order, keeping its uid.
+
+        Reducing the quantity at the same price keeps the price-time
+        priority, as modif does. Changing the price or increasing the
+        quantity moves the order to the back of the queue of its (new)
+        price, and the order is matched if the new price is aggressive.
+        An amended pegged order becomes a plain limit order if its
+        price is changed. In the call phase of an auction the same
+        priority rules apply to the order among the collected ones.
+
+        Args:
+            uid (int): identifier of the order to be amended
+            new_price (float): new limit price. None to keep it
+            new_qty (int): new total quantity of the order, including
+                           the quantity already filled. None to keep it.
+                           If it is not above the filled quantity the
+                           order is cancelled
+            timestamp (int): time of the amendment in nanoseconds
+        """
+
+        if uid not in self._orders:
+            return
+        order = self._orders[uid]
+        in_call = self.in_auction and not order.active
+        if not order.active and not (in_call and order.leavesqty > 0):
+            return
+        if new_price is None:
+            new_price = order.price
+        elif new_price != order.price:
+            self._pegged.pop(uid, None)
+        if new_qty is None:
+            new_qty = order.qty
+        qty_up = new_qty - order.qty
+
+        if order.leavesqty + qty_up <= 0:
+            self.cancel(uid, timestamp)
+            return
+        if self.event_log is not None:
+            self.event_log.log(eventlog.AMEND, uid, 0, order.is_buy,
+                               new_qty, new_price, timestamp)
+        if uid < 0:
+            self.my_cumvol_sent += qty_up
+        if in_call:
+            self._amend_collected(order, new_price, timestamp, qty_up)
+        elif new_price != order.price or qty_up > 0:
+            self._relink(order, new_price, timestamp, qty_up)
+        else:
+            level = self._level(order)
+            if self.shadow is not None:
+                self.shadow.on_reduce(order, -qty_up, level)
+            level.reduce(order, -qty_up)
+            order.qty = new_qty
+            order.leavesqty += qty_up
+
+    def _amend_collected(self, order, price, timestamp, qty_up):
+        """ amend of an order collected in the call phase of an auction.
+        Its priority is its position in _auction_orders
+        """
+
+        if price != order.price or qty_up > 0:
+            self._auction_orders.remove(order)
+            self._auction_orders.append(order)
+            order.price = price
+            order.timestamp = to_ns(timestamp)
+        order.qty += qty_up
+        order.leavesqty += qty_up
 
     def _is_aggressive(self, order):
         """ Aggressive orders are those that would be matched against
@@ -478,7 +938,6 @@ class Orderbook:
         n_my_newtrd = 0
         self.create_stats_dict(stat_dict='last_trades')
         restart_my_last_trades = True
-        my_trade = False
         breaking = False
 
         if order.is_buy:
@@ -488,28 +947,29 @@ class Orderbook:
             best = self._bids.best
             agg_effect_side = -1
 
+        if (self.aggregate_sweeps and order.uid >= 0 and not best.mine
+                and order.leavesqty >= best.vol):
+            self._sweep_level(order, best, agg_effect_side)
+            return
+
         init_best_vol = best.head.leavesqty
+        log = self.event_log
 
-        assert order.leavesqty > 0
         while order.leavesqty > 0:
 
             if best.head.leavesqty <= order.leavesqty:
                 trdqty = best.head.leavesqty
                 best.head.leavesqty = 0
+                best.exec_vol += trdqty
 
-                if best.head.uid < 0:
-                    my_trade = True
-                    my_uid = best.head.uid
-                elif order.uid < 0:
-                    my_trade = True
+                if order.uid < 0:
                     my_agg_vol += trdqty
-                    my_uid = order.uid
-                else:
-                    my_trade = False
+                elif best.head.uid >= 0:
                     ob_agg_vol += trdqty
 
                 price = best.price
                 best_uid = best.head.uid
+                filled = best.head
 
                 best.pop()
                 order.leavesqty -= trdqty
@@ -519,25 +979,27 @@ class Orderbook:
                     breaking = True
             else:
                 trdqty = order.leavesqty
-                if best.head.uid < 0:
-                    my_trade = True
-                    my_uid = best.head.uid
-                elif order.uid < 0:
-                    my_trade = True
+                if order.uid < 0:
                     my_agg_vol += trdqty
-                    my_uid = order.uid
-                else:
-                    my_trade = False
+                elif best.head.uid >= 0:
                     ob_agg_vol += trdqty
 
                 price = best.price
                 best_uid = best.head.uid
+                filled = None
 
                 best.head.leavesqty -= order.leavesqty
+                best.exec_vol += trdqty
                 order.leavesqty = 0
 
-            if price == np.inf:
-                pdb.set_trace()
+            if log is not None:
+                log.log(eventlog.EXEC, best_uid, order.uid, order.is_buy,
+                        trdqty, price, order.timestamp)
+            if self.shadow is not None:
+                self.shadow.on_trade(best, not order.is_buy, trdqty,
+                                     order.timestamp)
+            if filled is not None and best_uid >= 0 and self.pool_size:
+                self._recycle(filled)
 
             turn = trdqty * price
             self.cumvol += trdqty
@@ -547,7 +1009,14 @@ class Orderbook:
             self.update_last_trades(stats=stats, pos=n_newtrd)
             n_newtrd += 1
 
-            if my_trade:
+            # an own order crossing another own order (of another account)
+            # fills both of them
+            my_fills = []
+            if best_uid < 0:
+                my_fills.append((best_uid, not order.is_buy, True))
+            if order.uid < 0:
+                my_fills.append((order.uid, order.is_buy, False))
+            for my_uid, is_buy, is_maker in my_fills:
                 self.my_cumvol += trdqty
                 self.my_cumturn += turn
                 if restart_my_last_trades:
@@ -556,7 +1025,12 @@ class Orderbook:
                 my_stats = [price, trdqty, my_uid, order.timestamp]
                 self.update_my_last_trades(my_stats, pos=n_my_newtrd)
                 n_my_newtrd += 1
-                my_trade = False
+                self._account_fill(my_uid, is_buy, trdqty, price,
+                                   is_maker=is_maker)
+            if filled is not None and best_uid < 0:
+                self._forget_own(best_uid)
+            if order.uid < 0 and not order.leavesqty:
+                self._forget_own(order.uid)
 
             if breaking:
                 break
@@ -570,20 +1044,284 @@ class Orderbook:
             self.market_impact += (agg_effect * agg_effect_side)
 
         if ob_agg_vol > 0:
-            ob_correction = False
-            if (self.market_impact > 0) and (agg_effect_side == -1):
-                ob_correction = True
-            elif (self.market_impact < 0) and (agg_effect_side == 1):
-                ob_correction = True
-            if ob_correction:
-                agg_effect = min(1., ob_agg_vol / init_best_vol)
-                pov_f = 1 - self.my_cumvol / self.cumvol
-                self.market_impact += (agg_effect * agg_effect_side) * pov_f
+            self._correct_market_impact(ob_agg_vol, init_best_vol,
+                                        agg_effect_side)
 
         self.last_px = price
 
         return
 
+    def _correct_market_impact(self, ob_agg_vol, init_best_vol,
+                               agg_effect_side):
+        """ Historical aggressive volume against the direction of our
+        market impact brings it back
+        """
+
+        ob_correction = False
+        if (self.market_impact > 0) and (agg_effect_side == -1):
+            ob_correction = True
+        elif (self.market_impact < 0) and (agg_effect_side == 1):
+            ob_correction = True
+        if ob_correction:
+            agg_effect = min(1., ob_agg_vol / init_best_vol)
+            pov_f = 1 - self.my_cumvol / self.cumvol
+            self.market_impact += (agg_effect * agg_effect_side) * pov_f
+
+    def _sweep_level(self, order, best, agg_effect_side):
+        """ Execute a historical order against every order of a price
+        level, as one block. The level must not hold own orders and the
+        order must be big enough to clear it.
+
+        A single trade is printed for the whole level, with pas_ord nan,
+        so a sweep produces one row per level instead of one per
+        resting order. Resting orders are left filled and inactive.
+        """
+
+        price = best.price
+        vol = best.vol
+        init_best_vol = best.head.leavesqty
+        resting = best.head
+        log = self.event_log
+        while resting is not None:
+            if log is not None:
+                log.log(eventlog.EXEC, resting.uid, order.uid, order.is_buy,
+                        resting.leavesqty, price, order.timestamp)
+            resting.leavesqty = 0
+            resting.active = False
+            next_order = resting.next
+            if self.pool_size:
+                self._recycle(resting)
+            resting = next_order
+        if self.shadow is not None:
+            self.shadow.on_trade(best, not order.is_buy, vol, order.timestamp)
+        best.exec_vol += vol
+        best.n_popped += best.count
+        self._remove_price(not order.is_buy, price)
+        order.leavesqty -= vol
+
+        self.cumvol += vol
+        self.cumturn += vol * price
+        self.create_stats_dict(stat_dict='last_trades')
+        self.update_last_trades(stats=[price, vol, order.uid, np.nan,
+                                       order.is_buy, order.timestamp],
+                                pos=0)
+        self.update_trades(pos=1)
+        self._correct_market_impact(vol, init_best_vol, agg_effect_side)
+        self.last_px = price
+
+    def start_auction(self):
+        """ Start the call phase of an auction. The orders resting in
+        the book are moved to the auction, ahead of the new orders,
+        which are collected without matching until uncross() is called.
+        Cancels and modifs of collected orders are accepted as usual.
+        """
+
+        self.in_auction = True
+        self._auction_orders = []
+        # price-time priority of the resting orders is kept by their
+        # position in _auction_orders
+        for halfbook, is_buy in ((self._bids, True), (self._asks, False)):
+            for price in sorted(halfbook.book, reverse=is_buy):
+                order = halfbook.book[price].head
+                while order is not None:
+                    next_order = order.next
+                    order.active = False
+                    order.prev = order.next = None
+                    self._auction_orders.append(order)
+                    order = next_order
+                self._remove_price(is_buy, price)
+
+    def auction_price(self, reference_price=None):
+        """ Computes the uncrossing price of the orders collected in the
+        call phase.
+
+        The price is the limit price maximising the executable volume.
+        Ties are broken by: 1. minimum surplus (unmatched volume at that
+        price), 2. market pressure: highest price if the surplus is on
+        the buy side for every candidate, lowest price if it is on the
+        sell side, 3. price closest to the reference price (last traded
+        price by default).
+
+        Args:
+            reference_price (float): price used in the last tie-break
+        Returns:
+            (price, volume, surplus): surplus > 0 for unmatched buy volume.
+            price is None if no order can be executed
+        """
+
+        is_buy, price, qty, _ = self._auction_arrays()
+        return self._auction_price(is_buy, price, qty, reference_price)
+
+    def _auction_price(self, is_buy, price, qty, reference_price):
+
+        limits = np.unique(price[np.isfinite(price) & (price > 0)])
+        if len(limits) == 0:
+            return None, 0, 0
+
+        # cumulative demand (buy qty with price >= p) and
+        # supply (sell qty with price <= p) at each candidate price
+        bpx = np.sort(price[is_buy])
+        bqty = qty[is_buy][np.argsort(price[is_buy], kind='stable')]
+        spx = np.sort(price[~is_buy])
+        sqty = qty[~is_buy][np.argsort(price[~is_buy], kind='stable')]
+        bcum = np.concatenate([[0.], np.cumsum(bqty)])
+        scum = np.concatenate([[0.], np.cumsum(sqty)])
+        demand = bcum[-1] - bcum[np.searchsorted(bpx, limits, 'left')]
+        supply = scum[np.searchsorted(spx, limits, 'right')]
+        executable = np.minimum(demand, supply)
+        surplus = demand - supply
+
+        volume = executable.max()
+        if volume <= 0:
+            return None, 0, 0
+        cands = np.flatnonzero(executable == volume)
+        min_surplus = np.abs(surplus[cands]).min()
+        cands = cands[np.abs(surplus[cands]) == min_surplus]
+        if len(cands) > 1:
+            if (surplus[cands] > 0).all():
+                cands = cands[-1:]
+            elif (surplus[cands] < 0).all():
+                cands = cands[:1]
+            else:
+                if reference_price is None:
+                    reference_price = self.last_px
+                if reference_price is None:
+                    reference_price = limits[cands].mean()
+                dist = np.abs(limits[cands] - reference_price)
+                cands = cands[[np.argmin(dist)]]
+        best = cands[0]
+        return float(limits[best]), float(volume), float(surplus[best])
+
+    def _auction_arrays(self):
+
+        orders = [order for order in self._auction_orders
+                  if order.leavesqty > 0]
+        self._auction_orders = orders
+        n = len(orders)
+        is_buy = np.fromiter((order.is_buy for order in orders),
+                             dtype=bool, count=n)
+        price = np.fromiter((order.price for order in orders),
+                            dtype=float, count=n)
+        qty = np.fromiter((order.leavesqty for order in orders),
+                          dtype=float, count=n)
+        uid = np.fromiter((order.uid for order in orders),
+                          dtype=float, count=n)
+        return is_buy, price, qty, uid
+
+    def uncross(self, timestamp=0, reference_price=None):
+        """ End the call phase of an auction. All the crossing orders are
+        executed at the uncrossing price (see auction_price) in one batch,
+        following price-time priority on each side. Remaining limit
+        orders are sent to the book in priority order (see
+        _match_or_rest) at the time of the auction, remaining market
+        orders (price np.inf for buys, 0 for sells) are cancelled.
+
+        Args:
+            timestamp (int): time of the auction trades in nanoseconds
+                             (datetime and datetime64 are converted)
+            reference_price (float): see auction_price
+        Returns:
+            (price, volume) of the auction. price is None if
+            no order was executed
+        """
+
+        timestamp = to_ns(timestamp)
+        is_buy, price, qty, uid = self._auction_arrays()
+        px, volume, _ = self._auction_price(is_buy, price, qty,
+                                            reference_price)
+        orders = self._auction_orders
+        fills = np.zeros(len(orders))
+
+        if px is not None:
+            seq = np.arange(len(orders))
+            # eligible orders of each side sorted by price-time priority
+            buys = np.flatnonzero(is_buy & (price >= px))
+            buys = buys[np.lexsort((seq[buys], -price[buys]))]
+            sells = np.flatnonzero(~is_buy & (price <= px))
+            sells = sells[np.lexsort((seq[sells], price[sells]))]
+            bcum = np.cumsum(qty[buys])
+            scum = np.cumsum(qty[sells])
+            fills[buys] = np.clip(volume - (bcum - qty[buys]), 0, qty[buys])
+            fills[sells] = np.clip(volume - (scum - qty[sells]), 0,
+                                   qty[sells])
+
+            # pair buys and sells: one trade per segment between the
+            # cumulative volume breakpoints of both sides
+            edges = np.union1d(bcum[bcum < volume], scum[scum < volume])
+            edges = np.concatenate([[0.], edges, [volume]])
+            trd_vol = np.diff(edges)
+            trd_buy = buys[np.searchsorted(bcum, edges[1:], 'left')]
+            trd_sell = sells[np.searchsorted(scum, edges[1:], 'left')]
+            self._record_auction_trades(px, trd_vol, uid[trd_buy],
+                                        uid[trd_sell], timestamp)
+            self.last_px = px
+
+        for order, fill in zip(orders, fills.tolist()):
+            if fill > 0:
+                order.leavesqty -= fill
+                if order.uid < 0 and not order.leavesqty:
+                    self._forget_own(order.uid)
+        self.in_auction = False
+        self._auction_orders = []
+        for order in orders:
+            if order.leavesqty > 0:
+                if order.price == np.inf or order.price <= 0:
+                    order._cumqty = order.qty - order.leavesqty
+                    order.leavesqty = 0
+                    if order.uid < 0:
+                        self._forget_own(order.uid)
+                else:
+                    # any trade of the continuous book follows the auction
+                    order.timestamp = max(order.timestamp, timestamp)
+                    self._match_or_rest(order)
+        return px, volume
+
+    def _record_auction_trades(self, px, trd_vol, buy_uid, sell_uid,
+                               timestamp):
+
+        ntrd = len(trd_vol)
+        if self.event_log is not None:
+            # no aggressor side in auctions: uid is the seller
+            for vol, buy, sell in zip(trd_vol.tolist(), buy_uid.tolist(),
+                                      sell_uid.tolist()):
+                self.event_log.log(eventlog.EXEC, sell, buy, -1, vol,
+                                   px, timestamp)
+        end = self.ntrds + ntrd
+        while end > len(self.trades['price']):
+            self.trades = self.inc_dict_size(self.trades,
+                                             inc=max(self.inc, ntrd))
+        self.trades['price'][self.ntrds:end] = px
+        self.trades['vol'][self.ntrds:end] = trd_vol
+        self.trades['agg_ord'][self.ntrds:end] = buy_uid
+        self.trades['pas_ord'][self.ntrds:end] = sell_uid
+        # auction trades have no aggressor side
+        self.trades['buy_init'][self.ntrds:end] = np.nan
+        self.trades['timestamp'][self.ntrds:end] = timestamp
+        self.ntrds = end
+        self.cumvol += trd_vol.sum()
+        self.cumturn += px * trd_vol.sum()
+
+        my_uid = np.concatenate([buy_uid[buy_uid < 0], sell_uid[sell_uid < 0]])
+        my_vol = np.concatenate([trd_vol[buy_uid < 0], trd_vol[sell_uid < 0]])
+        n_my = len(my_uid)
+        if n_my:
+            end = self.my_ntrds + n_my
+            while end > len(self.my_trades['price']):
+                self.my_trades = self.inc_dict_size(self.my_trades,
+                                                    inc=max(self.inc, n_my))
+            self.my_trades['price'][self.my_ntrds:end] = px
+            self.my_trades['vol'][self.my_ntrds:end] = my_vol
+            self.my_trades['my_uid'][self.my_ntrds:end] = my_uid
+            self.my_trades['timestamp'][self.my_ntrds:end] = timestamp
+            self.my_ntrds = end
+            self.my_cumvol += my_vol.sum()
+            self.my_cumturn += px * my_vol.sum()
+            n_my_buys = (buy_uid < 0).sum()
+            for i, (uid, vol) in enumerate(zip(my_uid.tolist(),
+                                               my_vol.tolist())):
+                self._account_fill(uid, i < n_my_buys, vol, px,
+                                   is_maker=True)
+
     def _remove_price(self, is_buy, price):
         """ Remove a PriceLevel from the book
         
@@ -593,17 +1331,21 @@ class Orderbook:
         """
 
         if is_buy:
-            del self._bids.book[price]
+            level = self._bids.book.pop(price)
+            self._bids.version += 1
             if len(self._bids.book) > 0:
                 self._bids.best = self._bids.book[max(self._bids.book.keys())]
             else:
                 self._bids.best = None
         else:
-            del self._asks.book[price]
+            level = self._asks.book.pop(price)
+            self._asks.version += 1
             if len(self._asks.book) > 0:
                 self._asks.best = self._asks.book[min(self._asks.book.keys())]
             else:
                 self._asks.best = None
+        if len(self._free_levels) < self.pool_size:
+            self._free_levels.append(level)
 
     def top_bidpx(self, nlevels):
         """ Returns the first nlevels of the Bids ordered by price desc
@@ -794,7 +1536,116 @@ class Orderbook:
 
         return [pasks, vasks]
 
+    def top_levels(self, is_buy, nlevels):
+        """ Returns the first nlevels PriceLevels of one side of the book
+        from the best price outwards. Fewer levels are returned if the
+        side does not have enough of them.
+
+        Args:
+            is_buy (bool): True for the Bids, False for the Asks
+            nlevels (int): maximum number of price levels to return
+        Returns:
+            list of PriceLevel ordered from best to worst price
+        """
+
+        if is_buy:
+            halfbook = self._bids
+            n_move = -1
+        else:
+            halfbook = self._asks
+            n_move = 1
+
+        if halfbook.best is None:
+            return []
+
+        levels = [halfbook.best]
+        n_px = min(nlevels, len(halfbook.book))
+        nextpx = halfbook.best.price
+        while len(levels) < n_px:
+            nextpx = self.get_new_price(nextpx, n_move)
+            if nextpx in halfbook.book:
+                levels.append(halfbook.book[nextpx])
+        return levels
+
+    def resting_orders(self, is_buy):
+        """ Yields the resting orders of one side of the book in
+        price-time priority: best price first, queue head first.
+        """
+
+        halfbook = self._bids if is_buy else self._asks
+        for price in sorted(halfbook.book, reverse=is_buy):
+            order = halfbook.book[price].head
+            while order is not None:
+                yield order
+                order = order.next
+
+    def restore(self, orders, last_px=None, keep_positions=False):
+        """ Rebuild the book from resting orders, without matching.
+        Everything else in the orderbook is reset (see reset_ob).
+
+        Args:
+            orders (iterable): (uid, is_buy, qty, leavesqty, price,
+                               timestamp) of each resting order, in the
+                               price-time priority of resting_orders
+            last_px (float): price of the last trade
+            keep_positions (bool): see reset_ob
+        """
+
+        self.reset_ob(reset_all=True, keep_positions=keep_positions)
+        for uid, is_buy, qty, leavesqty, price, timestamp in orders:
+            if self.event_log is not None:
+                self.event_log.log(eventlog.ADD, uid, 0, is_buy, leavesqty,
+                                   price, timestamp)
+            order = self._new_order(uid, is_buy, qty, price, timestamp)
+            order.leavesqty = leavesqty
+            self._orders[uid] = order
+            if is_buy:
+                self._bids.add(order)
+            else:
+                self._asks.add(order)
+        self.last_px = last_px
+
+    def memory_report(self):
+        """ Size of the structures of the orderbook with an estimate of
+        their bytes (see marketsimulator.memory)
+
+        Returns:
+            dict of counts and '*_bytes' estimates
+        """
+
+        levels = list(self._bids.book.values()) + list(self._asks.book.values())
+        n_live = sum(level.count for level in levels)
+        order_size = (object_size(next(iter(self._orders.values())))
+                      if self._orders else 0)
+        level_size = object_size(levels[0]) if levels else 0
+        report = {
+            'live_orders': n_live,
+            'terminal_orders': len(self._orders) - n_live,
+            'orders_bytes': (sys.getsizeof(self._orders)
+                             + order_size * len(self._orders)),
+            'bid_levels': len(self._bids.book),
+            'ask_levels': len(self._asks.book),
+            'levels_bytes': (sys.getsizeof(self._bids.book)
+                             + sys.getsizeof(self._asks.book)
+                             + level_size * len(levels)),
+            'trades_capacity': len(self.trades['vol']),
+            'trades_used': self.ntrds,
+            'trades_bytes': arrays_size(self.trades),
+            'my_trades_capacity': len(self.my_trades['vol']),
+            'my_trades_used': self.my_ntrds,
+            'my_trades_bytes': arrays_size(self.my_trades),
+            'tape_bytes': self.tape.nbytes,
+            'auction_orders': len(self._auction_orders),
+            'pegged_orders': len(self._pegged),
+            'pooled_orders': len(self._free_orders),
+            'pooled_levels': len(self._free_levels),
+        }
+        report['total_bytes'] = sum(value for key, value in report.items()
+                                    if key.endswith('_bytes'))
+        return report
+
     def __str__(self):
+        import pandas as pd
         pbid, vbid = self.top_bids(10)
         pask, vask = self.top_asks(10)
         df = pd.DataFrame({'vbid': vbid, 'pbid': pbid, 'pask': pask, 'vask': vask})
@@ -808,7 +1659,12 @@ class Order:
 
     # __slots__ = ["uid", "is_buy", "qty", "price", "timestamp", "status"]
 
-    def __init__(self, uid, is_buy, qty, price, timestamp=datetime.now()):
+    def __init__(self, uid, is_buy, qty, price, timestamp=0):
+        self.reset(uid, is_buy, qty, price, timestamp)
+
+    def reset(self, uid, is_buy, qty, price, timestamp=0):
+        """ (Re)initialise the order, see Orderbook._new_order """
+
         self.uid = uid
         self.is_buy = is_buy
         self.qty = qty
@@ -824,42 +1680,82 @@ class Order:
         # DDL attributes import unittest
         self.prev = None
         self.next = None
+        # arrival sequence number in its PriceLevel
+        self.seq = None
 
     @property
     def cumqty(self):
-        if self._cumqty:
+        if self._cumqty is not None:
             return self._cumqty
         else:
             return self.qty - self.leavesqty
 
 
+_level_ids = count()
+
+
 class PriceLevel:
     """ Represents a price in the orderbook with its order queue
-    
+
+    The level keeps cumulative counters of the volume and number of
+    orders enqueued, executed (always from the head) and cancelled, so
+    its volume, its number of orders and the queue position of our
+    own orders are available in O(1).
     """
 
     def __init__(self, order):
+        self.reset(order)
+
+    def reset(self, order):
+        """ (Re)initialise the level with its first order """
+
+        # unique across recycled instances, see ShadowBook
+        self.id = next(_level_ids)
         self.price = order.price
-        self.head = order
-        self.tail = order
+        self.head = None
+        self.tail = None
+        self.enq_vol = 0
+        self.exec_vol = 0
+        self.cxl_vol = 0
+        self.n_enq = 0
+        self.n_popped = 0
+        self.n_cxl = 0
+        # queue position of own orders (uid < 0) resting at this level:
+        # uid -> [vol ahead, exec_vol, orders ahead, n_popped, seq]
+        # where vol and orders ahead are taken at insertion time minus
+        # the cancellations ahead since then
+        self.mine = dict()
+        self.append(order)
 
     # Cummulative volume of all orders at this PriceLevel
     @property
     def vol(self):
-        vol = 0
-        next_order = self.head
-        while next_order is not None:
-            vol += next_order.leavesqty
-            next_order = next_order.next
-        return vol
+        return self.enq_vol - self.exec_vol - self.cxl_vol
+
+    # Number of orders resting at this PriceLevel
+    @property
+    def count(self):
+        return self.n_enq - self.n_popped - self.n_cxl
 
     def append(self, order):
-        self.tail.next = order
-        order.prev = self.tail
+        if self.head is None:
+            self.head = order
+        else:
+            self.tail.next = order
+            order.prev = self.tail
         self.tail = order
+        order.seq = self.n_enq
+        if order.uid < 0:
+            self.mine[order.uid] = [self.vol, self.exec_vol,
+                                    self.count, self.n_popped, order.seq]
+        self.n_enq += 1
+        self.enq_vol += order.leavesqty
 
     def pop(self):
         self.head.active = False
+        if self.mine:
+            self.mine.pop(self.head.uid, None)
+        self.n_popped += 1
         if self.head.next is None:
             self.head = None
             self.tail = None
@@ -867,6 +1763,47 @@ class PriceLevel:
             self.head.next.prev = None
             self.head = self.head.next
 
+    def reduce(self, order, qty):
+        """ Account qty removed from the leavesqty of a resting order """
+
+        self.cxl_vol += qty
+        for entry in self.mine.values():
+            if entry[4] > order.seq:
+                entry[0] -= qty
+
+    def remove(self, order):
+        """ Account the removal of a resting order from the queue.
+        Linked list pointers are updated by the Orderbook.
+        """
+
+        self.cxl_vol += order.leavesqty
+        self.n_cxl += 1
+        if self.mine:
+            self.mine.pop(order.uid, None)
+            for entry in self.mine.values():
+                if entry[4] > order.seq:
+                    entry[0] -= order.leavesqty
+                    entry[2] -= 1
+
+    def position(self, order):
+        """ Returns (volume ahead, orders ahead) of a resting order.
+        O(1) for own orders, walks the queue for the rest.
+        """
+
+        entry = self.mine.get(order.uid)
+        if entry is not None:
+            vol_ahead = entry[0] - (self.exec_vol - entry[1])
+            n_ahead = entry[2] - (self.n_popped - entry[3])
+            return max(vol_ahead, 0), max(n_ahead, 0)
+        vol_ahead = 0
+        n_ahead = 0
+        next_order = self.head
+        while next_order is not order:
+            vol_ahead += next_order.leavesqty
+            n_ahead += 1
+            next_order = next_order.next
+        return vol_ahead, n_ahead
+
 
 class HalfBook(ABC):
     """ Abstract class representing the common properties of a half orderbook.
@@ -874,17 +1811,27 @@ class HalfBook(ABC):
     will have different is_new_best methods    
     """
 
-    def __init__(self):
+    def __init__(self, free_levels=None):
         self.book = dict()
         # Pointer to Best PriceLevel 
         self.best = None
+        # recycled PriceLevels, shared by both sides of an Orderbook
+        self.free_levels = [] if free_levels is None else free_levels
+        # bumped when a level is added or removed, lets readers of the
+        # top levels (mdview) skip selecting them again
+        self.version = 0
 
     def add(self, order):
         if order.price in self.book:
             self.book[order.price].append(order)
         else:
-            new_pricelevel = PriceLevel(order)
+            if self.free_levels:
+                new_pricelevel = self.free_levels.pop()
+                new_pricelevel.reset(order)
+            else:
+                new_pricelevel = PriceLevel(order)
             self.book.update({order.price: new_pricelevel})
+            self.version += 1
             if self.best is None or self.is_new_best(order):
                 self.best = new_pricelevel
         order.active = True
@@ -900,8 +1847,8 @@ class Bids(HalfBook):
         for Bids or Asks
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, free_levels=None):
+        super().__init__(free_levels)
 
     def is_new_best(self, order):
         if order.price > self.best.price:
@@ -916,8 +1863,8 @@ class Asks(HalfBook):
         for Bids or Asks
     """
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, free_levels=None):
+        super().__init__(free_levels)
 
     def is_new_best(self, order):
         if order.price < self.best.price:
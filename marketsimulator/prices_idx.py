@@ -20,6 +20,7 @@ on a previous price and a number of tick movements.
 
 """
 
+from functools import lru_cache
 import numpy as np
 
 ticks = [
@@ -102,6 +103,135 @@ def build_prices_dict(band):
     return dict(zip(prices, np.arange(len(prices)))), prices, band_ticks[18]
 
 
+@lru_cache(maxsize=None)
+def get_band_prices(band):
+    """ Cached version of build_prices_dict. Tables are only built the
+    first time a band is requested.
+
+    Args:
+        band (str or int): liquidity band, e.g. 'band6' or 6
+    Returns:
+        (prices_idx, prices, max_tick) of the band
+    """
+
+    band = str(band).replace('band', '')
+    return build_prices_dict(band)
+
+
+@lru_cache(maxsize=None)
+def get_band_array(band):
+    """ Prices of a band as a sorted ndarray, with the tick above them
+
+    Returns:
+        (prices, max_tick)
+    """
+
+    _, prices, max_tick = get_band_prices(band)
+    return np.array(prices), max_tick
+
+
+def ladder_ticks(prices, band):
+    """ Tick index of each price, as price_to_tick, without raising for
+    prices off the ladder
+
+    Args:
+        prices (ndarray): float prices
+        band (str or int): liquidity band, e.g. 'band6' or 6
+    Returns:
+        (ticks, on_ladder): int64 tick indexes, meaningless where the
+        bool on_ladder is False
+    """
+
+    band_prices, max_tick = get_band_array(band)
+    last = len(band_prices) - 1
+    idx = np.minimum(np.searchsorted(band_prices, prices), last)
+    above = prices > band_prices[-1]
+    n_above = np.round((prices - band_prices[-1]) / max_tick).astype(np.int64)
+    on_ladder = np.where(above,
+                         band_prices[-1] + n_above * max_tick == prices,
+                         band_prices[idx] == prices)
+    return np.where(above, last + n_above, idx), on_ladder
+
+
+def price_to_tick(prices, band):
+    """ Tick index of each price in the ladder of a band. Prices above
+    the table continue with max_tick increments.
+
+    Args:
+        prices (array_like): prices on the tick ladder
+        band (str or int): liquidity band, e.g. 'band6' or 6
+    Returns:
+        int64 ndarray of tick indexes
+    """
+
+    prices = np.asarray(prices, dtype=float)
+    ticks, on_ladder = ladder_ticks(prices, band)
+    if not on_ladder.all():
+        raise ValueError(f'Price {prices[~on_ladder].ravel()[0]} not found')
+    return ticks
+
+
+def tick_to_price(ticks, band):
+    """ Price of each tick index of a band, inverse of price_to_tick
+
+    Returns:
+        float ndarray of prices
+    """
+
+    band_prices, max_tick = get_band_array(band)
+    ticks = np.asarray(ticks, dtype=np.int64)
+    last = len(band_prices) - 1
+    return np.where(ticks > last,
+                    band_prices[-1] + (ticks - last) * max_tick,
+                    band_prices[np.clip(ticks, 0, last)])
+
+
+def shift_prices(prices, n_moves, band):
+    """ Move each price n_moves ticks. Vectorized version of
+    Orderbook.get_new_price, with exactly the same results:
+
+        - moves below the first price of the table stop there
+        - moves past the last price of the table add n_moves * max_tick
+          to the original price
+        - prices off the ladder can only move up, adding max_tick
+          increments. Moving them down raises ValueError
+
+    Args:
+        prices (array_like): prices
+        n_moves (int or array_like): ticks to move each price,
+                                     broadcast against prices
+        band (str or int): liquidity band
+    Returns:
+        float ndarray of prices
+    """
+
+    band_prices, max_tick = get_band_array(band)
+    prices = np.asarray(prices, dtype=float)
+    n_moves = np.asarray(n_moves, dtype=np.int64)
+    last = len(band_prices) - 1
+    ticks, on_ladder = ladder_ticks(prices, band)
+    new_ticks = ticks + n_moves
+    if not (on_ladder | (n_moves >= 0)).all():
+        bad = np.broadcast_to(prices, new_ticks.shape)[
+            ~(on_ladder | (n_moves >= 0))].ravel()[0]
+        raise ValueError(f'Price {bad} not found')
+    return np.where(on_ladder & (new_ticks <= last),
+                    band_prices[np.clip(new_ticks, 0, last)],
+                    prices + n_moves * max_tick)
+
+
+def price_ladder(price, n_below, n_above, band):
+    """ The n_below prices below price, price and the n_above prices
+    above it, e.g. the quote grid of a market maker
+
+    Returns:
+        float ndarray of 1 + n_below + n_above prices
+    """
+
+    tick = price_to_tick(price, band)
+    return tick_to_price(np.arange(tick - n_below, tick + n_above + 1), band)
+
+
 def get_band_dicts(bands_list):
     
     prices_idx = dict()
@@ -110,6 +240,6 @@ def get_band_dicts(bands_list):
     
     for band in bands_list:
         key = f'band{band}'
-        band_info = build_prices_dict(band)
+        band_info = get_band_prices(band)
         prices_idx[key], prices[key], max_tick[key] = band_info
     return prices_idx, prices, max_tick
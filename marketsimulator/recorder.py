@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+L2 orderbook snapshot recorder.
+
+A BookRecorder is attached to a Gateway and samples the first nlevels
+price levels of each side of the book, either every time the best bid
+or best ask (price or volume) changes, or at a fixed interval of
+simulated time. Samples are written into preallocated NumPy arrays
+of shape (time, level, field) where field is one of FIELDS, and
+flushed to .npz files in chunks so that full-day replays can be
+recorded without keeping the whole history in memory.
+
+    >>> rec = gtw.attach(BookRecorder(nlevels=5, path='/tmp/san'))
+    >>> gtw.move_n_seconds(3600)
+    >>> rec.close()
+    >>> data = load_snapshots('/tmp/san')
+    >>> data['bids'].shape
+    (n_samples, 5, 3)
+
+"""
+
+import glob
+import numpy as np
+
+FIELDS = ['price', 'vol', 'count']
+
+
+class BookRecorder:
+    """ Records L2 snapshots of a Gateway orderbook into columnar arrays
+
+    Args:
+        nlevels (int): number of price levels recorded per side
+        interval (float): seconds of simulated time between samples.
+                          If None, a sample is taken on every BBO change
+        chunk_size (int): number of samples held in memory before flushing
+        path (str): prefix of the chunk files. Chunk n is written to
+                    f'{path}-{n:05d}.npz'. If None, chunks are kept
+                    in memory and can be retrieved with to_arrays()
+    """
+
+    def __init__(self, nlevels=10, interval=None, chunk_size=100_000,
+                 path=None):
+        self.nlevels = nlevels
+        self.chunk_size = chunk_size
+        self.path = path
+        if interval is None:
+            self.interval = None
+        else:
+            self.interval = np.timedelta64(int(interval * 1e9), 'ns')
+        self._next_sample = None
+        self._last_bbo = None
+        self.n_chunks = 0
+        self.n_samples = 0
+        self._chunks = []
+        self._alloc()
+
+    def _alloc(self):
+        shape = (self.chunk_size, self.nlevels, len(FIELDS))
+        self.time = np.empty(self.chunk_size, dtype='datetime64[ns]')
+        self.bids = np.full(shape, np.nan)
+        self.asks = np.full(shape, np.nan)
+        self.pos = 0
+
+    def on_message(self, gtw):
+        """ Gateway observer callback, called after every message """
+
+        ob = gtw.ob
+        if self.interval is None:
+            bbo = (ob.bbid, ob.bask)
+            if bbo == self._last_bbo:
+                return
+            self._last_bbo = bbo
+            self.sample(ob, gtw.ob_time)
+        else:
+            now = gtw.ob_time
+            if self._next_sample is None:
+                self._next_sample = now
+            if now >= self._next_sample:
+                self.sample(ob, now)
+                # skip the boundaries with no messages in between
+                n_skip = (now - self._next_sample) // self.interval + 1
+                self._next_sample += n_skip * self.interval
+
+    def sample(self, ob, timestamp):
+        """ Write the current depth of the orderbook in the next row
+
+        Args:
+            ob (Orderbook): orderbook to be sampled
+            timestamp (datetime): time stamped to the sample
+        """
+
+        pos = self.pos
+        self.time[pos] = timestamp
+        for side, is_buy in ((self.bids, True), (self.asks, False)):
+            row = side[pos]
+            levels = ob.top_levels(is_buy, self.nlevels)
+            for i, level in enumerate(levels):
+                row[i, 0] = level.price
+                row[i, 1] = level.vol
+                row[i, 2] = level.count
+        self.pos += 1
+        self.n_samples += 1
+        if self.pos == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ Write the samples held in memory to a new chunk """
+
+        if self.pos == 0:
+            return
+        end = self.pos
+        if self.path is None:
+            self._chunks.append((self.time[:end].copy(),
+                                 self.bids[:end].copy(),
+                                 self.asks[:end].copy()))
+        else:
+            np.savez(f'{self.path}-{self.n_chunks:05d}.npz',
+                     time=self.time[:end],
+                     bids=self.bids[:end],
+                     asks=self.asks[:end])
+        self.n_chunks += 1
+        self.bids[:end] = np.nan
+        self.asks[:end] = np.nan
+        self.pos = 0
+
+    def close(self):
+        """ Flush remaining samples. Call it at the end of the replay """
+
+        self.flush()
+
+    def to_arrays(self):
+        """ Returns a dict with time, bids and asks arrays of all the
+        samples recorded. Reads the chunk files if a path was given.
+        """
+
+        if self.path is not None:
+            # only the chunks written by this recorder, if any
+            chunks = []
+            if self.n_chunks:
+                data = _load_chunks([f'{self.path}-{n:05d}.npz'
+                                     for n in range(self.n_chunks)])
+                chunks.append((data['time'], data['bids'], data['asks']))
+        else:
+            chunks = list(self._chunks)
+        chunks.append((self.time[:self.pos],
+                       self.bids[:self.pos],
+                       self.asks[:self.pos]))
+        return {'time': np.concatenate([c[0] for c in chunks]),
+                'bids': np.concatenate([c[1] for c in chunks]),
+                'asks': np.concatenate([c[2] for c in chunks])}
+
+
+def load_snapshots(path):
+    """ Load and concatenate all the chunk files written by a BookRecorder
+
+    Args:
+        path (str): prefix used by the recorder
+    Returns:
+        dict with 'time' (datetime64[ns]), 'bids' and 'asks' arrays
+        of shape (n_samples, nlevels, len(FIELDS))
+    """
+
+    files = sorted(glob.glob(f'{glob.escape(path)}-*.npz'))
+    if not files:
+        raise FileNotFoundError(f'No snapshot chunks found for {path}')
+    return _load_chunks(files)
+
+
+def _load_chunks(files):
+
+    time, bids, asks = [], [], []
+    for file in files:
+        with np.load(file) as chunk:
+            time.append(chunk['time'])
+            bids.append(chunk['bids'])
+            asks.append(chunk['asks'])
+    return {'time': np.concatenate(time),
+            'bids': np.concatenate(bids),
+            'asks': np.concatenate(asks)}
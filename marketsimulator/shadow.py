@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shadow orders: evaluate many passive strategies in one replay.
+
+Shadow orders never enter the book. They sit on side tables keyed by
+side and price with an estimate of their queue position, and they are
+filled from the historical trade flow as the Orderbook executes each
+level, so they neither remove liquidity nor move market_impact. Every
+shadow order sees the real flow on its own: orders of different
+strategies (or of the same one) do not compete with each other.
+
+Queue position follows the rules of our own resting orders: a shadow
+order joins the back of its level, the volume ahead of it shrinks with
+the executions of the level and with the cancels and modifs of orders
+that were ahead of it. Once its level has been emptied, the orders
+arriving at that price are queued behind it. Trades at a worse price
+than a shadow order fill it up to the traded volume (it would have
+been ahead of the executed orders). Marketable shadow orders are filled
+at once against the displayed opposite levels, which are not consumed,
+and rest with their remaining quantity. Auctions do not fill shadow
+orders.
+
+    >>> shadow = gtw.ob.start_shadow()
+    >>> for offset in range(100):
+    ...     px = gtw.ob.get_new_price(gtw.ob.bbid[0], -offset)
+    ...     shadow.send(f'bid-{offset}', True, 100, px)
+    >>> gtw.move_n_seconds(600)
+    >>> shadow.position('bid-3').inventory
+
+"""
+
+import numpy as np
+from marketsimulator.accounting import Position
+from marketsimulator.timestamps import to_datetime64, to_ns
+
+FILL_FIELDS = ['vuid', 'strategy', 'is_buy', 'price', 'vol', 'timestamp']
+
+
+class ShadowOrder:
+    """ Virtual resting order of a strategy """
+
+    __slots__ = ['vuid', 'strategy', 'is_buy', 'qty', 'price', 'leavesqty',
+                 'timestamp', 'arrival_px', 'ahead', 'level_id', 'seq']
+
+    def __init__(self, vuid, strategy, is_buy, qty, price, timestamp,
+                 arrival_px):
+        self.vuid = vuid
+        self.strategy = strategy
+        self.is_buy = is_buy
+        self.qty = qty
+        self.price = price
+        self.leavesqty = qty
+        self.timestamp = timestamp
+        self.arrival_px = arrival_px
+        # volume ahead in the queue of the PriceLevel with id level_id
+        # (instances are recycled by pooled Orderbooks, ids are not).
+        # Real orders with seq below seq are ahead
+        self.ahead = 0
+        self.level_id = -1
+        self.seq = -1
+
+    def _rebind(self, level):
+        """ The level of the order was emptied and a new one was
+        created at its price: everything in it is behind the order
+        """
+
+        self.ahead = 0
+        self.level_id = level.id
+        self.seq = -1
+
+
+class ShadowBook:
+    """ Shadow orders of an Orderbook (see Orderbook.start_shadow)
+
+    Args:
+        ob (Orderbook): orderbook whose trade flow fills the orders
+    """
+
+    def __init__(self, ob):
+        self.ob = ob
+        self.reset()
+
+    def reset(self):
+        """ Forget every shadow order, fill and position """
+
+        # price -> list of active ShadowOrder, one table per side
+        self._bids = dict()
+        self._asks = dict()
+        self._orders = dict()
+        self.last_vuid = 0
+        self.positions = dict()
+        self._fills = []
+
+    def _table(self, is_buy):
+
+        return self._bids if is_buy else self._asks
+
+    def send(self, strategy, is_buy, qty, price, timestamp=0):
+        """ Place a shadow limit order
+
+        Args:
+            strategy: name of the strategy, the key of its Position
+            is_buy (bool): True for buys
+            qty (int): quantity of the order
+            price (float): limit price
+            timestamp (int): time of the order in nanoseconds (datetime
+                             and datetime64 are converted)
+        Returns:
+            vuid (int) of the shadow order
+        """
+
+        if qty <= 0:
+            raise ValueError(f'Shadow order qty must be positive: {qty}')
+        ob = self.ob
+        timestamp = to_ns(timestamp)
+        self.last_vuid += 1
+        order = ShadowOrder(self.last_vuid, strategy, is_buy, qty, price,
+                            timestamp, ob.mark_price())
+        self._orders[order.vuid] = order
+
+        # marketable part, against the displayed opposite levels
+        opposite = ob._asks.book if is_buy else ob._bids.book
+        crossed = sorted((px for px in opposite
+                          if (px <= price if is_buy else px >= price)),
+                         reverse=not is_buy)
+        for px in crossed:
+            self._fill(order, min(order.leavesqty, opposite[px].vol), px,
+                       timestamp, is_maker=False)
+            if not order.leavesqty:
+                return order.vuid
+
+        halfbook = ob._bids if is_buy else ob._asks
+        level = halfbook.book.get(price)
+        if level is not None:
+            order.level_id = level.id
+            order.ahead = level.vol
+            order.seq = level.n_enq
+        self._table(is_buy).setdefault(price, []).append(order)
+        return order.vuid
+
+    def cancel(self, vuid):
+        """ Cancel a shadow order. Unknown or finished orders are ignored """
+
+        order = self._orders.get(vuid)
+        if order is None or not order.leavesqty:
+            return
+        order.leavesqty = 0
+        self._discard(order)
+
+    def _discard(self, order):
+
+        table = self._table(order.is_buy)
+        orders = table[order.price]
+        orders.remove(order)
+        if not orders:
+            del table[order.price]
+
+    def get(self, vuid):
+        """ Status of a shadow order
+
+        Returns:
+            dict with strategy, is_buy, qty, price, leavesqty, cumqty,
+            vol_ahead and active
+        """
+
+        order = self._orders[vuid]
+        return {'strategy': order.strategy,
+                'is_buy': order.is_buy,
+                'qty': order.qty,
+                'price': order.price,
+                'leavesqty': order.leavesqty,
+                'cumqty': order.qty - order.leavesqty,
+                'vol_ahead': order.ahead,
+                'active': order.leavesqty > 0}
+
+    def position(self, strategy):
+        """ Position of a strategy (see accounting.Position) """
+
+        if strategy not in self.positions:
+            self.positions[strategy] = Position(strategy, self.ob.maker_fee,
+                                                self.ob.taker_fee)
+        return self.positions[strategy]
+
+    def fills(self, strategy=None):
+        """ Fills of every shadow order, or of one strategy
+
+        Returns:
+            dict of arrays, one per field of FILL_FIELDS
+        """
+
+        fills = self._fills
+        if strategy is not None:
+            fills = [fill for fill in fills if fill[1] == strategy]
+        columns = list(zip(*fills)) if fills else [[]] * len(FILL_FIELDS)
+        fills = {field: np.array(column)
+                 for field, column in zip(FILL_FIELDS, columns)}
+        fills['timestamp'] = to_datetime64(
+            np.array(columns[-1], dtype=np.int64))
+        return fills
+
+    def _fill(self, order, vol, price, timestamp, is_maker=True):
+
+        if vol <= 0:
+            return
+        order.leavesqty -= vol
+        self._fills.append((order.vuid, order.strategy, order.is_buy, price,
+                            vol, timestamp))
+        self.position(order.strategy).on_fill(order.is_buy, vol, price,
+                                              is_maker, order.arrival_px)
+
+    def on_trade(self, level, is_buy, vol, timestamp):
+        """ vol of the resting side is_buy was executed at level.
+        Called by the Orderbook.
+        """
+
+        table = self._table(is_buy)
+        if not table:
+            return
+        price = level.price
+        for px in list(table):
+            if px == price:
+                for order in list(table[px]):
+                    if order.level_id != level.id:
+                        order._rebind(level)
+                    if order.ahead >= vol:
+                        order.ahead -= vol
+                        continue
+                    self._fill(order, min(order.leavesqty, vol - order.ahead),
+                               px, timestamp)
+                    order.ahead = 0
+                    if not order.leavesqty:
+                        self._discard(order)
+            elif (px > price) if is_buy else (px < price):
+                # traded through: the shadow order was ahead
+                for order in list(table[px]):
+                    self._fill(order, min(order.leavesqty, vol), px,
+                               timestamp)
+                    if not order.leavesqty:
+                        self._discard(order)
+
+    def on_reduce(self, order, qty, level):
+        """ qty of a resting order of level was cancelled.
+        Called by the Orderbook.
+        """
+
+        orders = self._table(order.is_buy).get(order.price)
+        if not orders:
+            return
+        for shadow in orders:
+            if shadow.level_id != level.id:
+                shadow._rebind(level)
+            elif order.seq < shadow.seq:
+                shadow.ahead = max(shadow.ahead - qty, 0)
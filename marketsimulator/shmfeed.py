@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared-memory market data feed of a Gateway replay.
+
+ShmPublisher is a Gateway observer writing L2 snapshots (published when
+the top depth levels change) and trades to a ring buffer in a
+multiprocessing.shared_memory block. There is a single writer and no
+lock: each record carries its sequence number, which the writer sets
+to -1 before updating the record and to the new sequence once the
+record is complete. ShmReader, in any local process, maps the same
+block as a numpy array and copies the records it has not seen yet.
+The copy is what makes the lock-free read safe: a record is only
+returned once its sequence number has been checked after copying it,
+a view of the ring could be rewritten while being used. A
+reader that falls more than capacity records behind, or whose slot
+was rewritten while it was being copied, detects the overrun, counts
+the records lost and resumes from the oldest record still available.
+
+    >>> pub = gtw.attach(ShmPublisher('san-md', depth=5))
+    >>> gtw.move_n_seconds(3600)
+
+    # in another process
+    >>> reader = ShmReader('san-md')
+    >>> records = reader.poll()
+    >>> trades = records[records['kind'] == TRADE]
+
+Every field of a record is 8 bytes wide, so the sequence numbers are
+written with single aligned stores. multiprocessing.shared_memory
+needs python 3.8 or later.
+"""
+
+from multiprocessing import shared_memory
+import numpy as np
+
+BOOK = 0
+TRADE = 1
+MAGIC = 0x4d4b5446454544
+# header slots
+HEADER = ['magic', 'capacity', 'depth', 'next_seq', 'closed']
+HEADER_SIZE = 8 * len(HEADER)
+_CAPACITY, _DEPTH, _NEXT_SEQ, _CLOSED = 1, 2, 3, 4
+
+
+def record_dtype(depth):
+    """ Layout of a record of a feed with depth levels per side.
+    Book records fill the level arrays (nan beyond the book), trade
+    records price, vol and buy_init (nan in auctions).
+    """
+
+    return np.dtype([('seq', 'i8'), ('kind', 'i8'), ('time', 'i8'),
+                     ('price', 'f8'), ('vol', 'f8'), ('buy_init', 'f8'),
+                     ('bid_px', 'f8', depth), ('bid_vol', 'f8', depth),
+                     ('ask_px', 'f8', depth), ('ask_vol', 'f8', depth)])
+
+
+def _attach(name):
+    """ Open an existing block without letting this process's
+    resource tracker unlink it at exit
+    """
+
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class ShmPublisher:
+    """ Gateway observer publishing L2 and trades to shared memory
+
+    Args:
+        name (str): name of the shared memory block. None for a random
+                    one (see the name attribute)
+        depth (int): price levels per side of book records
+        capacity (int): records in the ring buffer
+    """
+
+    def __init__(self, name=None, depth=5, capacity=2**16):
+        self.depth = depth
+        self.capacity = capacity
+        dtype = record_dtype(depth)
+        self.shm = shared_memory.SharedMemory(
+            name=name, create=True, size=HEADER_SIZE + capacity * dtype.itemsize)
+        self.name = self.shm.name
+        self.header = np.ndarray(len(HEADER), dtype=np.int64,
+                                 buffer=self.shm.buf)
+        self.records = np.ndarray(capacity, dtype=dtype, buffer=self.shm.buf,
+                                  offset=HEADER_SIZE)
+        self.records['seq'] = -1
+        self.header[:] = [MAGIC, capacity, depth, 0, 0]
+        self.seq = 0
+        self._ntrds = 0
+        self._book = None
+
+    def on_message(self, gtw):
+        """ Gateway observer callback """
+
+        ob = gtw.ob
+        if ob.ntrds < self._ntrds:
+            # the orderbook was reset
+            self._ntrds = 0
+        trades = ob.trades
+        for i in range(self._ntrds, ob.ntrds):
+            self.publish_trade(int(trades['timestamp'][i]),
+                               trades['price'][i], trades['vol'][i],
+                               trades['buy_init'][i])
+        self._ntrds = ob.ntrds
+
+        bids = ob.top_levels(True, self.depth)
+        asks = ob.top_levels(False, self.depth)
+        book = ([(lvl.price, lvl.vol) for lvl in bids],
+                [(lvl.price, lvl.vol) for lvl in asks])
+        if book != self._book:
+            self._book = book
+            self.publish_book(gtw.ob_ns, *book)
+
+    def _claim(self):
+        """ Invalidate the next slot and return its index """
+
+        i = self.seq % self.capacity
+        self.records['seq'][i] = -1
+        return i
+
+    def _commit(self, i):
+
+        self.records['seq'][i] = self.seq
+        self.seq += 1
+        self.header[_NEXT_SEQ] = self.seq
+
+    def publish_trade(self, time, price, vol, buy_init):
+
+        i = self._claim()
+        record = self.records[i]
+        record['kind'] = TRADE
+        record['time'] = time
+        record['price'] = price
+        record['vol'] = vol
+        record['buy_init'] = buy_init
+        self._commit(i)
+
+    def publish_book(self, time, bids, asks):
+        """ Publish an L2 snapshot
+
+        Args:
+            time (int): nanoseconds since epoch
+            bids, asks (list): (price, vol) of each level, best first
+        """
+
+        i = self._claim()
+        record = self.records[i]
+        record['kind'] = BOOK
+        record['time'] = time
+        record['price'] = record['vol'] = record['buy_init'] = np.nan
+        for side, levels in (('bid', bids), ('ask', asks)):
+            px = np.full(self.depth, np.nan)
+            vol = np.full(self.depth, np.nan)
+            if levels:
+                px[:len(levels)], vol[:len(levels)] = zip(*levels)
+            record[f'{side}_px'] = px
+            record[f'{side}_vol'] = vol
+        self._commit(i)
+
+    def close(self, unlink=True):
+        """ Mark the feed as finished for the readers and release the
+        block (unlink removes it once every reader has closed it)
+        """
+
+        self.header[_CLOSED] = 1
+        del self.header, self.records
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ShmReader:
+    """ Consumer of a ShmPublisher feed in any local process
+
+    Args:
+        name (str): name of the shared memory block
+        from_start (bool): start from the oldest record still in the
+                           ring. Otherwise only records published after
+                           the reader was created are returned
+    """
+
+    def __init__(self, name, from_start=True):
+        self.shm = _attach(name)
+        self.header = np.ndarray(len(HEADER), dtype=np.int64,
+                                 buffer=self.shm.buf)
+        if self.header[0] != MAGIC:
+            self.shm.close()
+            raise ValueError(f'{name} is not a market data feed')
+        self.capacity = int(self.header[_CAPACITY])
+        self.depth = int(self.header[_DEPTH])
+        self.records = np.ndarray(self.capacity,
+                                  dtype=record_dtype(self.depth),
+                                  buffer=self.shm.buf, offset=HEADER_SIZE)
+        next_seq = int(self.header[_NEXT_SEQ])
+        self.seq = max(0, next_seq - self.capacity) if from_start else next_seq
+        # records overwritten before they could be read
+        self.lost = 0
+
+    @property
+    def closed(self):
+        """ True once the publisher has closed the feed """
+
+        return bool(self.header[_CLOSED])
+
+    def poll(self, max_records=None):
+        """ Copy the records published since the last poll. Their
+        sequence numbers are checked once copied: a view of the ring
+        could still be rewritten by the publisher after the check
+
+        Args:
+            max_records (int): maximum number of records to return
+        Returns:
+            structured ndarray of records (see record_dtype), in
+            sequence order
+        """
+
+        next_seq = int(self.header[_NEXT_SEQ])
+        if next_seq - self.seq > self.capacity:
+            self._overrun(next_seq)
+        end = next_seq
+        if max_records is not None:
+            end = min(end, self.seq + max_records)
+        if end <= self.seq:
+            return self.records[:0].copy()
+        slots = np.arange(self.seq, end) % self.capacity
+        expected = np.arange(self.seq, end)
+        records = self.records[slots]
+        # slots being rewritten during the copy hold a newer (or -1)
+        # sequence, before or after it
+        valid = ((records['seq'] == expected)
+                 & (self.records['seq'][slots] == expected))
+        if not valid.all():
+            first_bad = int(np.argmin(valid))
+            records = records[:first_bad]
+            self.seq += first_bad
+            self._overrun(int(self.header[_NEXT_SEQ]))
+            return records
+        self.seq = end
+        return records
+
+    def _overrun(self, next_seq):
+        """ Skip to the oldest record that cannot be rewritten before
+        the next poll copies it
+        """
+
+        oldest = max(self.seq, next_seq - self.capacity + 1)
+        self.lost += oldest - self.seq
+        self.seq = oldest
+
+    def close(self):
+
+        del self.header, self.records
+        self.shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic L3 order flow for scaling benchmarks and soak tests.
+
+OrderFlowGenerator draws a whole session of historical-like messages
+at once with NumPy:
+
+    arrivals: Poisson, or self-exciting Hawkes with exponential kernel
+              simulated with its cluster (branching) representation
+    sizes: power law (Pareto) volumes, rounded to lots
+    prices: tick-relative placement around a reference price that
+            follows a random walk on the tick ladder of the liquidity
+            band (prices_idx tables). A fraction of the orders is
+            marketable and crosses the spread
+    cancels: every order is cancelled after an exponential lifetime,
+             unless it was filled before (the cancel is then ignored)
+
+The first 20 messages are the opening book, 10 levels per side, as in
+the shipped sessions. Messages are returned as typed arrays
+(SESSION_DTYPE) and to_session converts them to the Gateway format:
+
+    >>> gen = OrderFlowGenerator(price=10., rate=200, arrivals='hawkes',
+    ...                          seed=1)
+    >>> messages = gen.generate(date(2019, 5, 23))
+    >>> gtw = Gateway(ticker='san', date=date(2019, 5, 23),
+    ...               session=to_session(messages))
+
+"""
+
+from datetime import datetime, timedelta
+import numpy as np
+from marketsimulator.prices_idx import get_band_prices
+
+ORDTYPES = np.array(['new', 'cancel', 'modif'])
+NEW = 0
+CANCEL = 1
+SESSION_DTYPE = np.dtype([('ordtype', 'u1'),
+                          ('uid', '<i8'),
+                          ('is_buy', '?'),
+                          ('qty', '<f8'),
+                          ('price', '<f8'),
+                          ('timestamp', '<M8[ns]')])
+COLUMNS = ['ordtype', 'uid', 'is_buy', 'qty', 'price', 'timestamp']
+OPENING_LEVELS = 10
+
+
+def poisson_times(rng, rate, duration):
+    """ Arrival times (seconds, sorted) of a Poisson process """
+
+    n = rng.poisson(rate * duration)
+    return np.sort(rng.uniform(0, duration, n))
+
+
+def hawkes_times(rng, mu, alpha, beta, duration):
+    """ Arrival times (seconds, sorted) of a Hawkes process with
+    intensity mu + sum(alpha * exp(-beta * (t - t_i)))
+
+    Each generation of events is drawn at once: immigrants arrive as a
+    Poisson(mu) process and every event has Poisson(alpha / beta)
+    children after Exp(beta) delays.
+    """
+
+    if alpha >= beta:
+        raise ValueError('Hawkes process is explosive unless alpha < beta')
+    generation = poisson_times(rng, mu, duration)
+    times = [generation]
+    while len(generation):
+        n_children = rng.poisson(alpha / beta, len(generation))
+        parents = np.repeat(generation, n_children)
+        generation = parents + rng.exponential(1 / beta, len(parents))
+        generation = generation[generation < duration]
+        times.append(generation)
+    return np.sort(np.concatenate(times))
+
+
+class OrderFlowGenerator:
+    """ Vectorized generator of synthetic sessions
+
+    Args:
+        band (str): liquidity band of the tick size table
+        price (float): initial reference (best bid) price
+        rate (float): mean new orders per second. With Hawkes arrivals
+                      it is the stationary rate mu / (1 - alpha / beta)
+        arrivals (str): 'poisson' or 'hawkes'
+        branching (float): alpha / beta of the Hawkes process, the mean
+                           number of orders triggered by each order
+        decay (float): beta of the Hawkes process, in 1/seconds
+        size_alpha (float): tail exponent of the Pareto volumes
+        lot (int): volumes are multiples of lot
+        max_size (int): volume cap
+        depth_p (float): parameter of the geometric distribution of the
+                         distance in ticks of passive orders to the touch
+        p_marketable (float): probability of an order crossing the spread
+        p_move (float): probability of the reference price moving one
+                        tick up or down at each new order
+        lifetime (float): mean seconds before an order is cancelled
+        seed (int): seed of the random generator
+    """
+
+    def __init__(self, band='band6', price=10., rate=50., arrivals='poisson',
+                 branching=0.7, decay=5., size_alpha=1.5, lot=10,
+                 max_size=100_000, depth_p=0.3, p_marketable=0.05,
+                 p_move=0.02, lifetime=30., seed=None):
+        if arrivals not in ('poisson', 'hawkes'):
+            raise ValueError(f'Unexpected arrivals: {arrivals}')
+        _, band_prices, _ = get_band_prices(band)
+        self.band_prices = np.asarray(band_prices)
+        self.start_idx = int(np.searchsorted(self.band_prices, price))
+        self.rate = rate
+        self.arrivals = arrivals
+        self.branching = branching
+        self.decay = decay
+        self.size_alpha = size_alpha
+        self.lot = lot
+        self.max_size = max_size
+        self.depth_p = depth_p
+        self.p_marketable = p_marketable
+        self.p_move = p_move
+        self.lifetime = lifetime
+        self.rng = np.random.RandomState(seed)
+
+    def _arrival_times(self, duration):
+
+        if self.arrivals == 'poisson':
+            return poisson_times(self.rng, self.rate, duration)
+        mu = self.rate * (1 - self.branching)
+        return hawkes_times(self.rng, mu, self.branching * self.decay,
+                            self.decay, duration)
+
+    def _sizes(self, n):
+
+        sizes = self.lot * (1 + self.rng.pareto(self.size_alpha, n))
+        sizes = np.minimum(np.round(sizes / self.lot) * self.lot,
+                           self.max_size)
+        return np.maximum(sizes, self.lot)
+
+    def generate(self, date, start_h=9, end_h=17.5):
+        """ Generate the messages of a session
+
+        Args:
+            date (date): date of the session
+            start_h (float): hour of the opening book
+            end_h (float): hour of the end of the session
+        Returns:
+            structured ndarray with dtype SESSION_DTYPE, sorted by time
+        """
+
+        rng = self.rng
+        duration = (end_h - start_h) * 3600
+        open_ns = np.datetime64(datetime(date.year, date.month, date.day)
+                                + timedelta(hours=start_h), 'ns')
+
+        # opening book: one order per level, bids below the reference
+        levels = np.arange(OPENING_LEVELS)
+        open_is_buy = np.repeat([True, False], OPENING_LEVELS)
+        open_idx = np.concatenate([self.start_idx - levels,
+                                   self.start_idx + 1 + levels])
+        open_time = np.zeros(2 * OPENING_LEVELS)
+
+        time = self._arrival_times(duration)
+        n = len(time)
+        is_buy = rng.random_sample(n) < 0.5
+        # reference best bid tick index, the best ask is one tick above
+        move = rng.random_sample(n)
+        steps = ((move > 1 - self.p_move / 2).astype(np.int64)
+                 - (move < self.p_move / 2))
+        bid_idx = self.start_idx + np.cumsum(steps)
+        depth = rng.geometric(self.depth_p, n) - 1
+        marketable = rng.random_sample(n) < self.p_marketable
+        # passive orders rest depth ticks away from their own touch,
+        # marketable ones cross the spread by depth ticks
+        idx = np.where(is_buy, bid_idx - depth, bid_idx + 1 + depth)
+        idx = np.where(marketable,
+                       np.where(is_buy, bid_idx + 1 + depth, bid_idx - depth),
+                       idx)
+
+        is_buy = np.concatenate([open_is_buy, is_buy])
+        idx = np.clip(np.concatenate([open_idx, idx]), 1,
+                      len(self.band_prices) - 1)
+        time = np.concatenate([open_time, time])
+        n_new = len(time)
+        uid = np.arange(1, n_new + 1)
+        qty = self._sizes(n_new)
+
+        cancel_time = time + rng.exponential(self.lifetime, n_new)
+        cancelled = cancel_time < duration
+
+        messages = np.empty(n_new + cancelled.sum(), dtype=SESSION_DTYPE)
+        messages['ordtype'] = np.concatenate(
+            [np.full(n_new, NEW), np.full(cancelled.sum(), CANCEL)])
+        messages['uid'] = np.concatenate([uid, uid[cancelled]])
+        messages['is_buy'] = np.concatenate([is_buy, is_buy[cancelled]])
+        messages['qty'] = np.concatenate([qty, np.full(cancelled.sum(),
+                                                       np.nan)])
+        messages['price'] = np.concatenate(
+            [self.band_prices[idx], np.full(cancelled.sum(), np.nan)])
+        seconds = np.concatenate([time, cancel_time[cancelled]])
+        # milliseconds, as in the historical files
+        messages['timestamp'] = open_ns + (np.floor(seconds * 1000)
+                                           .astype(np.int64)
+                                           * 1_000_000).astype('m8[ns]')
+        # stable sort keeps every cancel after its new order
+        return messages[np.argsort(messages['timestamp'], kind='stable')]
+
+
+def to_session(messages):
+    """ Convert generated messages to the Gateway session format
+
+    Args:
+        messages (ndarray): SESSION_DTYPE messages
+    Returns:
+        (hist_orders, col_idx) as returned by gateway.load_session
+    """
+
+    hist_orders = np.empty((len(messages), len(COLUMNS)), dtype=object)
+    hist_orders[:, 0] = ORDTYPES[messages['ordtype']]
+    hist_orders[:, 1] = messages['uid']
+    hist_orders[:, 2] = messages['is_buy']
+    hist_orders[:, 3] = messages['qty']
+    hist_orders[:, 4] = messages['price']
+    # python ints, as the nanosecond timestamps of load_session
+    hist_orders[:, 5] = messages['timestamp'].astype(np.int64).tolist()
+    col_idx = {col: i for i, col in enumerate(COLUMNS)}
+    return hist_orders, col_idx
+
+
+def save_session(messages, data_path, ticker, date):
+    """ Write generated messages as a session csv file, readable by
+    the Gateway and MultiDayGateway
+
+    Returns:
+        path of the csv file
+    """
+
+    import pandas as pd
+    from marketsimulator.gateway import session_file
+
+    path = session_file(data_path, ticker, date)
+    df = pd.DataFrame({col: messages[col] for col in COLUMNS})
+    df['ordtype'] = ORDTYPES[messages['ordtype']]
+    df['is_buy'] = df['is_buy'].where(df['ordtype'] == 'new')
+    df['timestamp'] = df['timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S.%f'
+                                                  ).str[:-3]
+    df.to_csv(path, sep=';', index=False)
+    return path
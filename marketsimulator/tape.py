@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time-indexed view of the trades of an Orderbook.
+
+Asking the trade arrays of the Orderbook for the volume traded between
+two times means a scan. TradeTape mirrors the trades (int64 nanosecond
+timestamps) with prefix sums of volume, turnover and count, plus the
+same cumulative values at the end of each fixed time bucket (1 second
+by default). It is synced
+incrementally from ob.trades before every query, so range volume, VWAP
+and last-n queries cost a searchsorted and O(1) arithmetic.
+
+Intervals are half-open: [t0, t1).
+
+    >>> tape = gtw.ob.tape
+    >>> tape.vwap(gtw.ob_time - timedelta(minutes=5), gtw.ob_time)
+    >>> tape.last_n(gtw.ob_time, 10)['price']
+    >>> tape.bucket_volume()  # volume curve of the session
+
+"""
+
+import numpy as np
+from marketsimulator.timestamps import NS, to_ns
+
+
+class TradeTape:
+    """ Prefix-sum index of the trades of an orderbook
+
+    Args:
+        ob (Orderbook): orderbook whose trades are indexed
+        bucket (float): seconds of each aggregation bucket
+    """
+
+    def __init__(self, ob, bucket=1.):
+        self.ob = ob
+        self.bucket_ns = int(bucket * NS)
+        self.reset()
+
+    def reset(self):
+        """ Drop the index, called when the orderbook trades are reset """
+
+        self.n = 0
+        self._time = np.empty(0, dtype=np.int64)
+        # prefix sums, element i is the sum of the first i trades
+        self._cumvol = np.zeros(1)
+        self._cumturn = np.zeros(1)
+        # cumulative values at the end of each bucket since origin
+        self.origin = None
+        self.nbuckets = 0
+        self._bucket_cumvol = np.empty(0)
+        self._bucket_cumturn = np.empty(0)
+        self._bucket_count = np.empty(0, dtype=np.int64)
+
+    def sync(self):
+        """ Index the trades appended to the orderbook since last sync """
+
+        ob = self.ob
+        if ob.ntrds < self.n:
+            self.reset()
+        if ob.ntrds == self.n:
+            return
+        start, end = self.n, ob.ntrds
+        if end > len(self._time):
+            size = max(1024, 2 * end)
+            self._time = np.resize(self._time, size)
+            self._cumvol = np.resize(self._cumvol, size + 1)
+            self._cumturn = np.resize(self._cumturn, size + 1)
+        self._time[start:end] = ob.trades['timestamp'][start:end]
+        vol = ob.trades['vol'][start:end]
+        turn = vol * ob.trades['price'][start:end]
+        self._cumvol[start + 1:end + 1] = self._cumvol[start] + np.cumsum(vol)
+        self._cumturn[start + 1:end + 1] = (self._cumturn[start]
+                                            + np.cumsum(turn))
+        self.n = end
+        self._sync_buckets(start)
+
+    def _sync_buckets(self, start):
+        """ Recompute the buckets from the one holding trade start """
+
+        time = self._time[:self.n]
+        if self.origin is None:
+            self.origin = time[0] - time[0] % self.bucket_ns
+        first = min(max((time[start] - self.origin) // self.bucket_ns, 0),
+                    self.nbuckets)
+        last = (time[-1] - self.origin) // self.bucket_ns
+        nbuckets = max(last + 1, self.nbuckets)
+        if nbuckets > len(self._bucket_count):
+            size = max(1024, 2 * nbuckets)
+            self._bucket_cumvol = np.resize(self._bucket_cumvol, size)
+            self._bucket_cumturn = np.resize(self._bucket_cumturn, size)
+            self._bucket_count = np.resize(self._bucket_count, size)
+        ends = self.origin + np.arange(first + 1, nbuckets + 1) * self.bucket_ns
+        idx = np.searchsorted(time, ends, side='left')
+        self._bucket_cumvol[first:nbuckets] = self._cumvol[idx]
+        self._bucket_cumturn[first:nbuckets] = self._cumturn[idx]
+        self._bucket_count[first:nbuckets] = idx
+        self.nbuckets = nbuckets
+
+    @property
+    def nbytes(self):
+        """ Bytes of the index buffers """
+
+        return sum(array.nbytes for array in (
+            self._time, self._cumvol, self._cumturn, self._bucket_cumvol,
+            self._bucket_cumturn, self._bucket_count))
+
+    def _range(self, t0, t1):
+        """ Indexes [i0, i1) of the trades in [t0, t1) """
+
+        self.sync()
+        time = self._time[:self.n]
+        i0 = 0 if t0 is None else int(np.searchsorted(time, to_ns(t0)))
+        i1 = self.n if t1 is None else int(np.searchsorted(time, to_ns(t1)))
+        return i0, max(i0, i1)
+
+    def volume(self, t0=None, t1=None):
+        """ Volume traded in [t0, t1). None means open ended """
+
+        i0, i1 = self._range(t0, t1)
+        return self._cumvol[i1] - self._cumvol[i0]
+
+    def turnover(self, t0=None, t1=None):
+        """ Turnover (sum of price * vol) in [t0, t1) """
+
+        i0, i1 = self._range(t0, t1)
+        return self._cumturn[i1] - self._cumturn[i0]
+
+    def count(self, t0=None, t1=None):
+        """ Number of trades in [t0, t1) """
+
+        i0, i1 = self._range(t0, t1)
+        return int(i1 - i0)
+
+    def vwap(self, t0=None, t1=None):
+        """ Volume weighted average price in [t0, t1), nan if no trades """
+
+        i0, i1 = self._range(t0, t1)
+        vol = self._cumvol[i1] - self._cumvol[i0]
+        if vol > 0:
+            return (self._cumturn[i1] - self._cumturn[i0]) / vol
+        return np.nan
+
+    def last_n(self, t, n):
+        """ Last n trades before t
+
+        Returns:
+            dict with 'time' (int64 ns) and every STATS array except
+            'timestamp', oldest first
+        """
+
+        _, i1 = self._range(None, t)
+        i0 = max(i1 - n, 0)
+        trades = {stat: values[i0:i1] for stat, values in
+                  self.ob.trades.items() if stat != 'timestamp'}
+        trades['time'] = self._time[i0:i1]
+        return trades
+
+    def bucket_edges(self):
+        """ Start time (int64 ns) of each bucket since the first trade """
+
+        self.sync()
+        if self.origin is None:
+            return np.empty(0, dtype=np.int64)
+        return self.origin + np.arange(self.nbuckets) * self.bucket_ns
+
+    def _bucket_diff(self, name):
+
+        self.sync()
+        return np.diff(getattr(self, name)[:self.nbuckets], prepend=0)
+
+    def bucket_volume(self):
+        """ Volume of each bucket, aligned with bucket_edges """
+
+        return self._bucket_diff('_bucket_cumvol')
+
+    def bucket_turnover(self):
+        """ Turnover of each bucket, aligned with bucket_edges """
+
+        return self._bucket_diff('_bucket_cumturn')
+
+    def bucket_count(self):
+        """ Number of trades of each bucket, aligned with bucket_edges """
+
+        return self._bucket_diff('_bucket_count')
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time representation of the engine.
+
+Every timestamp inside the engine (orders, trade arrays, Gateway clocks
+and queues) is an int64 number of nanoseconds since epoch, so time
+checks are integer compares and trade history is numeric. datetime,
+pandas Timestamp and datetime64 values are accepted at the API edge
+and converted with to_ns; times are returned as datetime64[ns].
+
+    >>> to_ns(datetime(2019, 5, 23, 9))
+    1558602000000000000
+    >>> to_datetime64(gtw.ob_ns)
+    numpy.datetime64('2019-05-23T09:00:00.000000000')
+
+"""
+
+from datetime import datetime
+import numpy as np
+
+NS = 1_000_000_000
+
+
+def to_ns(timestamp):
+    """ datetime, pandas Timestamp, datetime64 or int nanoseconds to
+    int64 nanoseconds since epoch
+    """
+
+    if isinstance(timestamp, (int, np.integer)):
+        return int(timestamp)
+    return int(np.datetime64(timestamp, 'ns').astype(np.int64))
+
+
+def delta_ns(delta):
+    """ timedelta, pandas Timedelta, timedelta64 or int nanoseconds to
+    int nanoseconds
+    """
+
+    # timedelta64 is an np.integer subclass
+    if (isinstance(delta, (int, np.integer))
+            and not isinstance(delta, np.timedelta64)):
+        return int(delta)
+    return int(np.timedelta64(delta, 'ns').astype(np.int64))
+
+
+def seconds_ns(seconds):
+    """ Seconds (float) to int nanoseconds """
+
+    return int(round(seconds * NS))
+
+
+def to_datetime64(ns):
+    """ int nanoseconds (scalar or array) to datetime64[ns] """
+
+    if isinstance(ns, np.ndarray):
+        return ns.astype(np.int64).view('datetime64[ns]')
+    return np.datetime64(int(ns), 'ns')
+
+
+def to_datetime(ns):
+    """ int nanoseconds to datetime (microsecond resolution) """
+
+    return np.datetime64(int(ns), 'ns').astype('datetime64[us]').astype(
+        datetime)
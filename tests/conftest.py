@@ -1,6 +1,8 @@
 from collections import namedtuple
+from datetime import date
 import pytest
 from marketsimulator.orderbook import Orderbook
+from marketsimulator.gateway import Gateway
 
 @pytest.fixture
 def bid1():
@@ -90,3 +92,9 @@ def full_orderbook(bid_orderbook, ask_lmt_orders):
     for order in ask_lmt_orders:
         orderbook.send(*order)
     return orderbook
+
+@pytest.fixture()
+def gateway():
+    # shipped historical session in data/historic_orders
+    return Gateway(ticker='ana', date=date(2019, 5, 23),
+                   start_h=9, end_h=10, latency=20_000)
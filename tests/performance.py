@@ -28,7 +28,7 @@ gtw = Gateway(ticker='san',
 num_ords = len(gtw.hist_orders)
 
 t = time.time()
-while(gtw.ob_time < gtw.end_time):
+while(gtw.ob_ns < gtw.end_ns):
     gtw.tick()
 print(f'Time to process the whole real trading session \n \
         with {num_ords} real orders: {time.time()-t}')
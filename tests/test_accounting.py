@@ -0,0 +1,120 @@
+import numpy as np
+from marketsimulator.accounting import Position
+from marketsimulator.orderbook import Orderbook
+
+
+class TestPosition:
+
+    def test_average_cost_and_realized(self):
+        pos = Position()
+        pos.on_fill(True, 100, 10.)
+        pos.on_fill(True, 100, 11.)
+        assert pos.inventory == 200 and pos.avg_px == 10.5
+        pos.on_fill(False, 50, 12.)
+        assert pos.inventory == 150 and pos.avg_px == 10.5
+        assert pos.realized == 75.
+        assert pos.unrealized(11.) == 75.
+        assert pos.pnl(11.) == 150.
+
+    def test_flip_and_flat(self):
+        pos = Position()
+        pos.on_fill(True, 100, 10.)
+        pos.on_fill(False, 300, 9.)
+        assert pos.inventory == -200 and pos.avg_px == 9.
+        assert pos.realized == -100.
+        pos.on_fill(True, 200, 8.)
+        assert pos.inventory == 0 and pos.avg_px == 0.
+        assert pos.realized == 100.
+        assert pos.unrealized(50.) == 0.
+
+    def test_fees_and_shortfall(self):
+        pos = Position(maker_fee=-0.0001, taker_fee=0.0003)
+        pos.on_fill(True, 100, 10., is_maker=False, arrival_px=9.99)
+        pos.on_fill(False, 100, 10.02, is_maker=True, arrival_px=10.)
+        assert np.isclose(pos.fees, 0.3 - 0.1002)
+        assert np.isclose(pos.shortfall, 1. - 2.)
+        assert np.isclose(pos.pnl(10.), 2. - pos.fees)
+
+
+class TestOrderbookPositions:
+
+    def test_own_fills_update_positions(self, full_orderbook):
+        ob = full_orderbook
+        ob.taker_fee = ob.maker_fee = 0.001
+        ob.positions.clear()
+        # arrival mid is 0.25, sweeps 600 @ 0.3 and 100 @ 0.3
+        ob.send(is_buy=True, qty=700, price=0.3, uid=-1, is_mine=True)
+        pos = ob.position()
+        assert pos.inventory == 700
+        assert pos.avg_px == 0.3
+        assert np.isclose(pos.shortfall, 700 * 0.05)
+        # passive sell hit by a historical buy
+        ob.set_account(-2, 'mm')
+        ob.send(is_buy=False, qty=100, price=0.25, uid=-2, is_mine=True)
+        ob.send(is_buy=True, qty=100, price=0.25, uid=20)
+        mm = ob.position('mm')
+        assert mm.inventory == -100 and mm.n_fills == 1
+        assert pos.n_fills == 2
+        assert np.isclose(pos.fees, 0.001 * 700 * 0.3)
+        assert ob.mark_price() == (0.2 + 0.3) / 2
+        assert np.isclose(ob.pnl(), 700 * (0.25 - 0.3) - pos.fees)
+        # positions agree with my_trades
+        assert pos.buy_vol + mm.sell_vol == ob.my_trades_vol.sum()
+
+    def test_auction_fills(self):
+        ob = Orderbook('band6stock')
+        ob.start_auction()
+        ob.send(is_buy=True, qty=100, price=10., uid=-1, is_mine=True)
+        ob.send(is_buy=False, qty=60, price=9.9, uid=1)
+        ob.send(is_buy=False, qty=40, price=9.95, uid=-2, is_mine=True)
+        ob.set_account(-2, 'other')
+        ob.uncross()
+        assert ob.position().inventory == 100
+        assert ob.position('other').inventory == -40
+        assert ob.position('other').realized == 0
+
+    def test_cross_account_fill(self, full_orderbook):
+        ob = full_orderbook
+        ob.positions.clear()
+        ob.set_account(-1, 'mm')
+        ob.set_account(-2, 'taker')
+        ob.send(is_buy=False, qty=100, price=0.25, uid=-1, is_mine=True)
+        ob.send(is_buy=True, qty=100, price=0.25, uid=-2, is_mine=True)
+        mm, taker = ob.position('mm'), ob.position('taker')
+        assert mm.inventory == -100 and mm.sell_vol == 100
+        assert taker.inventory == 100 and taker.buy_vol == 100
+        assert mm.inventory + taker.inventory == 0
+        # one row per own order in my_trades
+        assert sorted(ob.my_trades['my_uid'][:ob.my_ntrds]) == [-2, -1]
+        assert ob.my_cumvol == 200
+
+    def test_terminal_orders_are_forgotten(self, full_orderbook):
+        ob = full_orderbook
+        ob.set_account(-1, 'mm')
+        ob.send(is_buy=False, qty=100, price=0.25, uid=-1, is_mine=True)
+        ob.send(is_buy=True, qty=50, price=0.19, uid=-2, is_mine=True)
+        ob.send(is_buy=True, qty=100, price=0.3, uid=-3, is_mine=True)
+        # -3 filled against -1, -2 still resting
+        assert set(ob._arrival_px) == {-2}
+        assert ob._accounts == {}
+        ob.cancel(-2)
+        assert ob._arrival_px == {}
+        assert ob.position('mm').inventory == -100
+
+    def test_reset(self, full_orderbook):
+        full_orderbook.send(is_buy=True, qty=100, price=0.3, uid=-1,
+                            is_mine=True)
+        full_orderbook.reset_ob(reset_all=False)
+        assert full_orderbook.position().inventory == 0
+
+
+class TestGatewayAccounts:
+
+    def test_queue_with_account(self, gateway):
+        price = gateway.ob.get_new_price(gateway.ob.bask[0], 10)
+        uid = gateway.queue_my_new(True, 100, price, account='taker')
+        gateway.move_n_seconds(5)
+        filled = gateway.ob.get(uid)['cumqty']
+        assert filled > 0
+        assert gateway.ob.position('taker').inventory == filled
+        assert gateway.ob.position().inventory == 0
@@ -0,0 +1,77 @@
+from datetime import date
+import os
+import shutil
+import pytest
+from marketsimulator.checkpoint import build_checkpoints, load_checkpoints
+from marketsimulator.gateway import Gateway
+
+DATA_PATH = os.path.join(os.path.dirname(__file__),
+                         '../data/historic_orders')
+SESSION = date(2019, 5, 23)
+
+
+@pytest.fixture()
+def data_path(tmp_path):
+    shutil.copy(f'{DATA_PATH}/orders-ana-2019-5-23.csv', tmp_path)
+    return str(tmp_path)
+
+
+def book(gtw):
+    return [(order.uid, order.leavesqty, order.price)
+            for is_buy in (True, False)
+            for order in gtw.ob.resting_orders(is_buy)]
+
+
+class TestCheckpoints:
+
+    def test_build(self, data_path):
+        path = build_checkpoints('ana', SESSION, data_path=data_path,
+                                 every_minutes=30)
+        assert path.endswith('orders-ana-2019-5-23.ckpt.npz')
+        checkpoints = load_checkpoints(data_path, 'ana', SESSION)
+        # one per half hour of the session plus the opening book
+        assert 17 <= len(checkpoints) <= 19
+        assert (checkpoints.idx[1:] > checkpoints.idx[:-1]).all()
+        by_messages = build_checkpoints('ana', SESSION, data_path=data_path,
+                                        every_minutes=None,
+                                        every_messages=5000)
+        assert len(load_checkpoints(data_path, 'ana', SESSION)) == 6
+        assert by_messages == path
+
+    @pytest.mark.parametrize('start_h', [9, 12.25, 15])
+    def test_restored_book_matches_full_replay(self, data_path, start_h):
+        build_checkpoints('ana', SESSION, data_path=data_path,
+                          every_minutes=10)
+        fast = Gateway(ticker='ana', date=SESSION, start_h=start_h,
+                       data_path=data_path)
+        full = Gateway(ticker='ana', date=SESSION, start_h=start_h,
+                       data_path=data_path, checkpoints=False)
+        assert fast.ob_idx == full.ob_idx
+        assert fast.ob_time == full.ob_time
+        assert book(fast) == book(full)
+        assert fast.ob.last_px == full.ob.last_px
+
+        uid = fast.queue_my_new(True, 500, fast.ob.bbid[0])
+        full.queue_my_new(True, 500, full.ob.bbid[0])
+        fast.move_n_seconds(1200)
+        full.move_n_seconds(1200)
+        assert book(fast) == book(full)
+        assert (fast.ob.trades_px == full.ob.trades_px).all()
+        assert fast.ord_status(uid) == full.ord_status(uid)
+
+    def test_stale_checkpoints_ignored(self, data_path):
+        build_checkpoints('ana', SESSION, data_path=data_path)
+        checkpoints = load_checkpoints(data_path, 'ana', SESSION)
+        full = Gateway(ticker='ana', date=SESSION, start_h=15,
+                       data_path=data_path, checkpoints=False)
+        # session file changed after the checkpoints were built
+        csv = f'{data_path}/orders-ana-2019-5-23.csv'
+        with open(csv) as f:
+            lines = f.readlines()
+        with open(csv, 'w') as f:
+            f.writelines(lines[:-1])
+        assert checkpoints.nord == len(lines) - 1
+        gtw = Gateway(ticker='ana', date=SESSION, start_h=15,
+                      data_path=data_path)
+        assert gtw.ob_idx == full.ob_idx
+        assert book(gtw) == book(full)
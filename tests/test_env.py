@@ -0,0 +1,74 @@
+from datetime import date
+import pytest
+from marketsimulator.env import ExecutionEnv, VecEnv, WAIT, JOIN, TAKE
+
+ENV_KWARGS = dict(ticker='ana', date=date(2019, 5, 23), start_h=10,
+                  horizon=30, target_qty=300, child_qty=100)
+
+
+@pytest.fixture(scope='module')
+def env():
+    return ExecutionEnv(**ENV_KWARGS)
+
+
+class TestExecutionEnv:
+
+    def test_warm_reset_is_repeatable(self, env):
+        first = env.reset()
+        assert first.shape == (env.obs_size,)
+        for _ in range(5):
+            env.step(TAKE)
+        assert env.filled > 0
+        again = env.reset()
+        assert (again == first).all()
+        assert env.filled == 0 and env.gtw.ob.my_ntrds == 0
+
+    def test_take_until_filled(self, env):
+        env.reset()
+        done = False
+        total = 0.
+        while not done:
+            obs, reward, done, info = env.step(TAKE)
+            total += reward
+        assert info['filled'] >= env.target_qty
+        assert obs[-2] >= 1
+        # buying at the ask costs at least half the spread
+        assert total < 0
+
+    def test_wait_until_horizon(self, env):
+        env.reset()
+        steps = 0
+        done = False
+        while not done:
+            obs, reward, done, info = env.step(WAIT)
+            steps += 1
+        assert steps == 30
+        assert obs[-1] == 0
+        assert reward == -env.penalty_bps
+
+    def test_join_keeps_one_resting_order(self, env):
+        env.reset()
+        env.step(JOIN)
+        env.step(JOIN)
+        resting = [uid for uid in env.my_uids
+                   if env.gtw.ob._orders[uid].active]
+        assert len(resting) <= 1
+        with pytest.raises(ValueError):
+            env.step(7)
+
+
+class TestVecEnv:
+
+    @pytest.mark.parametrize('n_workers', [0, 2])
+    def test_step_and_autoreset(self, n_workers):
+        kwargs = [dict(ENV_KWARGS, horizon=h) for h in (3, 5, 7)]
+        with VecEnv(kwargs, n_workers=n_workers) as venv:
+            obs = venv.reset()
+            assert obs.shape == (3, venv.obs_size)
+            for _ in range(3):
+                obs, rewards, dones, infos = venv.step([WAIT, WAIT, WAIT])
+            assert obs.shape == (3, venv.obs_size)
+            assert dones.tolist() == [True, False, False]
+            assert 'terminal_observation' in infos[0]
+            # the first env was reset in the same step
+            assert obs[0, -1] == 1
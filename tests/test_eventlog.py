@@ -0,0 +1,67 @@
+from datetime import date, datetime
+import glob
+import numpy as np
+import pytest
+from marketsimulator import eventlog
+from marketsimulator.eventlog import read_event_log
+from marketsimulator.gateway import Gateway
+from marketsimulator.orderbook import Orderbook
+
+
+class TestEventLog:
+
+    def test_orderbook_events(self, tmp_path):
+        path = str(tmp_path / 'ob')
+        ob = Orderbook('band6stock')
+        ob.start_event_log(path, chunk_size=3)
+        t0 = datetime(2019, 5, 23, 9)
+        ob.send(is_buy=True, qty=100, price=10.002, uid=1, timestamp=t0)
+        ob.send(is_buy=False, qty=50, price=10.004, uid=2, timestamp=t0)
+        ob.modif(uid=1, qty_down=20)
+        ob.amend(uid=2, new_price=10.006, timestamp=t0)
+        ob.send(is_buy=False, qty=30, price=0., uid=3, timestamp=t0)
+        ob.cancel(uid=1)
+        ob.send(is_buy=True, qty=10, price=np.inf, uid=4, timestamp=t0)
+        ob.stop_event_log()
+        assert len(glob.glob(f'{path}-*.npz')) == 3
+
+        events = read_event_log(path)
+        kinds = [eventlog.EVENT_KINDS[k] for k in events['kind']]
+        assert kinds == ['add', 'add', 'modif', 'amend', 'add', 'exec',
+                         'cancel', 'add', 'exec']
+        assert list(events['uid']) == [1, 2, 1, 2, 3, 1, 1, 4, 2]
+        assert events['other_uid'][5] == 3
+        assert list(events['qty']) == [100, 50, 20, 50, 30, 30, 50, 10, 10]
+        # off-ladder prices are kept exactly
+        assert list(events['price']) == [10.002, 10.004, 10.002, 10.006,
+                                         0., 10.002, 10.002, np.inf, 10.006]
+        assert (events['timestamp'] == np.datetime64(t0, 'ns')).all()
+
+    def test_gateway_log_matches_trades(self, tmp_path):
+        path = str(tmp_path / 'gtw')
+        gtw = Gateway(ticker='ana', date=date(2019, 5, 23), start_h=9,
+                      end_h=10, event_log=path)
+        gtw.move_n_seconds(1200)
+        gtw.ob.stop_event_log()
+        events = read_event_log(path)
+        execs = events['kind'] == eventlog.EXEC
+        assert execs.any()
+        assert events['qty'][execs].sum() == gtw.ob.cumvol
+        assert np.isclose((events['qty'] * events['price'])[execs].sum(),
+                          gtw.ob.cumturn)
+        assert (np.diff(events['timestamp'].astype(np.int64)) >= 0).all()
+        # every resting order was added
+        adds = set(events['uid'][events['kind'] == eventlog.ADD])
+        assert {order.uid for order in gtw.ob.resting_orders(True)} <= adds
+
+    def test_missing_log(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            read_event_log(str(tmp_path / 'none'))
+
+    def test_path_with_glob_characters(self, tmp_path):
+        path = str(tmp_path / 'run[1]*')
+        ob = Orderbook('band6stock')
+        ob.start_event_log(path)
+        ob.send(is_buy=True, qty=100, price=10., uid=1)
+        ob.stop_event_log()
+        assert list(read_event_log(path)['uid']) == [1]
@@ -0,0 +1,39 @@
+import numpy as np
+from marketsimulator.features import FeatureEngine
+
+
+class TestFeatureEngine:
+
+    def test_touch_features_match_orderbook(self, gateway):
+        fe = gateway.attach(FeatureEngine(depths=(1, 3)))
+        gateway.move_n_seconds(1800)
+        assert gateway.ob.ntrds > 0
+        bpx, bvol = gateway.ob.bbid
+        apx, avol = gateway.ob.bask
+        assert fe['mid'] == (bpx + apx) / 2
+        assert fe['spread'] == apx - bpx
+        assert np.isclose(fe['microprice'],
+                          (bpx * avol + apx * bvol) / (bvol + avol))
+        assert np.isclose(fe['obi_1'], (bvol - avol) / (bvol + avol))
+        bvol3, _ = gateway.ob.top_bids_cumvol(3)
+        avol3, _ = gateway.ob.top_asks_cumvol(3)
+        assert np.isclose(fe['obi_3'], (bvol3 - avol3) / (bvol3 + avol3))
+        assert -1 <= fe['tsp'] <= 1
+
+    def test_history_records_every_update(self, gateway):
+        fe = gateway.attach(FeatureEngine(depths=(1,), record=True))
+        gateway.move_n_seconds(300)
+        hist = fe.history()
+        assert len(hist['time']) == fe.n_updates
+        assert hist['spread'][-1] == fe['spread']
+        assert (np.diff(hist['time']) >= np.timedelta64(0, 's')).all()
+
+    def test_ofi_sign_on_new_best_bid(self, gateway):
+        fe = gateway.attach(FeatureEngine(depths=(1,), halflife=1e6))
+        gateway.move_n_seconds(1)
+        ofi = fe['ofi']
+        bpx, bvol = gateway.ob.bbid
+        gateway.ob.send(is_buy=True, qty=100,
+                        price=gateway.ob.get_new_price(bpx, 1), uid=10**9)
+        fe.update(gateway.ob, gateway.ob_time)
+        assert np.isclose(fe['ofi'] - ofi, 100)
@@ -0,0 +1,92 @@
+from datetime import date
+import numpy as np
+from marketsimulator.gateway import Gateway
+
+
+class TestGateway:
+
+    def test_pegged_order_is_repriced_under_same_uid(self, gateway):
+        # three ticks behind the best bid, so it keeps resting
+        uid = gateway.queue_my_peg(is_buy=True, qty=1, offset=-3)
+        gateway.move_n_seconds(1)
+        first = gateway.ord_status(uid)
+        gateway.move_n_seconds(1200)
+        order = gateway.ord_status(uid)
+        assert order['active']
+        assert order['price'] != first['price']
+        assert order['timestamp'] > first['timestamp']
+        # let the repricing in flight, if any, reach the orderbook
+        for _ in range(1000):
+            if uid not in gateway._reprice_pending:
+                break
+            gateway.tick()
+        assert uid not in gateway._reprice_pending
+        order = gateway.ord_status(uid)
+        assert order['price'] == gateway.ob.peg_price(
+            True, offset=-3, order=gateway.ob._orders[uid])
+        assert [u for u in gateway.ob._orders if u < 0] == [uid]
+
+    def test_queue_my_amend_single_message(self, gateway):
+        bid = gateway.ob.bbid[0]
+        uid = gateway.queue_my_new(is_buy=True, qty=10,
+                                   price=gateway.ob.get_new_price(bid, -5))
+        gateway.move_n_seconds(1)
+        new_price = gateway.ob.get_new_price(bid, -6)
+        gateway.queue_my_amend(uid, new_price=new_price, new_qty=20)
+        assert gateway.vol_in_queue == 10
+        gateway.move_n_seconds(1)
+        order = gateway.ord_status(uid)
+        assert (order['price'], order['leavesqty']) == (new_price, 20)
+        assert gateway.vol_in_queue == 0
+
+    def test_nanosecond_timestamps(self, gateway):
+        gateway.move_n_seconds(600)
+        ob = gateway.ob
+        assert ob.trades['timestamp'].dtype == np.int64
+        assert ob.trades_time.dtype == 'datetime64[ns]'
+        assert gateway.ob_time == np.datetime64(gateway.ob_ns, 'ns')
+        # latency below one microsecond is kept
+        gateway.latency = 0.5
+        uid = gateway.queue_my_new(is_buy=True, qty=1,
+                                   price=ob.get_new_price(ob.bbid[0], -5))
+        sent_at = gateway.ob_ns
+        gateway.move_delta(np.timedelta64(1, 's'))
+        assert gateway.ob._orders[uid].timestamp == sent_at + 500
+        assert gateway.ord_status(uid)['timestamp'] == (
+            np.datetime64(sent_at + 500, 'ns'))
+
+    def test_pooled_replay_matches(self, gateway):
+        pooled = Gateway(ticker='ana', date=date(2019, 5, 23), start_h=9,
+                         end_h=10, pool_size=1000)
+        shadow = pooled.ob.start_shadow()
+        vuid = shadow.send('s', True, 100, pooled.ob.bbid[0])
+        gateway.move_n_seconds(1800)
+        pooled.move_n_seconds(1800)
+        assert pooled.ob.ntrds == gateway.ob.ntrds
+        n = gateway.ob.ntrds
+        for field in ('timestamp', 'price', 'vol', 'buy_init'):
+            assert np.array_equal(pooled.ob.trades[field][:n],
+                                  gateway.ob.trades[field][:n])
+        assert pooled.ob.top_bids(10) == gateway.ob.top_bids(10)
+        assert pooled.ob.top_asks(10) == gateway.ob.top_asks(10)
+        # finished historical orders are forgotten and their instances
+        # reused
+        report = pooled.ob.memory_report()
+        assert report['terminal_orders'] == 0
+        assert 0 < report['pooled_orders'] <= 1000
+        assert shadow.get(vuid)['cumqty'] > 0
+
+    def test_own_messages_survive_steps_shorter_than_latency(self, gateway):
+        # 20 ms of latency, 10 ms steps
+        uid = gateway.queue_my_peg(is_buy=True, qty=1, offset=-5)
+        new_uid = gateway.queue_my_new(
+            is_buy=True, qty=1,
+            price=gateway.ob.get_new_price(gateway.ob.bbid[0], -10))
+        for _ in range(6000):
+            gateway.move_n_seconds(0.01)
+            queued = {message.uid for message in gateway.my_queue
+                      if message.ordtype == 'reprice'}
+            # a pending reprice is always on its way
+            assert gateway._reprice_pending <= queued
+        assert gateway.ord_status(new_uid)['active']
+        assert gateway.ord_status(uid)['active']
@@ -0,0 +1,68 @@
+from datetime import date
+import numpy as np
+import pytest
+from marketsimulator.gateway import Gateway
+from marketsimulator.invariants import (BookInvariantError, InvariantChecker,
+                                        check_book)
+from marketsimulator.orderbook import Orderbook
+
+
+class TestCheckBook:
+
+    def test_valid_book(self, full_orderbook):
+        full_orderbook.send(is_buy=True, qty=700, price=0.3, uid=11)
+        full_orderbook.cancel(uid=1)
+        assert check_book(full_orderbook) == 8
+
+    def test_corrupted_counters(self, full_orderbook):
+        full_orderbook._bids.best.enq_vol += 1
+        with pytest.raises(BookInvariantError, match='counters'):
+            check_book(full_orderbook)
+
+    def test_broken_link(self, full_orderbook):
+        level = full_orderbook._asks.best
+        level.append(full_orderbook._orders[2])
+        with pytest.raises(BookInvariantError):
+            check_book(full_orderbook)
+
+    def test_crossed_book(self, full_orderbook):
+        asks = full_orderbook._asks
+        level = asks.book.pop(asks.best.price)
+        level.price = full_orderbook.bbid[0]
+        order = level.head
+        while order is not None:
+            order.price = level.price
+            order = order.next
+        asks.book[level.price] = level
+        with pytest.raises(BookInvariantError, match='Crossed'):
+            check_book(full_orderbook)
+
+    def test_forgotten_resting_order(self, full_orderbook):
+        del full_orderbook._orders[1]
+        with pytest.raises(BookInvariantError, match='uid 1'):
+            check_book(full_orderbook)
+
+
+class TestCheckedMode:
+
+    def test_nan_price(self):
+        with pytest.raises(ValueError):
+            Orderbook('band6stock', checked=True).send(True, 10, np.nan, 1)
+
+    def test_gateway_checks(self):
+        gateway = Gateway(ticker='ana', date=date(2019, 5, 23), start_h=9,
+                          end_h=10, check_every=50)
+        gateway.move_n_seconds(600)
+        checker = gateway.invariant_checker
+        assert checker.n_checks == checker.n_messages // 50 > 0
+        gateway.ob._bids.best.head.leavesqty += 1
+        with pytest.raises(BookInvariantError):
+            checker.check(gateway.ob)
+
+    def test_fast_mode_has_no_checker(self, gateway):
+        assert gateway.invariant_checker is None
+        assert not gateway.ob.checked
+
+    def test_every_must_be_positive(self):
+        with pytest.raises(ValueError):
+            InvariantChecker(0)
@@ -0,0 +1,89 @@
+from datetime import date
+import numpy as np
+from marketsimulator.gateway import Gateway
+from marketsimulator.journal import (read_journal, diff_journals,
+                                     NEW, CANCEL, FILL)
+
+
+def run_strategy(gtw):
+    """ Join the best bid, cancel it after a while and then hit the ask """
+
+    gtw.move_n_seconds(10)
+    uid = gtw.queue_my_new(is_buy=True, qty=50, price=gtw.ob.bbid[0])
+    gtw.move_n_seconds(60)
+    gtw.queue_my_cancel(uid)
+    gtw.move_n_seconds(10)
+    gtw.queue_my_new(is_buy=True, qty=100, price=gtw.ob.bask[0])
+    gtw.move_n_seconds(60)
+
+
+def run_pegged_strategy(gtw):
+    """ Rest a pegged bid while the market moves, then hit the ask """
+
+    gtw.move_n_seconds(10)
+    gtw.queue_my_peg(is_buy=True, qty=100, offset=-1)
+    gtw.move_n_seconds(900)
+    gtw.queue_my_new(is_buy=True, qty=100, price=gtw.ob.bask[0])
+    gtw.move_n_seconds(600)
+
+
+class TestJournal:
+
+    def test_records_messages_and_fills(self, tmp_path):
+        path = str(tmp_path / 'run.jrnl')
+        gtw = Gateway(ticker='ana', date=date(2019, 5, 23), end_h=10,
+                      journal=path)
+        run_strategy(gtw)
+        gtw.journal.close()
+        records = read_journal(path)
+        assert list(records['kind'][:3]) == [NEW, CANCEL, NEW]
+        fills = records[records['kind'] == FILL]
+        assert len(fills) > 0
+        assert fills['qty'].sum() == gtw.ob.my_cumvol
+        np.testing.assert_array_equal(fills['price'], gtw.ob.my_trades_px)
+
+    def test_replay_reproduces_journal(self, tmp_path):
+        recorded = str(tmp_path / 'run.jrnl')
+        replayed = str(tmp_path / 'replay.jrnl')
+        gtw = Gateway(ticker='ana', date=date(2019, 5, 23), end_h=10,
+                      journal=recorded)
+        run_strategy(gtw)
+        gtw.journal.close()
+
+        replay = Gateway(ticker='ana', date=date(2019, 5, 23), end_h=10,
+                         journal=replayed)
+        replay.replay_journal(recorded)
+        replay.move_until(gtw.ob_time)
+        replay.journal.close()
+        assert replay.ob.my_cumvol == gtw.ob.my_cumvol
+        assert diff_journals(recorded, replayed) is None
+
+    def test_replay_with_pegged_order(self, tmp_path):
+        recorded = str(tmp_path / 'run.jrnl')
+        replayed = str(tmp_path / 'replay.jrnl')
+        gtw = Gateway(ticker='ana', date=date(2019, 5, 23), end_h=10,
+                      journal=recorded)
+        run_pegged_strategy(gtw)
+        gtw.journal.close()
+        # the peg is partially filled after several repricings
+        assert 100 < gtw.ob.my_cumvol < 200
+
+        replay = Gateway(ticker='ana', date=date(2019, 5, 23), end_h=10,
+                         journal=replayed)
+        replay.replay_journal(recorded)
+        replay.move_until(gtw.ob_time)
+        replay.journal.close()
+        assert replay.ob.my_cumvol == gtw.ob.my_cumvol
+        assert diff_journals(recorded, replayed) is None
+
+    def test_diff_finds_first_difference(self, tmp_path):
+        paths = []
+        for qty in (50, 60):
+            path = str(tmp_path / f'{qty}.jrnl')
+            gtw = Gateway(ticker='ana', date=date(2019, 5, 23), end_h=10,
+                          journal=path)
+            gtw.queue_my_new(is_buy=True, qty=10, price=gtw.ob.bbid[0])
+            gtw.queue_my_new(is_buy=True, qty=qty, price=gtw.ob.bbid[0])
+            gtw.journal.close()
+            paths.append(path)
+        assert diff_journals(*paths) == 1
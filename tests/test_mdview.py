@@ -0,0 +1,60 @@
+from datetime import date
+import numpy as np
+import pytest
+from marketsimulator.gateway import Gateway
+
+
+class History:
+    """ Every state of the top of the book, to check the view against """
+
+    def __init__(self):
+        self.states = []
+
+    def on_message(self, gtw):
+        self.states.append((gtw.ob_ns, gtw.ob.bbid, gtw.ob.bask,
+                            gtw.ob.ntrds))
+
+    def as_of(self, ns):
+        past = [state for state in self.states if state[0] <= ns]
+        return past[-1]
+
+
+class TestDelayedMarketData:
+
+    def test_view_is_the_book_md_latency_ago(self):
+        gateway = Gateway(ticker='ana', date=date(2019, 5, 23), start_h=9,
+                          end_h=10, md_latency=2_000_000, md_depth=3)
+        history = gateway.attach(History())
+        md = gateway.md
+        gateway.move_n_seconds(60)
+        for _ in range(20):
+            gateway.move_n_seconds(90)
+            _, bbid, bask, ntrds = history.as_of(md.md_ns)
+            assert md.bbid == bbid
+            assert md.bask == bask
+            assert md.ntrds == ntrds
+            assert md.md_ns == gateway.ob_ns - 2_000_000_000
+        # only the changes of the last md_latency are kept
+        assert all(time > md.md_ns for time, *_ in list(md._ring)[1:])
+        assert len(md.top_asks(3)[0]) == 3
+        assert md.top_bids(1) == [[md.bbid[0]], [md.bbid[1]]]
+        trades = md.trades
+        assert len(trades['vol']) == md.ntrds > 0
+        assert (trades['timestamp'] <= md.md_ns).all()
+        assert md.last_px == trades['price'][-1]
+        with pytest.raises(ValueError):
+            md.top_bids(4)
+
+    def test_zero_latency_is_the_book(self):
+        gateway = Gateway(ticker='ana', date=date(2019, 5, 23), start_h=9,
+                          end_h=10, md_latency=0)
+        gateway.move_n_seconds(600)
+        assert gateway.md.bbid == gateway.ob.bbid
+        # same shape as the live book, a drop-in replacement
+        assert gateway.md.top_bids(5) == gateway.ob.top_bids(5)
+        assert gateway.md.top_asks(5) == gateway.ob.top_asks(5)
+        assert gateway.md.ntrds == gateway.ob.ntrds
+        assert gateway.md.md_time == np.datetime64(gateway.ob_ns, 'ns')
+
+    def test_no_view_by_default(self, gateway):
+        assert gateway.md is None
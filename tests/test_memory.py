@@ -0,0 +1,54 @@
+import numpy as np
+from marketsimulator.memory import MemorySampler, object_array_size
+
+
+class TestMemoryReport:
+
+    def test_orderbook_report(self, full_orderbook):
+        full_orderbook.send(is_buy=True, qty=700, price=0.3, uid=11)
+        full_orderbook.cancel(uid=1)
+        report = full_orderbook.memory_report()
+        # bid 11 and ask 6 filled, ask 7 partially filled, bid 1 cancelled
+        assert report['live_orders'] == 8
+        assert report['terminal_orders'] == 3
+        assert report['bid_levels'] == 3
+        assert report['ask_levels'] == 3
+        assert report['trades_used'] == 2
+        assert report['trades_capacity'] >= 2
+        assert report['orders_bytes'] > 0
+        assert report['total_bytes'] == sum(
+            value for key, value in report.items()
+            if key.endswith('_bytes') and key != 'total_bytes')
+
+    def test_gateway_report(self, gateway):
+        report = gateway.memory_report()
+        assert report['session_messages'] == gateway.ob_nord
+        assert report['session_bytes'] > gateway.hist_orders.nbytes
+        assert report['total_bytes'] > report['session_bytes']
+
+    def test_object_array_size_counts_shared_objects_once(self):
+        shared = np.array(['new'] * 100, dtype=object)
+        distinct = np.array([float(i) for i in range(100)], dtype=object)
+        assert object_array_size(shared) < object_array_size(distinct)
+
+
+class TestMemorySampler:
+
+    def test_periodic_samples(self, gateway):
+        sampler = gateway.attach(MemorySampler(interval=300))
+        gateway.move_n_seconds(1800)
+        hist = sampler.history()
+        assert 6 <= len(hist['time']) <= 7
+        assert (np.diff(hist['time']) > np.timedelta64(0, 's')).all()
+        assert (np.diff(hist['terminal_orders']) >= 0).all()
+        growth = sampler.growth()
+        assert growth['terminal_orders'] > 0
+        assert list(growth)[0] == 'total_bytes'
+
+    def test_growth_ranks_bytes_before_counts(self):
+        sampler = MemorySampler()
+        sampler.reports = [
+            {'live_orders': 0, 'trades_bytes': 0, 'orders_bytes': 0},
+            {'live_orders': 5000, 'trades_bytes': 800, 'orders_bytes': 1600}]
+        assert list(sampler.growth()) == ['orders_bytes', 'trades_bytes',
+                                          'live_orders']
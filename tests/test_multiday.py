@@ -0,0 +1,85 @@
+from datetime import date
+import os
+import pytest
+from marketsimulator.gateway import Gateway
+from marketsimulator.multiday import MultiDayGateway
+
+DATA_PATH = os.path.join(os.path.dirname(__file__),
+                         '../data/historic_orders')
+
+
+@pytest.fixture()
+def data_path(tmp_path):
+    # same historical session replayed on 2019-05-23 and 2019-05-24
+    with open(f'{DATA_PATH}/orders-ana-2019-5-23.csv') as f:
+        csv = f.read()
+    (tmp_path / 'orders-ana-2019-5-23.csv').write_text(csv)
+    (tmp_path / 'orders-ana-2019-5-24.csv').write_text(
+        csv.replace('2019-05-23', '2019-05-24'))
+    return str(tmp_path)
+
+
+class TestMultiDayGateway:
+
+    def test_skips_missing_sessions(self, data_path):
+        gtw = MultiDayGateway(ticker='ana', data_path=data_path,
+                              start_date=date(2019, 5, 22),
+                              end_date=date(2019, 5, 26))
+        assert gtw.dates == [date(2019, 5, 23), date(2019, 5, 24)]
+        gtw.close()
+
+    def test_replays_all_sessions_and_accumulates_stats(self, data_path):
+        gtw = MultiDayGateway(ticker='ana', data_path=data_path,
+                              start_date=date(2019, 5, 23),
+                              end_date=date(2019, 5, 24), end_h=10)
+        while not gtw.done:
+            gtw.tick()
+        assert gtw.date == date(2019, 5, 24)
+        assert len(gtw.session_stats) == 1
+
+        single = Gateway(ticker='ana', data_path=data_path,
+                         date=date(2019, 5, 24), end_h=10)
+        while single.ob_time < single.end_time:
+            single.tick()
+        assert gtw.ob.ntrds == single.ob.ntrds
+        assert gtw.total_stats['ntrds'] == 2 * single.ob.ntrds
+        assert gtw.total_stats['cumvol'] == 2 * single.ob.cumvol
+
+    def test_move_until_crosses_session_boundary(self, data_path):
+        gtw = MultiDayGateway(ticker='ana', data_path=data_path,
+                              start_date=date(2019, 5, 23),
+                              end_date=date(2019, 5, 24))
+        uid = gtw.queue_my_new(is_buy=True, qty=10, price=gtw.ob.bbid[0])
+        gtw.move_n_seconds(24 * 3600)
+        assert gtw.date == date(2019, 5, 24)
+        assert str(gtw.ob_time).startswith('2019-05-24T09:00')
+        # own orders do not survive the session
+        with pytest.raises(KeyError):
+            gtw.ord_status(uid)
+        assert gtw.queue_my_new(is_buy=True, qty=10,
+                                price=gtw.ob.bbid[0]) < uid
+
+    def test_position_is_held_overnight(self, data_path):
+        gtw = MultiDayGateway(ticker='ana', data_path=data_path,
+                              start_date=date(2019, 5, 23),
+                              end_date=date(2019, 5, 24), end_h=10)
+        price = gtw.ob.get_new_price(gtw.ob.bask[0], 10)
+        gtw.queue_my_new(is_buy=True, qty=100, price=price)
+        gtw.move_n_seconds(60)
+        bought = gtw.ob.position()
+        assert bought.inventory == 100
+        cost = bought.avg_px
+        gtw.move_n_seconds(24 * 3600)
+        assert gtw.date == date(2019, 5, 24)
+        position = gtw.ob.position()
+        assert position.inventory == 100
+        assert position.avg_px == cost
+        price = gtw.ob.get_new_price(gtw.ob.bbid[0], -10)
+        gtw.queue_my_new(is_buy=False, qty=100, price=price)
+        gtw.move_n_seconds(60)
+        position = gtw.ob.position()
+        assert position.inventory == 0
+        # the round trip spans both sessions
+        assert position.realized == pytest.approx(
+            position.sell_turn - position.buy_turn)
+        gtw.close()
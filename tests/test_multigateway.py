@@ -0,0 +1,67 @@
+from datetime import date
+import os
+import pandas as pd
+import pytest
+from marketsimulator.multigateway import MultiGateway
+
+DATA_PATH = os.path.join(os.path.dirname(__file__),
+                         '../data/historic_orders')
+
+
+class TimeLog:
+    """ Observer logging the time of every message of a book """
+
+    def __init__(self, log, ticker):
+        self.log = log
+        self.ticker = ticker
+
+    def on_message(self, gtw):
+        self.log.append((gtw.ob_time, self.ticker))
+
+
+@pytest.fixture()
+def data_path(tmp_path):
+    # a second ticker (same band as ana) with orders shifted 1.5 seconds
+    csv = pd.read_csv(f'{DATA_PATH}/orders-ana-2019-5-23.csv', sep=';',
+                      float_precision='round_trip')
+    csv.to_csv(tmp_path / 'orders-ana-2019-5-23.csv', sep=';', index=False)
+    csv['timestamp'] = (pd.to_datetime(csv['timestamp'])
+                        + pd.Timedelta(seconds=1.5))
+    csv.to_csv(tmp_path / 'orders-cie-2019-5-23.csv', sep=';', index=False)
+    return str(tmp_path)
+
+
+class TestMultiGateway:
+
+    def test_books_are_merged_in_time_order(self, data_path):
+        gtw = MultiGateway(tickers=['ana', 'cie'], date=date(2019, 5, 23),
+                           data_path=data_path, end_h=10)
+        log = []
+        for ticker, child in gtw.gateways.items():
+            child.attach(TimeLog(log, ticker))
+        gtw.move_n_seconds(300)
+        times = [t for t, _ in log]
+        assert times == sorted(times)
+        assert {ticker for _, ticker in log} == {'ana', 'cie'}
+        assert gtw.ob['ana'].bbid == gtw.ob['cie'].bbid
+
+    def test_own_orders_routed_with_venue_latency(self, data_path):
+        gtw = MultiGateway(tickers=['ana', 'cie'], date=date(2019, 5, 23),
+                           data_path=data_path, end_h=10,
+                           latency={'ana': 10_000, 'cie': 50_000})
+        gtw.move_n_seconds(5)
+        sent_at = gtw.ob_time
+        uid_ana = gtw.queue_my_new('ana', is_buy=True, qty=1,
+                                   price=gtw.ob['ana'].bbid[0])
+        uid_cie = gtw.queue_my_new('cie', is_buy=True, qty=1,
+                                   price=gtw.ob['cie'].bbid[0])
+        assert uid_cie < uid_ana < 0
+        gtw.move_n_seconds(1)
+        ana = gtw.ord_status(uid_ana)
+        cie = gtw.ord_status(uid_cie)
+        assert (pd.Timedelta(ana['timestamp'] - sent_at).total_seconds()
+                == 0.01)
+        assert (pd.Timedelta(cie['timestamp'] - sent_at).total_seconds()
+                == 0.05)
+        with pytest.raises(KeyError):
+            gtw.gateways['ana'].ord_status(uid_cie)
@@ -1,3 +1,4 @@
+from marketsimulator.invariants import check_book
 from marketsimulator.orderbook import Orderbook
 from collections import namedtuple
 import numpy as np
@@ -209,4 +210,322 @@ class TestOrderbook:
 
 
 
-        
\ No newline at end of file
+        
+
+class TestAuction:
+
+    def test_orders_are_collected_without_matching(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.start_auction()
+        orderbook.send(is_buy=True, qty=100, price=10.01, uid=1)
+        orderbook.send(is_buy=False, qty=100, price=10., uid=2)
+        assert orderbook.bbid is None and orderbook.bask is None
+        assert orderbook.ntrds == 0
+
+    def test_uncross_maximises_executable_volume(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.start_auction()
+        orderbook.send(is_buy=True, qty=300, price=10.02, uid=1)
+        orderbook.send(is_buy=True, qty=200, price=10.01, uid=2)
+        orderbook.send(is_buy=True, qty=100, price=10., uid=3)
+        orderbook.send(is_buy=False, qty=250, price=9.99, uid=4)
+        orderbook.send(is_buy=False, qty=200, price=10.01, uid=5)
+        orderbook.send(is_buy=False, qty=400, price=10.03, uid=6)
+        assert orderbook.uncross() == (10.01, 450)
+        assert orderbook.cumvol == 450
+        assert (orderbook.trades_px == 10.01).all()
+        # price-time priority on each side
+        assert orderbook.get(1)['leavesqty'] == 0
+        assert orderbook.get(2)['leavesqty'] == 50
+        assert orderbook.get(4)['leavesqty'] == 0
+        assert orderbook.get(5)['leavesqty'] == 0
+        # leftover orders rest in the book
+        assert orderbook.bbid == (10.01, 50)
+        assert orderbook.bask == (10.03, 400)
+        assert not orderbook.in_auction
+
+    def test_surplus_tie_break(self):
+        # same volume and surplus at 10 and 10.01, buy surplus => highest
+        orderbook = Orderbook('band6stock')
+        orderbook.start_auction()
+        orderbook.send(is_buy=True, qty=300, price=10.01, uid=1)
+        orderbook.send(is_buy=False, qty=200, price=10., uid=2)
+        price, volume, surplus = orderbook.auction_price()
+        assert (price, volume, surplus) == (10.01, 200, 100)
+
+    def test_cancelled_and_own_auction_orders(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.start_auction()
+        orderbook.send(is_buy=True, qty=100, price=10.01, uid=1)
+        orderbook.send(is_buy=True, qty=100, price=10.02, uid=-1,
+                       is_mine=True)
+        orderbook.send(is_buy=False, qty=150, price=10., uid=2)
+        orderbook.cancel(1)
+        assert orderbook.get(1)['cumqty'] == 0
+        assert orderbook.uncross() == (10., 100)
+        assert orderbook.my_cumvol == 100
+        assert orderbook.my_trades_px[0] == 10.
+        assert orderbook.bask == (10., 50)
+
+    def test_resting_orders_join_the_auction(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.send(is_buy=True, qty=100, price=10., uid=1)
+        orderbook.send(is_buy=False, qty=100, price=10.02, uid=2)
+        orderbook.start_auction()
+        assert orderbook.bbid is None and orderbook.bask is None
+        orderbook.send(is_buy=True, qty=50, price=10.05, uid=3)
+        orderbook.send(is_buy=False, qty=10, price=10.04, uid=4)
+        assert orderbook.uncross() == (10.02, 50)
+        # the resting ask has priority over the new, worse priced one
+        assert orderbook.get(2)['leavesqty'] == 50
+        assert orderbook.get(4)['leavesqty'] == 10
+        assert orderbook.bbid == (10., 100)
+        assert orderbook.bask == (10.02, 50)
+        assert orderbook.top_asks(2) == [[10.02, 10.04], [50, 10]]
+        check_book(orderbook)
+
+    def test_market_orders_do_not_rest(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.start_auction()
+        orderbook.send(is_buy=True, qty=500, price=np.inf, uid=1)
+        orderbook.send(is_buy=False, qty=200, price=10., uid=2)
+        assert orderbook.uncross() == (10., 200)
+        assert orderbook.bbid is None
+        assert orderbook.get(1)['cumqty'] == 200
+
+    def test_leftovers_enter_the_book_at_the_auction_time(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.start_auction()
+        orderbook.send(is_buy=True, qty=100, price=10.01, uid=1, timestamp=1)
+        orderbook.send(is_buy=False, qty=60, price=10., uid=2, timestamp=2)
+        orderbook.uncross(timestamp=100)
+        assert orderbook.get(1)['timestamp'] == np.datetime64(100, 'ns')
+        orderbook.send(is_buy=False, qty=40, price=10.01, uid=3,
+                       timestamp=200)
+        assert (np.diff(orderbook.trades['timestamp'][:orderbook.ntrds])
+                >= 0).all()
+
+    def test_amend_in_the_call_phase(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.start_auction()
+        orderbook.send(is_buy=True, qty=100, price=10., uid=1)
+        orderbook.send(is_buy=True, qty=100, price=10., uid=2)
+        orderbook.send(is_buy=False, qty=100, price=10., uid=3)
+        # uid 1 loses its priority to uid 2
+        orderbook.amend(1, new_qty=150)
+        assert orderbook.get(1)['leavesqty'] == 150
+        assert orderbook.uncross() == (10., 100)
+        assert orderbook.get(1)['leavesqty'] == 150
+        assert orderbook.get(2)['leavesqty'] == 0
+        assert orderbook.bbid == (10., 150)
+
+    def test_pegs_are_kept_through_the_auction(self, full_orderbook):
+        full_orderbook.send_pegged(is_buy=True, qty=50, uid=-1, offset=0)
+        full_orderbook.start_auction()
+        assert full_orderbook.pegs_to_reprice() == []
+        full_orderbook.reprice_pegged(-1)
+        full_orderbook.send(is_buy=True, qty=10, price=0.21, uid=20)
+        full_orderbook.uncross()
+        assert full_orderbook.pegs_to_reprice() == [-1]
+        full_orderbook.reprice_pegged(-1)
+        assert full_orderbook.get(-1)['price'] == 0.21
+
+
+class TestPegged:
+
+    def test_primary_peg_follows_best_bid(self, full_orderbook):
+        full_orderbook.send_pegged(is_buy=True, qty=50, uid=-1, offset=0)
+        assert full_orderbook.get(-1)['price'] == 0.2
+        full_orderbook.send(is_buy=True, qty=10, price=0.21, uid=20)
+        assert full_orderbook.pegs_to_reprice() == [-1]
+        full_orderbook.reprice_pegged(-1)
+        order = full_orderbook.get(-1)
+        assert order['price'] == 0.21 and order['active']
+        # joined the back of the queue, same uid
+        assert full_orderbook._bids.best.tail.uid == -1
+        assert full_orderbook.pegs_to_reprice() == []
+
+    def test_peg_limit_caps_price(self, full_orderbook):
+        full_orderbook.send_pegged(is_buy=True, qty=50, uid=-1, offset=2,
+                                   limit=0.2001)
+        assert full_orderbook.get(-1)['price'] == 0.2001
+
+    def test_market_peg_reprice_can_execute(self, full_orderbook):
+        # sell three ticks above the best bid
+        full_orderbook.send_pegged(is_buy=False, qty=50, uid=-1,
+                                   peg_type='market', offset=-3)
+        assert full_orderbook.get(-1)['price'] == 0.2003
+        full_orderbook.send(is_buy=True, qty=10, price=0.2001, uid=20)
+        full_orderbook.reprice_pegged(-1)
+        assert full_orderbook.get(-1)['price'] == 0.2004
+        # buy at the best ask
+        full_orderbook.send_pegged(is_buy=True, qty=5, uid=-2,
+                                   peg_type='market', offset=0)
+        assert full_orderbook.get(-2)['leavesqty'] == 0
+        assert full_orderbook.get(-1)['leavesqty'] == 45
+        # both own orders are filled
+        assert full_orderbook.my_cumvol == 10
+
+    def test_primary_peg_does_not_peg_off_itself(self, full_orderbook):
+        # one tick above the best bid, alone at its price
+        full_orderbook.send_pegged(is_buy=True, qty=50, uid=-1, offset=1)
+        assert full_orderbook.get(-1)['price'] == 0.2001
+        # static market: the peg stays put
+        assert full_orderbook.pegs_to_reprice() == []
+        full_orderbook.reprice_pegged(-1)
+        assert full_orderbook.get(-1)['price'] == 0.2001
+        # it follows the level it pegs off
+        full_orderbook.cancel(1)
+        full_orderbook.cancel(2)
+        assert full_orderbook.pegs_to_reprice() == [-1]
+        full_orderbook.reprice_pegged(-1)
+        assert full_orderbook.get(-1)['price'] == 0.1901
+
+    def test_cancelled_peg_is_forgotten(self, full_orderbook):
+        full_orderbook.send_pegged(is_buy=True, qty=50, uid=-1)
+        full_orderbook.cancel(-1)
+        full_orderbook.send(is_buy=True, qty=10, price=0.21, uid=20)
+        assert full_orderbook.pegs_to_reprice() == []
+
+
+class TestAmend:
+
+    def test_amend_price_keeps_uid_and_loses_priority(self, full_orderbook,
+                                                      bid1, bid3):
+        n_orders = len(full_orderbook._orders)
+        full_orderbook.amend(bid1.uid, new_price=bid3.price)
+        assert len(full_orderbook._orders) == n_orders
+        assert full_orderbook.get(bid1.uid)['price'] == bid3.price
+        assert full_orderbook._bids.book[bid3.price].tail.uid == bid1.uid
+        assert full_orderbook._bids.best.head.uid == 2
+
+    def test_amend_qty_down_keeps_priority(self, full_orderbook, bid1):
+        full_orderbook.amend(bid1.uid, new_qty=40)
+        assert full_orderbook._bids.best.head.uid == bid1.uid
+        assert full_orderbook.get(bid1.uid)['leavesqty'] == 40
+
+    def test_amend_qty_up_loses_priority(self, full_orderbook, bid1):
+        full_orderbook.amend(bid1.uid, new_qty=150)
+        assert full_orderbook._bids.best.tail.uid == bid1.uid
+        assert full_orderbook.get(bid1.uid)['leavesqty'] == 150
+
+    def test_aggressive_amend_executes(self, full_orderbook, bid1, ask1):
+        full_orderbook.amend(bid1.uid, new_price=ask1.price)
+        assert full_orderbook.get(bid1.uid)['leavesqty'] == 0
+        assert full_orderbook.trades_vol.sum() == bid1.qty
+
+    def test_amend_below_filled_qty_cancels(self, full_orderbook, ask1):
+        full_orderbook.send(is_buy=True, qty=100, price=ask1.price, uid=20)
+        full_orderbook.amend(ask1.uid, new_qty=100)
+        order = full_orderbook.get(ask1.uid)
+        assert not order['active'] and order['cumqty'] == 100
+
+
+def walk_position(orderbook, uid):
+    order = orderbook._orders[uid]
+    halfbook = orderbook._bids if order.is_buy else orderbook._asks
+    vol_ahead = n_ahead = 0
+    next_order = halfbook.book[order.price].head
+    while next_order is not order:
+        vol_ahead += next_order.leavesqty
+        n_ahead += 1
+        next_order = next_order.next
+    return vol_ahead, n_ahead
+
+
+def walk_level(level):
+    vol = count = 0
+    next_order = level.head
+    while next_order is not None:
+        vol += next_order.leavesqty
+        count += 1
+        next_order = next_order.next
+    return vol, count
+
+
+class TestQueuePosition:
+
+    def test_position_of_own_order(self, full_orderbook, bid1, bid2):
+        full_orderbook.send(is_buy=True, qty=50, price=0.2, uid=-1,
+                            is_mine=True)
+        assert full_orderbook.queue_position(-1) == (300, 2)
+        full_orderbook.cancel(bid1.uid)
+        assert full_orderbook.queue_position(-1) == (200, 1)
+        full_orderbook.modif(bid2.uid, qty_down=50)
+        assert full_orderbook.vol_ahead(-1) == 150
+        full_orderbook.send(is_buy=False, qty=170, price=0.2, uid=20)
+        assert full_orderbook.queue_position(-1) == (0, 0)
+        assert full_orderbook.get(-1)['leavesqty'] == 30
+        full_orderbook.send(is_buy=False, qty=30, price=0.2, uid=21)
+        assert full_orderbook.queue_position(-1) is None
+
+    def test_counters_match_queue_walk(self):
+        rng = np.random.RandomState(7)
+        orderbook = Orderbook('band6stock')
+        prices = [orderbook.get_new_price(9.99, i) for i in range(20)]
+        uids = []
+        for i in range(1, 3000):
+            action = rng.random_sample()
+            if action < 0.6 or not uids:
+                uid = -i if rng.random_sample() < 0.2 else i
+                is_buy = bool(rng.random_sample() < 0.5)
+                # mostly passive, some aggressive orders
+                price = prices[rng.randint(0, 12) if is_buy
+                               else rng.randint(8, 20)]
+                orderbook.send(is_buy=is_buy, qty=int(rng.randint(1, 200)),
+                               price=price, uid=uid, is_mine=uid < 0)
+                uids.append(uid)
+            else:
+                uid = uids[rng.randint(0, len(uids))]
+                if action < 0.75:
+                    orderbook.cancel(uid)
+                elif action < 0.9:
+                    orderbook.modif(uid, qty_down=int(rng.randint(1, 50)))
+                else:
+                    orderbook.amend(uid, new_price=prices[rng.randint(0, 20)],
+                                    new_qty=int(rng.randint(1, 300)))
+        for halfbook in (orderbook._bids, orderbook._asks):
+            for level in halfbook.book.values():
+                assert (level.vol, level.count) == walk_level(level)
+        own = [uid for uid in uids
+               if uid < 0 and orderbook.get(uid)['active']]
+        assert own
+        for uid in own:
+            assert orderbook.queue_position(uid) == walk_position(orderbook,
+                                                                  uid)
+
+
+class TestAggregateSweeps:
+
+    def sweep(self, aggregate):
+        orderbook = Orderbook('band6stock', aggregate_sweeps=aggregate)
+        for uid in range(1, 51):
+            orderbook.send(is_buy=False, qty=10, price=10., uid=uid)
+        orderbook.send(is_buy=False, qty=10, price=10.002, uid=51)
+        orderbook.send(is_buy=False, qty=10, price=10.002, uid=-1,
+                       is_mine=True)
+        orderbook.send(is_buy=False, qty=10, price=10.002, uid=52)
+        orderbook.send(is_buy=True, qty=520, price=10.004, uid=100)
+        return orderbook
+
+    def test_one_print_per_cleared_level(self):
+        orderbook = self.sweep(aggregate=True)
+        # one print for the first level, one per order for the level
+        # holding our order
+        assert orderbook.ntrds == 1 + 2
+        assert orderbook.trades_vol[0] == 500
+        assert np.isnan(orderbook.trades['pas_ord'][0])
+        assert orderbook.my_ntrds == 1
+        assert orderbook.get(-1)['leavesqty'] == 0
+        assert all(not orderbook.get(uid)['active'] for uid in range(1, 51))
+        assert orderbook.bask == (10.002, 10)
+
+    def test_same_book_and_volume_as_per_order_sweep(self):
+        aggregated = self.sweep(aggregate=True)
+        per_order = self.sweep(aggregate=False)
+        assert per_order.ntrds == 50 + 2
+        assert aggregated.cumvol == per_order.cumvol
+        assert aggregated.cumturn == per_order.cumturn
+        assert aggregated.my_ntrds == per_order.my_ntrds
+        assert aggregated.top_asks(5) == per_order.top_asks(5)
+        assert aggregated.last_px == per_order.last_px
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from marketsimulator.orderbook import Orderbook
+from marketsimulator.prices_idx import (get_band_array, price_ladder,
+                                        price_to_tick, shift_prices,
+                                        tick_to_price)
+
+
+class TestVectorizedTicks:
+
+    @pytest.mark.parametrize('ticker', ['band6stock', 'band5stock'])
+    def test_shift_matches_scalar(self, ticker):
+        orderbook = Orderbook(ticker)
+        band_prices, max_tick = get_band_array(orderbook.band)
+        rng = np.random.RandomState(0)
+        prices = np.concatenate([
+            band_prices[rng.randint(0, len(band_prices), 3000)],
+            band_prices[:3], band_prices[-3:],
+            band_prices[-1] + max_tick * np.arange(1, 4)])
+        n_moves = rng.randint(-50, 50, len(prices))
+        n_moves[-9:] = [-5, -1, 2, -1, 3, 30, -2, -10, 4]
+        scalar = [orderbook.get_new_price(price, int(n))
+                  for price, n in zip(prices, n_moves)]
+        vector = orderbook.get_new_prices(prices, n_moves)
+        assert (vector == np.array(scalar)).all()
+
+    def test_boundaries(self):
+        orderbook = Orderbook('band6stock')
+        prices = np.array([5., 10., 20., 100.])
+        assert (orderbook.get_new_prices(prices, -1)
+                == [4.9995, 9.999, 19.998, 99.99]).all()
+        assert (orderbook.get_new_prices(prices, 1)
+                == [5.001, 10.002, 20.005, 100.02]).all()
+        # moves below the first price stop there
+        assert orderbook.get_new_price(0.0001, -5) == 0.
+        assert orderbook.get_new_prices([0.0001], -5)[0] == 0.
+
+    def test_ticks_round_trip(self):
+        prices = np.array([0.2, 9.999, 10.002, 95.75])
+        ticks = price_to_tick(prices, 6)
+        assert (np.diff(ticks) > 0).all()
+        assert (tick_to_price(ticks, 6) == prices).all()
+        assert (tick_to_price(ticks + 1, 6)
+                == shift_prices(prices, 1, 6)).all()
+        with pytest.raises(ValueError):
+            price_to_tick([10.0001], 6)
+        with pytest.raises(ValueError):
+            shift_prices([10.0001], -1, 6)
+
+    def test_price_ladder(self):
+        ladder = price_ladder(10., 2, 2, 'band6')
+        assert list(ladder) == [9.998, 9.999, 10., 10.002, 10.004]
+
+    def test_market_impact_over_arrays(self):
+        orderbook = Orderbook('band6stock')
+        orderbook.market_impact = 3
+        prices = np.array([5., 10., 20.])
+        shifted = orderbook._affect_price_with_market_impact(prices)
+        assert list(shifted) == [orderbook._affect_price_with_market_impact(px)
+                                 for px in prices]
@@ -0,0 +1,53 @@
+import numpy as np
+from marketsimulator.recorder import BookRecorder, load_snapshots
+
+
+class TestBookRecorder:
+
+    def test_bbo_recorder_matches_top_of_book(self, gateway):
+        rec = gateway.attach(BookRecorder(nlevels=5, chunk_size=50))
+        gateway.move_n_seconds(600)
+        data = rec.to_arrays()
+        assert data['bids'].shape == (rec.n_samples, 5, 3)
+        assert rec.n_chunks >= 1
+        pbids, vbids = gateway.ob.top_bids(5)
+        pasks, vasks = gateway.ob.top_asks(5)
+        np.testing.assert_array_equal(data['bids'][-1, :, 0], pbids)
+        np.testing.assert_array_equal(data['bids'][-1, :, 1], vbids)
+        np.testing.assert_array_equal(data['asks'][-1, :, 0], pasks)
+        np.testing.assert_array_equal(data['asks'][-1, :, 1], vasks)
+        # consecutive samples always differ at the touch
+        touch = np.hstack([data['bids'][:, 0, :2], data['asks'][:, 0, :2]])
+        assert (np.diff(touch, axis=0) != 0).any(axis=1).all()
+
+    def test_interval_recorder_samples_once_per_interval(self, gateway):
+        rec = gateway.attach(BookRecorder(nlevels=3, interval=10))
+        gateway.move_n_seconds(600)
+        time = rec.to_arrays()['time']
+        buckets = (time - time[0]) // np.timedelta64(10, 's')
+        assert len(time) <= 61
+        assert (np.diff(buckets) > 0).all()
+
+    def test_chunks_written_to_disk(self, gateway, tmp_path):
+        prefix = str(tmp_path / 'ana')
+        rec = gateway.attach(BookRecorder(nlevels=2, chunk_size=10,
+                                          path=prefix))
+        gateway.move_n_seconds(300)
+        rec.close()
+        data = load_snapshots(prefix)
+        assert len(list(tmp_path.glob('ana-*.npz'))) == rec.n_chunks
+        assert len(data['time']) == rec.n_samples
+        assert (np.diff(data['time']) >= np.timedelta64(0, 's')).all()
+
+    def test_to_arrays_before_any_flush(self, gateway, tmp_path):
+        prefix = str(tmp_path / 'ana')
+        rec = gateway.attach(BookRecorder(nlevels=2, path=prefix))
+        gateway.move_n_seconds(60)
+        assert rec.n_chunks == 0
+        data = rec.to_arrays()
+        assert len(data['time']) == rec.n_samples > 0
+        assert data['bids'][-1, 0, 0] == gateway.ob.bbid[0]
+        rec.flush()
+        gateway.move_n_seconds(60)
+        # chunk on disk plus the samples in memory
+        assert len(rec.to_arrays()['time']) == rec.n_samples
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from marketsimulator.orderbook import Orderbook
+
+
+@pytest.fixture()
+def book():
+    ob = Orderbook('band6stock')
+    ob.send(is_buy=True, qty=100, price=10., uid=1)
+    ob.send(is_buy=True, qty=200, price=10., uid=2)
+    ob.send(is_buy=False, qty=100, price=10.01, uid=3)
+    return ob
+
+
+class TestShadowBook:
+
+    def test_queue_position_and_fills(self, book):
+        shadow = book.start_shadow()
+        back = shadow.send('back', True, 50, 10.)
+        assert shadow.get(back)['vol_ahead'] == 300
+        book.send(is_buy=True, qty=100, price=10., uid=4)
+        # a cancel ahead moves the shadow order up, one behind does not
+        book.cancel(2)
+        book.modif(4, 20)
+        assert shadow.get(back)['vol_ahead'] == 100
+        book.send(is_buy=False, qty=120, price=10., uid=5)
+        assert shadow.get(back)['cumqty'] == 20
+        # the real book and the market impact are untouched
+        assert book.bbid == (10., 60)
+        assert book.market_impact == 0
+        assert book.cumvol == 120
+
+    def test_level_emptied_and_trade_through(self, book):
+        shadow = book.start_shadow()
+        vuid = shadow.send('a', True, 150, 10.)
+        book.send(is_buy=False, qty=300, price=10., uid=5)
+        # the whole real level is executed, the shadow order is still
+        # last in the queue
+        assert shadow.get(vuid)['cumqty'] == 0
+        book.send(is_buy=True, qty=100, price=10., uid=6)
+        book.send(is_buy=False, qty=60, price=10., uid=7)
+        assert shadow.get(vuid)['cumqty'] == 60
+        # trades below the shadow bid fill it
+        book.send(is_buy=True, qty=100, price=9.99, uid=8)
+        book.send(is_buy=False, qty=200, price=9.99, uid=9)
+        assert not shadow.get(vuid)['active']
+        pos = shadow.position('a')
+        assert pos.inventory == 150
+        assert pos.avg_px == 10.
+        fills = shadow.fills('a')
+        assert list(fills['vol']) == [60, 40, 50]
+
+    def test_marketable_and_independent_strategies(self, book):
+        book.maker_fee = 0.001
+        shadow = book.start_shadow()
+        taker = shadow.send('taker', True, 150, 10.02)
+        # filled against the displayed ask, the rest rests at 10.02
+        assert shadow.get(taker)['cumqty'] == 100
+        assert shadow.position('taker').fees == 0
+        for i in range(10):
+            shadow.send(f's{i}', False, 100, 10.01)
+        book.send(is_buy=False, qty=100, price=10.02, uid=11)
+        book.send(is_buy=True, qty=150, price=10.02, uid=10)
+        # every variant sees the same 50 lots traded through
+        for i in range(10):
+            assert shadow.position(f's{i}').inventory == -50
+            assert np.isclose(shadow.position(f's{i}').fees,
+                              0.001 * 50 * 10.01)
+        assert book.bask == (10.02, 50)
+        shadow.cancel(taker)
+        assert not shadow.get(taker)['active']
+        book.reset_ob(reset_all=True)
+        assert not shadow.positions
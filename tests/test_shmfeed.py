@@ -0,0 +1,75 @@
+from datetime import date
+import multiprocessing as mp
+import os
+import numpy as np
+import pytest
+from marketsimulator.gateway import Gateway
+
+pytest.importorskip('multiprocessing.shared_memory')
+from marketsimulator.shmfeed import BOOK, TRADE, ShmPublisher, ShmReader
+
+
+def read_all(name, queue):
+    reader = ShmReader(name)
+    records = reader.poll()
+    queue.put((len(records), records['vol'][records['kind'] == TRADE].sum(),
+               reader.lost))
+    reader.close()
+
+
+class TestShmFeed:
+
+    def test_gateway_feed(self):
+        gateway = Gateway(ticker='ana', date=date(2019, 5, 23), start_h=9,
+                          end_h=10, md_feed=f'md-test-{os.getpid()}',
+                          md_depth=3)
+        with gateway.md_feed as pub:
+            reader = ShmReader(pub.name)
+            gateway.move_n_seconds(300)
+            records = reader.poll()
+            assert len(records) == pub.seq
+            assert (np.diff(records['seq']) == 1).all()
+            trades = records[records['kind'] == TRADE]
+            assert len(trades) == gateway.ob.ntrds
+            assert trades['vol'].sum() == gateway.ob.cumvol
+            last_book = records[records['kind'] == BOOK][-1]
+            assert last_book['bid_px'][0] == gateway.ob.bbid[0]
+            assert last_book['ask_vol'][0] == gateway.ob.bask[1]
+            assert len(reader.poll()) == 0
+
+            # another process reads the same block
+            queue = mp.get_context('spawn').Queue()
+            proc = mp.get_context('spawn').Process(target=read_all,
+                                                   args=(pub.name, queue))
+            proc.start()
+            n, vol, lost = queue.get(timeout=60)
+            proc.join()
+            assert n == len(records) and lost == 0
+            assert vol == gateway.ob.cumvol
+            reader.close()
+            gateway.detach(pub)
+
+    def test_overrun(self):
+        with ShmPublisher(depth=1, capacity=8) as pub:
+            reader = ShmReader(pub.name)
+            for i in range(5):
+                pub.publish_trade(i, 10., i, 1.)
+            assert list(reader.poll()['vol']) == [0, 1, 2, 3, 4]
+            for i in range(5, 25):
+                pub.publish_trade(i, 10., i, 1.)
+            records = reader.poll()
+            assert reader.lost == 13
+            assert list(records['vol']) == list(range(18, 25))
+            assert not reader.closed
+            reader.close()
+
+    def test_not_a_feed(self):
+        from multiprocessing import shared_memory
+        shm = shared_memory.SharedMemory(create=True, size=128)
+        try:
+            with pytest.raises(ValueError):
+                ShmReader(shm.name)
+        finally:
+            shm.close()
+            shm.unlink()
+
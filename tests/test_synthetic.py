@@ -0,0 +1,83 @@
+from datetime import date
+import numpy as np
+import pytest
+from marketsimulator.gateway import Gateway, load_session
+from marketsimulator.prices_idx import get_band_prices
+from marketsimulator.synthetic import (OrderFlowGenerator, hawkes_times,
+                                       poisson_times, save_session,
+                                       to_session, NEW, CANCEL)
+
+SESSION = date(2019, 5, 23)
+
+
+@pytest.fixture(scope='module')
+def messages():
+    gen = OrderFlowGenerator(price=10., rate=20, arrivals='hawkes', seed=7)
+    return gen.generate(SESSION, start_h=9, end_h=10)
+
+
+class TestArrivals:
+
+    def test_poisson_rate(self):
+        rng = np.random.RandomState(0)
+        times = poisson_times(rng, 100, 1000)
+        assert abs(len(times) / 1000 - 100) < 2
+        assert (np.diff(times) >= 0).all()
+
+    def test_hawkes_stationary_rate_and_clustering(self):
+        rng = np.random.RandomState(0)
+        times = hawkes_times(rng, mu=30, alpha=3.5, beta=5, duration=2000)
+        # mu / (1 - alpha / beta)
+        assert abs(len(times) / 2000 - 100) < 10
+        counts = np.bincount(times.astype(int))
+        # overdispersed counts, unlike a Poisson process
+        assert counts.var() > 2 * counts.mean()
+        with pytest.raises(ValueError):
+            hawkes_times(rng, 1, 5, 5, 10)
+
+
+class TestOrderFlowGenerator:
+
+    def test_messages(self, messages):
+        assert (np.diff(messages['timestamp'].astype(np.int64)) >= 0).all()
+        new = messages[messages['ordtype'] == NEW]
+        cancel = messages[messages['ordtype'] == CANCEL]
+        assert len(np.unique(new['uid'])) == len(new)
+        assert np.isin(cancel['uid'], new['uid']).all()
+        # opening book, 10 levels per side
+        assert messages['is_buy'][:20].sum() == 10
+        assert len(np.unique(messages['price'][:20])) == 20
+        assert (new['qty'] % 10 == 0).all() and (new['qty'] > 0).all()
+        band_idxs, _, _ = get_band_prices('band6')
+        assert all(px in band_idxs for px in np.unique(new['price']))
+        # every cancel comes after its new order
+        where_new = dict(zip(new['uid'],
+                             np.flatnonzero(messages['ordtype'] == NEW)))
+        where = np.flatnonzero(messages['ordtype'] == CANCEL)
+        assert all(where_new[uid] < i for uid, i in
+                   zip(messages['uid'][where], where))
+
+    def test_seed_is_reproducible(self):
+        gen_a = OrderFlowGenerator(rate=5, seed=3)
+        gen_b = OrderFlowGenerator(rate=5, seed=3)
+        a = gen_a.generate(SESSION, end_h=9.5)
+        b = gen_b.generate(SESSION, end_h=9.5)
+        assert a.tobytes() == b.tobytes()
+
+    def test_gateway_replays_synthetic_session(self, messages):
+        gtw = Gateway(ticker='ana', date=SESSION, start_h=9, end_h=10,
+                      session=to_session(messages))
+        gtw.move_n_seconds(3600)
+        assert gtw.ob_idx == len(messages)
+        assert gtw.ob.ntrds > 0
+        assert gtw.ob.bbid[0] < gtw.ob.bask[0]
+
+    def test_save_session(self, messages, tmp_path):
+        save_session(messages, str(tmp_path), 'ana', SESSION)
+        hist_orders, col_idx = load_session(str(tmp_path), 'ana', SESSION)
+        session_orders, _ = to_session(messages)
+        assert hist_orders.shape == session_orders.shape
+        assert (hist_orders[:, col_idx['uid']]
+                == session_orders[:, col_idx['uid']]).all()
+        assert (hist_orders[:, col_idx['timestamp']]
+                == session_orders[:, col_idx['timestamp']]).all()
@@ -0,0 +1,66 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+
+
+def brute_force(ob, t0, t1):
+    time = pd.to_datetime(ob.trades_time)
+    mask = (time >= t0) & (time < t1)
+    vol = ob.trades_vol[mask]
+    px = ob.trades_px[mask]
+    return vol.sum(), np.dot(vol, px), mask.sum()
+
+
+class TestTradeTape:
+
+    def test_range_queries_match_scan(self, gateway):
+        tape = gateway.ob.tape
+        gateway.move_n_seconds(900)
+        # queries interleaved with new trades sync incrementally
+        assert tape.count() == gateway.ob.ntrds
+        gateway.move_n_seconds(900)
+        ob = gateway.ob
+        assert ob.ntrds > 10
+        start = pd.Timestamp(ob.trades_time[0])
+        for t0, t1 in [(start, gateway.ob_time),
+                       (start + timedelta(minutes=5),
+                        start + timedelta(minutes=17, seconds=3)),
+                       (pd.Timestamp(ob.trades_time[3]),
+                        pd.Timestamp(ob.trades_time[8]))]:
+            vol, turn, count = brute_force(ob, t0, t1)
+            assert tape.volume(t0, t1) == vol
+            assert np.isclose(tape.turnover(t0, t1), turn)
+            assert tape.count(t0, t1) == count
+            if vol:
+                assert np.isclose(tape.vwap(t0, t1), turn / vol)
+        assert np.isnan(tape.vwap(start, start))
+        assert tape.volume() == ob.cumvol
+
+    def test_last_n(self, gateway):
+        gateway.move_n_seconds(1800)
+        ob = gateway.ob
+        t = pd.Timestamp(ob.trades_time[10])
+        last = ob.tape.last_n(t, 4)
+        expected = ob.trades_px[:ob.ntrds][pd.to_datetime(ob.trades_time)
+                                           < t][-4:]
+        assert (last['price'] == expected).all()
+        assert (last['time'] < t.value).all()
+        assert len(ob.tape.last_n(t, 10**6)['vol']) == 10
+
+    def test_buckets_add_up(self, gateway):
+        gateway.move_n_seconds(1800)
+        tape = gateway.ob.tape
+        edges = tape.bucket_edges()
+        assert (np.diff(edges) == tape.bucket_ns).all()
+        assert tape.bucket_volume().sum() == gateway.ob.cumvol
+        assert tape.bucket_count().sum() == gateway.ob.ntrds
+        assert np.isclose(tape.bucket_turnover().sum(), gateway.ob.cumturn)
+        i = np.flatnonzero(tape.bucket_volume())[0]
+        assert tape.bucket_volume()[i] == tape.volume(
+            int(edges[i]), int(edges[i]) + tape.bucket_ns)
+
+    def test_reset_with_orderbook(self, gateway):
+        gateway.move_n_seconds(1800)
+        gateway.ob.reset_ob(reset_all=False)
+        assert gateway.ob.tape.count() == 0
+        assert gateway.ob.tape.volume() == 0